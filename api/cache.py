@@ -0,0 +1,166 @@
+import asyncio
+import functools
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import asyncpg
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Channel the movies triggers NOTIFY on when counts, genres, years or ratings change
+STATS_CHANNEL = "movie_stats"
+
+
+class ResponseCache:
+    """JSON response bodies, serialised once, bounded by a TTL and an entry count.
+
+    Entries are dropped all at once by invalidate(), which the LISTEN connection
+    calls on every NOTIFY. A response computed while an invalidation arrived is
+    not stored, since it may have been read before the write committed.
+    Nothing is cached while the listener is disconnected.
+    """
+
+    def __init__(self, ttl: float, max_entries: int, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.entries: "OrderedDict[str, tuple[float, bytes]]" = OrderedDict()
+        self.generation = 0
+        self.listening = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.listening and self.ttl > 0 and self.max_entries > 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self.entries.get(key) if self.enabled else None
+        if entry is None or entry[0] <= self.clock():
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: str, body: bytes, generation: int):
+        """Store body unless the cache was invalidated since generation was read."""
+        if not self.enabled or generation != self.generation:
+            return
+        self.entries[key] = (self.clock() + self.ttl, body)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self):
+        self.generation += 1
+        self.invalidations += 1
+        self.entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "entries": len(self.entries),
+            "listening": self.listening
+        }
+
+
+response_cache = ResponseCache(settings.RESPONSE_CACHE_TTL, settings.RESPONSE_CACHE_MAX_ENTRIES)
+
+
+def cached_response(key: str):
+    """Serve the endpoint's JSON from response_cache, skipping the handler and Pydantic on a hit.
+
+    Query parameters are part of the key. The handler's response_model is still
+    used for the OpenAPI schema; on a miss its result is encoded the same way
+    FastAPI would encode it. Errors are not cached.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs):
+            cache_key = key + ("?" + json.dumps(kwargs, sort_keys=True, default=str) if kwargs else "")
+            body = response_cache.get(cache_key)
+            if body is None:
+                generation = response_cache.generation
+                result = await handler(*args, **kwargs)
+                body = json.dumps(jsonable_encoder(result), separators=(",", ":")).encode()
+                response_cache.set(cache_key, body, generation)
+            return Response(content=body, media_type="application/json")
+        return wrapper
+    return decorator
+
+
+class CacheListener:
+    """Dedicated connection that LISTENs on STATS_CHANNEL and invalidates response_cache.
+
+    If the connection drops, the cache is cleared and disabled until the
+    listener has reconnected, so a missed NOTIFY cannot leave stale entries.
+    """
+
+    def __init__(self, cache: ResponseCache, dsn: str, retry_interval: float = 5.0):
+        self.cache = cache
+        self.dsn = dsn
+        self.retry_interval = retry_interval
+        self.conn: Optional[asyncpg.Connection] = None
+        self.task: Optional[asyncio.Task] = None
+        self.lost = asyncio.Event()
+
+    def on_notify(self, conn, pid, channel, payload):
+        self.cache.invalidate()
+
+    def on_terminate(self, conn):
+        logger.warning("Cache listener connection lost; caching disabled until it reconnects")
+        self.cache.listening = False
+        self.cache.invalidate()
+        self.lost.set()
+
+    async def connect(self):
+        self.conn = await asyncpg.connect(self.dsn)
+        self.conn.add_termination_listener(self.on_terminate)
+        await self.conn.add_listener(STATS_CHANNEL, self.on_notify)
+        # Anything cached before this point may have missed a NOTIFY
+        self.cache.invalidate()
+        self.cache.listening = True
+
+    async def run(self):
+        while True:
+            self.lost.clear()
+            try:
+                await self.connect()
+            except Exception as e:
+                logger.error(f"Cache listener could not connect: {str(e)}")
+                if self.conn and not self.conn.is_closed():
+                    await self.conn.close()
+                await asyncio.sleep(self.retry_interval)
+                continue
+            await self.lost.wait()
+
+    async def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        self.cache.listening = False
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        if self.conn and not self.conn.is_closed():
+            self.conn.remove_termination_listener(self.on_terminate)
+            await self.conn.close()
@@ -0,0 +1,102 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Hashable
+
+from database import db
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Concurrent calls with the same key share one in-flight call and its result.
+
+    The call runs in its own task, so a follower is unaffected when the request
+    that started it is cancelled. Nothing is kept once it completes: the next
+    call with the key runs again.
+    """
+
+    def __init__(self):
+        self.calls: dict = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def _done(self, key: Hashable, task: asyncio.Task):
+        if self.calls.get(key) is task:
+            del self.calls[key]
+        if not task.cancelled():
+            task.exception()  # Retrieved here in case every caller was cancelled
+
+    async def do(self, key: Hashable, load: Callable[[], Awaitable[Any]]) -> Any:
+        task = self.calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(load())
+            self.calls[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+            self.leaders += 1
+        else:
+            self.followers += 1
+        return await asyncio.shield(task)
+
+
+flights = SingleFlight()
+
+
+def query_key(method: str, query: str, args: tuple) -> tuple:
+    """The SQL with whitespace collapsed, and each parameter with its type, so 1 and 1.0 differ."""
+    return (method, " ".join(query.split()), tuple((type(arg).__name__, arg) for arg in args))
+
+
+async def run_on_pool(method: str, query: str, args: tuple):
+    async with db.pool.acquire() as conn:
+        return await getattr(conn, method)(query, *args)
+
+
+class ReadConnection:
+    """Stands in for a pool connection in an endpoint's read path.
+
+    When the endpoint is listed in COALESCE_ENDPOINTS, each fetch, fetchrow and
+    fetchval is shared with identical concurrent calls, and only the first of
+    them takes a pool connection. Otherwise one pool connection is acquired on
+    first use and held until the block exits, as with db.pool.acquire().
+    """
+
+    def __init__(self, endpoint: str):
+        self.coalesce = endpoint in settings.COALESCE_ENDPOINTS
+        self.acquired = None
+        self.conn = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if self.acquired is not None:
+            await self.acquired.__aexit__(exc_type, exc_val, exc_tb)
+
+    async def run(self, method: str, query: str, args: tuple):
+        if self.coalesce:
+            try:
+                key = query_key(method, query, args)
+                hash(key)
+            except TypeError:
+                pass  # Unhashable parameters, e.g. lists: run alone
+            else:
+                return await flights.do(key, lambda: run_on_pool(method, query, args))
+        if self.conn is None:
+            self.acquired = db.pool.acquire()
+            self.conn = await self.acquired.__aenter__()
+        return await getattr(self.conn, method)(query, *args)
+
+    async def fetch(self, query: str, *args):
+        return await self.run("fetch", query, args)
+
+    async def fetchrow(self, query: str, *args):
+        return await self.run("fetchrow", query, args)
+
+    async def fetchval(self, query: str, *args):
+        return await self.run("fetchval", query, args)
+
+
+def read_connection(endpoint: str) -> ReadConnection:
+    """Connection for the reads of endpoint (its handler's name), coalesced if configured."""
+    return ReadConnection(endpoint)
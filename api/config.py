@@ -12,6 +12,25 @@ class Settings:
     ALLOW_METHODS: list = ["*"]
     ALLOW_HEADERS: list = ["*"]
     
+    # HNSW candidate list size for /similar and /search/semantic; raises recall at some latency
+    EMBEDDING_EF_SEARCH: int = int(os.getenv("EMBEDDING_EF_SEARCH", "100"))
+    
+    # Matches of GET /api/movies?q= ranked per request; a broad term ranks this many, not every match
+    SEARCH_CANDIDATE_LIMIT: int = int(os.getenv("SEARCH_CANDIDATE_LIMIT", "1000"))
+    
+    # Response cache for the stats, years and genres endpoints; 0 disables it
+    RESPONSE_CACHE_TTL: float = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+    
+    # Endpoints (handler names) whose identical concurrent reads share one query
+    COALESCE_ENDPOINTS: set = {
+        name.strip() for name in os.getenv(
+            "COALESCE_ENDPOINTS",
+            "get_movies,get_top_rated_movies,get_available_years,get_available_genres,"
+            "get_duplicate_clusters,get_movie_by_id,get_summary_stats,get_stats_by_year"
+        ).split(",") if name.strip()
+    }
+    
     # App settings
     TITLE: str = "Netflix Movie Tool API"
     VERSION: str = "1.0.0"
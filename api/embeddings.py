@@ -0,0 +1,28 @@
+"""Query embeddings for semantic search.
+
+Movies are embedded by the crawler (crawler/embeddings.py). Search queries
+must land in the same vector space, so the feature hashing below has to stay
+identical to the crawler's; both test suites check the same reference vector.
+"""
+import hashlib
+import math
+import re
+
+EMBEDDING_DIM = 256
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def embed_text(text: str) -> list[float]:
+    """Unit-length embedding of free text, comparable by cosine distance to movie embeddings."""
+    vector = [0.0] * EMBEDDING_DIM
+    words = TOKEN_PATTERN.findall(text.lower())
+    for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+        digest = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+        vector[digest % EMBEDDING_DIM] += 1.0 if digest >> 63 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector))
+    return [v / norm for v in vector] if norm else vector
+
+
+def vector_literal(vector: list[float]) -> str:
+    """pgvector text representation of a vector, passed as a text parameter and cast to vector."""
+    return '[' + ','.join(f"{v:.6g}" for v in vector) + ']'
@@ -4,13 +4,17 @@ from contextlib import asynccontextmanager
 
 from config import settings
 from database import connect_db, disconnect_db
+from cache import CacheListener, response_cache
 from routers import movies, stats
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await connect_db()
+    cache_listener = CacheListener(response_cache, settings.DATABASE_URL)
+    await cache_listener.start()
     yield
+    await cache_listener.stop()
     await disconnect_db()
 
 
@@ -21,6 +21,27 @@ class Movie(BaseModel):
     updated_at: datetime
 
 
+class SimilarMovie(Movie):
+    similarity: float
+
+
+class DuplicateCluster(BaseModel):
+    cluster_id: str
+    movies: List[SimilarMovie]
+
+
+class DuplicateClusterListResponse(BaseModel):
+    clusters: List[DuplicateCluster]
+    next_cursor: Optional[str]
+    has_more: bool
+    limit: int
+
+
+class SemanticSearchInput(BaseModel):
+    query: str = Field(..., min_length=1)
+    limit: int = Field(10, ge=1, le=100)
+
+
 class MovieListResponse(BaseModel):
     movies: List[Movie]
     total: int
@@ -49,4 +70,12 @@ class SummaryStats(BaseModel):
     totalMovies: int
     averageRating: float
     topGenres: List[GenreStats]
-    totalGenres: int
\ No newline at end of file
+    totalGenres: int
+
+class CacheStats(BaseModel):
+    hits: int
+    misses: int
+    evictions: int
+    invalidations: int
+    entries: int
+    listening: bool
@@ -9,9 +9,14 @@ import logging
 logger = logging.getLogger(__name__)
 
 from models.movie import (
-    Movie, MovieInput, CursorMovieListResponse
+    Movie, MovieInput, CursorMovieListResponse, SimilarMovie, SemanticSearchInput,
+    DuplicateCluster, DuplicateClusterListResponse
 )
 from database import db
+from config import settings
+from embeddings import embed_text, vector_literal
+from cache import cached_response, response_cache
+from coalesce import read_connection
 
 router = APIRouter(prefix="/api/movies", tags=["movies"])
 
@@ -38,6 +43,8 @@ async def create_movie(movie: MovieInput):
                 movie.year,
                 json.dumps(metadata)
             )
+            # The movies trigger also NOTIFYs every API process; this process need not wait for it
+            response_cache.invalidate()
             
             return Movie(
                 id=str(row["id"]),
@@ -59,10 +66,15 @@ async def get_movies(
     min_rating: Optional[float] = Query(None, ge=0, le=10),
     year: Optional[int] = Query(None, ge=1900, le=2100),
     title: Optional[str] = None,
+    q: Optional[str] = Query(None, min_length=1, max_length=200),
     cursor: Optional[str] = None,
     limit: int = Query(10, ge=1, le=100)
 ):
-    """Get filtered list of movies with cursor-based pagination"""
+    """Get filtered list of movies with cursor-based pagination
+    
+    With q, movies are searched by title, genre, people and plot and
+    returned most relevant first instead of newest first.
+    """
     conditions = []
     params = []
     param_count = 0
@@ -76,6 +88,9 @@ async def get_movies(
         except (ValueError, json.JSONDecodeError, BinasciiError):
             raise HTTPException(status_code=400, detail="Invalid cursor")
     
+    if q and cursor_data is not None and "block" not in cursor_data:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
     base_query = "SELECT id, title, genre, rating, year, created_at, updated_at FROM movies WHERE 1=1"
     
     if genre:
@@ -98,6 +113,9 @@ async def get_movies(
         conditions.append(f" AND title ILIKE ${param_count}")
         params.append(f"%{title}%")
     
+    if q:
+        return await search_movies(q, conditions, params, cursor_data, limit)
+    
     # Add cursor condition
     if cursor_data:
         param_count += 1
@@ -113,7 +131,7 @@ async def get_movies(
     params.append(limit + 1)
     
     try:
-        async with db.pool.acquire() as conn:
+        async with read_connection("get_movies") as conn:
             rows = await conn.fetch(query, *params)
             
             has_more = len(rows) > limit
@@ -156,12 +174,110 @@ async def get_movies(
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+async def search_movies(q, conditions, params, cursor_data, limit):
+    """Relevance-ranked page of movies matching q and the other filters of get_movies"""
+    params = list(params)
+    param_count = len(params)
+    
+    # Words match the full-text document; any substring of 3+ characters matches the title
+    param_count += 1
+    q_param = param_count
+    params.append(q)
+    match = f"search_vector @@ websearch_to_tsquery('english', ${q_param})"
+    if len(q.strip()) >= 3:
+        param_count += 1
+        match = f"({match} OR title ILIKE ${param_count})"
+        escaped = q.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        params.append(f"%{escaped}%")
+    
+    # Title hits (weight A) outrank plot hits; trigram similarity orders substring matches
+    rank = (f"(ts_rank_cd(search_vector, websearch_to_tsquery('english', ${q_param}))"
+            f" + similarity(title, ${q_param}))")
+    # Matches are ranked a block at a time: the SEARCH_CANDIDATE_LIMIT titles closest to q,
+    # taken in trigram distance order off the GiST index with id breaking ties, so a term
+    # found in most of the catalog costs a bounded scan and keeps its best title matches.
+    # The cursor names its block by the (distance, id) just before it, so every page of a
+    # block ranks the same candidates and no match is skipped or repeated
+    block = cursor_data.get('block') if cursor_data else None
+    block_condition = ""
+    if block:
+        param_count += 1
+        block_condition = f" AND (title <-> ${q_param}, id) > (${param_count}::real, ${param_count + 1}::uuid)"
+        params.extend(block)
+        param_count += 1
+    
+    param_count += 1
+    query = (f"WITH candidates AS (SELECT id, title, genre, rating, year, created_at, updated_at,"
+             f" {rank} AS rank, title <-> ${q_param} AS distance"
+             f" FROM movies WHERE {match}" + "".join(conditions) + block_condition
+             + f" ORDER BY title <-> ${q_param}, id LIMIT ${param_count}),"
+             " block_end AS (SELECT distance, id FROM candidates ORDER BY distance DESC, id DESC LIMIT 1)"
+             " SELECT c.*, (SELECT count(*) FROM candidates) AS block_size,"
+             " e.distance AS block_end_distance, e.id AS block_end_id"
+             " FROM candidates c CROSS JOIN block_end e")
+    params.append(settings.SEARCH_CANDIDATE_LIMIT)
+    
+    if cursor_data and cursor_data.get('rank') is not None:
+        param_count += 1
+        query += f" WHERE (c.rank, c.id) < (${param_count}::real, ${param_count + 1}::uuid)"
+        params.extend([cursor_data['rank'], cursor_data['id']])
+        param_count += 1
+    
+    param_count += 1
+    query += f" ORDER BY c.rank DESC, c.id DESC LIMIT ${param_count}"
+    params.append(limit + 1)
+    
+    try:
+        async with read_connection("get_movies") as conn:
+            rows = await conn.fetch(query, *params)
+            
+            # A block with rows left pages on by rank; a full block that is used up hands
+            # over to the next one, so the last page of a block can be short
+            cursor_obj = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                cursor_obj = {"block": block, "rank": float(rows[-1]["rank"]), "id": str(rows[-1]["id"])}
+            elif rows and rows[0]["block_size"] == settings.SEARCH_CANDIDATE_LIMIT:
+                cursor_obj = {"block": [float(rows[0]["block_end_distance"]), str(rows[0]["block_end_id"])]}
+            has_more = cursor_obj is not None
+            
+            movies = []
+            next_cursor = None
+            
+            for row in rows:
+                movie = Movie(
+                    id=str(row["id"]),
+                    title=row["title"] or "",
+                    genre=row["genre"] or "",
+                    rating=float(row["rating"]) if row["rating"] is not None else 0.0,
+                    year=row["year"] or 0,
+                    created_at=row["created_at"],
+                    updated_at=row["updated_at"]
+                )
+                movies.append(movie)
+            
+            if has_more:
+                next_cursor = base64.b64encode(json.dumps(cursor_obj).encode()).decode()
+            
+            return CursorMovieListResponse(
+                movies=movies,
+                next_cursor=next_cursor,
+                has_more=has_more,
+                limit=limit
+            )
+    except Exception as e:
+        logger.error(f"Database error: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
 @router.get("/top-rated", response_model=CursorMovieListResponse)
 async def get_top_rated_movies(
+    genre: Optional[str] = None,
+    year: Optional[int] = Query(None, ge=1900, le=2100),
     cursor: Optional[str] = None,
     limit: int = Query(10, ge=1, le=100)
 ):
-    """Get top-rated movies with cursor-based pagination"""
+    """Get top-rated movies, optionally within one genre and/or year, with cursor-based pagination"""
     params = []
     param_count = 0
     
@@ -180,20 +296,31 @@ async def get_top_rated_movies(
         WHERE rating IS NOT NULL
     """
     
-    # Add cursor condition for rating-based pagination
+    if genre:
+        param_count += 1
+        base_query += f" AND genre = ${param_count}"
+        params.append(genre)
+    
+    if year:
+        param_count += 1
+        base_query += f" AND year = ${param_count}"
+        params.append(year)
+    
+    # Add cursor condition for rating-based pagination: a row-value seek, so every page
+    # starts with a range scan on the matching idx_movies_*rated index
     if cursor_data:
         param_count += 1
-        base_query += f" AND (rating < ${param_count} OR (rating = ${param_count + 1} AND id > ${param_count + 2}::uuid))"
-        params.extend([cursor_data['rating'], cursor_data['rating'], cursor_data['id']])
-        param_count += 2
+        base_query += f" AND (rating, id) < (${param_count}::numeric, ${param_count + 1}::uuid)"
+        params.extend([cursor_data['rating'], cursor_data['id']])
+        param_count += 1
     
     # Add limit + 1 to check if there are more results
     param_count += 1
-    query = base_query + f" ORDER BY rating DESC, id ASC LIMIT ${param_count}"
+    query = base_query + f" ORDER BY rating DESC, id DESC LIMIT ${param_count}"
     params.append(limit + 1)
     
     try:
-        async with db.pool.acquire() as conn:
+        async with read_connection("get_top_rated_movies") as conn:
             rows = await conn.fetch(query, *params)
             
             has_more = len(rows) > limit
@@ -237,17 +364,17 @@ async def get_top_rated_movies(
 
 
 @router.get("/years", response_model=list[int])
+@cached_response("movies:years")
 async def get_available_years():
     """Get all distinct years from movies"""
     query = """
-        SELECT DISTINCT year 
-        FROM movies 
-        WHERE year IS NOT NULL 
+        SELECT year 
+        FROM movie_year_stats 
         ORDER BY year DESC
     """
     
     try:
-        async with db.pool.acquire() as conn:
+        async with read_connection("get_available_years") as conn:
             rows = await conn.fetch(query)
             return [row['year'] for row in rows]
     except Exception as e:
@@ -256,17 +383,17 @@ async def get_available_years():
 
 
 @router.get("/genres", response_model=list[str])
+@cached_response("movies:genres")
 async def get_available_genres():
     """Get all distinct genres from movies"""
     query = """
-        SELECT DISTINCT genre 
-        FROM movies 
-        WHERE genre IS NOT NULL 
+        SELECT genre 
+        FROM movie_genre_stats 
         ORDER BY genre ASC
     """
     
     try:
-        async with db.pool.acquire() as conn:
+        async with read_connection("get_available_genres") as conn:
             rows = await conn.fetch(query)
             return [row['genre'] for row in rows]
     except Exception as e:
@@ -274,13 +401,190 @@ async def get_available_genres():
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+@router.get("/duplicates", response_model=DuplicateClusterListResponse)
+async def get_duplicate_clusters(
+    cursor: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=100)
+):
+    """Get clusters of near-duplicate movies found by the crawler, with cursor-based pagination"""
+    params = []
+    param_count = 0
+    
+    # Decode cursor if provided
+    cursor_data = None
+    if cursor:
+        try:
+            cursor_decoded = base64.b64decode(cursor).decode('utf-8')
+            cursor_data = json.loads(cursor_decoded)
+        except (ValueError, json.JSONDecodeError, BinasciiError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    cursor_condition = ""
+    if cursor_data:
+        param_count += 1
+        cursor_condition = f"WHERE cluster_id > ${param_count}::uuid"
+        params.append(cursor_data['cluster_id'])
+    
+    # Add limit + 1 to check if there are more results
+    param_count += 1
+    params.append(limit + 1)
+    # A cluster whose other members were deleted or retitled has one row left and is not listed
+    query = f"""
+        WITH clusters AS (
+            SELECT cluster_id
+            FROM movie_duplicates
+            {cursor_condition}
+            GROUP BY cluster_id
+            HAVING COUNT(*) > 1
+            ORDER BY cluster_id
+            LIMIT ${param_count}
+        )
+        SELECT d.cluster_id, d.similarity, m.id, m.title, m.genre, m.rating, m.year, m.created_at, m.updated_at
+        FROM clusters c
+        JOIN movie_duplicates d ON d.cluster_id = c.cluster_id
+        JOIN movies m ON m.id = d.movie_id
+        ORDER BY d.cluster_id, m.created_at, m.id
+    """
+    
+    try:
+        async with read_connection("get_duplicate_clusters") as conn:
+            rows = await conn.fetch(query, *params)
+            
+            clusters = []
+            for row in rows:
+                cluster_id = str(row["cluster_id"])
+                if not clusters or clusters[-1].cluster_id != cluster_id:
+                    clusters.append(DuplicateCluster(cluster_id=cluster_id, movies=[]))
+                clusters[-1].movies.append(SimilarMovie(
+                    id=str(row["id"]),
+                    title=row["title"] or "",
+                    genre=row["genre"] or "",
+                    rating=float(row["rating"]) if row["rating"] is not None else 0.0,
+                    year=row["year"] or 0,
+                    created_at=row["created_at"],
+                    updated_at=row["updated_at"],
+                    similarity=row["similarity"]
+                ))
+            
+            has_more = len(clusters) > limit
+            next_cursor = None
+            if has_more:
+                clusters = clusters[:limit]
+                cursor_obj = {"cluster_id": clusters[-1].cluster_id}
+                next_cursor = base64.b64encode(json.dumps(cursor_obj).encode()).decode()
+            
+            return DuplicateClusterListResponse(
+                clusters=clusters,
+                next_cursor=next_cursor,
+                has_more=has_more,
+                limit=limit
+            )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Database error: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+async def fetch_nearest(conn, query, *params, limit):
+    """Run a k-NN query on the HNSW index, searching at least limit candidates"""
+    # The index returns at most ef_search rows, so it must not be below the page size
+    async with conn.transaction():
+        await conn.execute(f"SET LOCAL hnsw.ef_search = {max(settings.EMBEDDING_EF_SEARCH, limit)}")
+        rows = await conn.fetch(query, *params, limit)
+    
+    return [
+        SimilarMovie(
+            id=str(row["id"]),
+            title=row["title"] or "",
+            genre=row["genre"] or "",
+            rating=float(row["rating"]) if row["rating"] is not None else 0.0,
+            year=row["year"] or 0,
+            created_at=row["created_at"],
+            updated_at=row["updated_at"],
+            similarity=row["similarity"]
+        )
+        for row in rows
+    ]
+
+
+@router.post("/search/semantic", response_model=list[SimilarMovie])
+async def semantic_search(search: SemanticSearchInput):
+    """Find the movies whose title, genre and metadata are closest to a free-text query"""
+    vector = embed_text(search.query)
+    if not any(vector):
+        return []
+    
+    # The nearest embeddings come off the HNSW index first; only those k are joined to movies
+    query = """
+        SELECT m.id, m.title, m.genre, m.rating, m.year, m.created_at, m.updated_at,
+               1 - e.distance AS similarity
+        FROM (
+            SELECT movie_id, embedding <=> $1::text::vector AS distance
+            FROM movie_embeddings
+            ORDER BY embedding <=> $1::text::vector
+            LIMIT $2
+        ) e
+        JOIN movies m ON m.id = e.movie_id
+        ORDER BY e.distance
+    """
+    
+    try:
+        async with db.pool.acquire() as conn:
+            return await fetch_nearest(conn, query, vector_literal(vector), limit=search.limit)
+    except Exception as e:
+        logger.error(f"Database error: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.get("/{movie_id}/similar", response_model=list[SimilarMovie])
+async def get_similar_movies(
+    movie_id: str,
+    limit: int = Query(10, ge=1, le=100)
+):
+    """Get the movies nearest to a movie by embedding, most similar first"""
+    query = """
+        SELECT m.id, m.title, m.genre, m.rating, m.year, m.created_at, m.updated_at,
+               1 - e.distance AS similarity
+        FROM (
+            SELECT movie_id, embedding <=> (SELECT embedding FROM movie_embeddings WHERE movie_id = $1) AS distance
+            FROM movie_embeddings
+            WHERE movie_id <> $1
+            ORDER BY embedding <=> (SELECT embedding FROM movie_embeddings WHERE movie_id = $1)
+            LIMIT $2
+        ) e
+        JOIN movies m ON m.id = e.movie_id
+        ORDER BY e.distance
+    """
+    
+    try:
+        async with db.pool.acquire() as conn:
+            row = await conn.fetchrow("""
+                SELECT EXISTS (SELECT 1 FROM movie_embeddings WHERE movie_id = $1) AS embedded
+                FROM movies WHERE id = $1
+            """, movie_id)
+            
+            if not row:
+                raise HTTPException(status_code=404, detail="Movie not found")
+            # Not embedded yet: the crawler's embedding stage has not reached it
+            if not row["embedded"]:
+                return []
+            
+            return await fetch_nearest(conn, query, movie_id, limit=limit)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Database error: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
 @router.get("/{movie_id}", response_model=Movie)
 async def get_movie_by_id(movie_id: str):
     """Get a single movie by ID"""
     query = "SELECT id, title, genre, rating, year, created_at, updated_at FROM movies WHERE id = $1"
     
     try:
-        async with db.pool.acquire() as conn:
+        async with read_connection("get_movie_by_id") as conn:
             row = await conn.fetchrow(query, movie_id)
             
             if not row:
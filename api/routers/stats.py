@@ -1,33 +1,33 @@
 from fastapi import APIRouter, HTTPException
 from typing import List
 
-from models.movie import SummaryStats, YearStats, GenreStats
-from database import db
+from models.movie import SummaryStats, YearStats, GenreStats, CacheStats
+from cache import cached_response, response_cache
+from coalesce import read_connection
 
 router = APIRouter(prefix="/api/stats", tags=["statistics"])
 
 
 @router.get("/summary", response_model=SummaryStats)
+@cached_response("stats:summary")
 async def get_summary_stats():
-    """Get dashboard summary statistics"""
+    """Get dashboard summary statistics from the aggregate tables the movies triggers maintain"""
     queries = {
-        "total": "SELECT COUNT(*) FROM movies",
-        "avg_rating": "SELECT AVG(rating) FROM movies WHERE rating IS NOT NULL",
+        "totals": "SELECT movie_count, rating_sum / NULLIF(rated_count, 0) AS avg_rating FROM movie_stats",
         "genres": """
-            SELECT genre, COUNT(*) as count
-            FROM movies
-            WHERE genre IS NOT NULL
-            GROUP BY genre
-            ORDER BY count DESC
+            SELECT genre, movie_count AS count
+            FROM movie_genre_stats
+            ORDER BY movie_count DESC
             LIMIT 5
         """,
-        "total_genres": "SELECT COUNT(DISTINCT genre) FROM movies WHERE genre IS NOT NULL"
+        "total_genres": "SELECT COUNT(*) FROM movie_genre_stats"
     }
     
     try:
-        async with db.pool.acquire() as conn:
-            total = await conn.fetchval(queries["total"])
-            avg_rating = await conn.fetchval(queries["avg_rating"])
+        async with read_connection("get_summary_stats") as conn:
+            totals = await conn.fetchrow(queries["totals"])
+            total = totals["movie_count"] if totals else 0
+            avg_rating = totals["avg_rating"] if totals else None
             genre_rows = await conn.fetch(queries["genres"])
             total_genres = await conn.fetchval(queries["total_genres"])
             
@@ -47,18 +47,17 @@ async def get_summary_stats():
 
 
 @router.get("/by-year", response_model=List[YearStats])
+@cached_response("stats:by-year")
 async def get_stats_by_year():
     """Get movie counts by year"""
     query = """
-        SELECT year, COUNT(*) as count
-        FROM movies
-        WHERE year IS NOT NULL
-        GROUP BY year
+        SELECT year, movie_count AS count
+        FROM movie_year_stats
         ORDER BY year DESC
     """
     
     try:
-        async with db.pool.acquire() as conn:
+        async with read_connection("get_stats_by_year") as conn:
             rows = await conn.fetch(query)
             
             return [
@@ -66,4 +65,10 @@ async def get_stats_by_year():
                 for row in rows
             ]
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+@router.get("/cache", response_model=CacheStats)
+async def get_cache_stats():
+    """Get hit, miss and invalidation counters of the response cache"""
+    return CacheStats(**response_cache.stats())
@@ -15,6 +15,7 @@ if parent_dir not in sys.path:
 from api.main import app
 from api.database import db
 from api.config import settings
+from api.embeddings import embed_text
 
 
 # Mock the database for testing
@@ -39,6 +40,16 @@ class MockConnection:
         
     async def execute(self, query, *args):
         return await self.mock_db.execute(query, *args)
+        
+    def transaction(self):
+        class TransactionContext:
+            async def __aenter__(ctx_self):
+                pass
+                
+            async def __aexit__(ctx_self, exc_type, exc_val, exc_tb):
+                pass
+                
+        return TransactionContext()
 
 
 class MockDB:
@@ -60,30 +71,104 @@ class MockDB:
                 
         return AcquireContext()
         
+    def aggregates(self, column):
+        # Stand-in for movie_genre_stats and movie_year_stats, which the movies triggers maintain
+        counts = {}
+        for movie in self.movies:
+            if movie.get(column):
+                counts[movie[column]] = counts.get(movie[column], 0) + 1
+        return counts
+        
     async def fetchval(self, query, *args):
-        if "COUNT(*)" in query:
-            return len(self.movies)
-        elif "AVG(rating)" in query:
-            if self.movies:
-                ratings = [m['rating'] for m in self.movies if m.get('rating')]
-                return sum(ratings) / len(ratings) if ratings else 0
-            return 0
+        if "COUNT(*) FROM movie_genre_stats" in query:
+            return len(self.aggregates('genre'))
         return None
         
+    def embedding(self, movie):
+        # Stand-in for the crawler's embedding stage; movies marked 'embedded': False have none
+        if not movie.get('embedded', True):
+            return None
+        return embed_text(f"{movie.get('title', '')} {movie.get('genre', '')}")
+        
     async def fetch(self, query, *args):
-        if "genre, COUNT(*)" in query:
-            # Mock genre stats
-            genres = {}
+        if "FROM movie_duplicates" in query:
+            # Mock duplicate clusters: movies carry the 'cluster_id' and 'similarity' the crawler would store
+            clusters = {}
+            for movie in self.movies:
+                if movie.get('cluster_id'):
+                    clusters.setdefault(movie['cluster_id'], []).append(movie)
+            selected = sorted(c for c, members in clusters.items() if len(members) > 1 and
+                              (len(args) == 1 or c > args[0]))[:args[-1]]
+            return [{**movie, 'cluster_id': c} for c in selected
+                    for movie in sorted(clusters[c], key=lambda m: (m['created_at'], str(m['id'])))]
+        elif "<=>" in query:
+            # Mock k-NN: exact cosine ranking against a query vector or another movie
+            if "$1::text::vector" in query:
+                target = [float(v) for v in args[0].strip('[]').split(',')]
+                candidates = self.movies
+            else:
+                movie = next(m for m in self.movies if str(m['id']) == args[0])
+                target = self.embedding(movie)
+                candidates = [m for m in self.movies if m is not movie]
+            ranked = []
+            for movie in candidates:
+                vector = self.embedding(movie)
+                if vector is not None:
+                    ranked.append({**movie, 'similarity': sum(a * b for a, b in zip(target, vector))})
+            ranked.sort(key=lambda m: -m['similarity'])
+            return ranked[:args[-1]]
+        elif "websearch_to_tsquery" in query:
+            # Mock relevance search: shared words with title and genre, plus a bonus for a title substring
+            import re
+            
+            def arg(column):
+                match = re.search(column + r"\$(\d+)", query)
+                return args[int(match.group(1)) - 1] if match else None
+            
+            q = arg(r"websearch_to_tsquery\('english', ")
+            words = set(q.lower().split())
+            result = []
             for movie in self.movies:
-                if movie.get('genre'):
-                    genres[movie['genre']] = genres.get(movie['genre'], 0) + 1
+                text = f"{movie.get('title', '')} {movie.get('genre', '')}".lower()
+                rank = float(len(words & set(text.split())))
+                if q.lower() in movie.get('title', '').lower():
+                    rank += 0.5
+                if rank > 0:
+                    result.append({**movie, 'rank': rank})
+            for column, keep in (("genre = ", lambda m, v: m.get('genre') == v),
+                                 ("year = ", lambda m, v: m.get('year') == v),
+                                 ("rating >= ", lambda m, v: m.get('rating', 0) >= v)):
+                value = arg(column)
+                if value is not None:
+                    result = [m for m in result if keep(m, value)]
+            # Stand-in for trigram distance: titles most like q first, then id
+            from difflib import SequenceMatcher
+            for movie in result:
+                movie['distance'] = 1 - SequenceMatcher(None, q.lower(), movie['title'].lower()).ratio()
+            result.sort(key=lambda m: (m['distance'], str(m['id'])))
+            block = re.search(r", id\) > \(\$(\d+)", query)
+            if block:
+                start = (args[int(block.group(1)) - 1], args[int(block.group(1))])
+                result = [m for m in result if (m['distance'], str(m['id'])) > start]
+            candidates = result[:args[int(re.search(r"LIMIT \$(\d+)\),", query).group(1)) - 1]]
+            if not candidates:
+                return []
+            end = candidates[-1]
+            result = [{**m, 'block_size': len(candidates), 'block_end_distance': end['distance'],
+                       'block_end_id': end['id']} for m in candidates]
+            cursor = re.search(r"c\.id\) < \(\$(\d+)", query)
+            if cursor:
+                after = (args[int(cursor.group(1)) - 1], args[int(cursor.group(1))])
+                result = [m for m in result if (m['rank'], str(m['id'])) < after]
+            result.sort(key=lambda m: (m['rank'], str(m['id'])), reverse=True)
+            return result[:args[-1]]
+        elif "genre, movie_count AS count" in query:
+            # Mock genre stats
+            genres = self.aggregates('genre')
             return [{'genre': g, 'count': c} for g, c in sorted(genres.items(), key=lambda x: x[1], reverse=True)[:5]]
-        elif "year, COUNT(*)" in query:
+        elif "year, movie_count AS count" in query:
             # Mock year stats
-            years = {}
-            for movie in self.movies:
-                if movie.get('year'):
-                    years[movie['year']] = years.get(movie['year'], 0) + 1
+            years = self.aggregates('year')
             return [{'year': y, 'count': c} for y, c in sorted(years.items(), key=lambda x: x[0], reverse=True)]
         elif "SELECT id, title" in query:
             # Mock movie list with filtering
@@ -91,9 +176,16 @@ class MockDB:
             
             # Check if it's a top-rated query
             if "WHERE rating IS NOT NULL" in query and "ORDER BY rating DESC" in query:
-                # Filter out movies without ratings and sort by rating descending, id ascending
+                # Filter out movies without ratings and sort by rating descending, id descending
                 result = [m for m in result if m.get('rating') is not None]
-                result.sort(key=lambda x: (-x.get('rating', 0), str(x.get('id'))))
+                if "genre = $" in query:
+                    result = [m for m in result if m.get('genre') == args[0]]
+                if "year = $" in query:
+                    result = [m for m in result if m.get('year') == args[1 if "genre = $" in query else 0]]
+                if "(rating, id) < " in query:
+                    after = (float(args[-3]), args[-2])
+                    result = [m for m in result if (m['rating'], str(m['id'])) < after]
+                result.sort(key=lambda x: (x.get('rating', 0), str(x.get('id'))), reverse=True)
             else:
                 # Apply filters based on query string and args
                 if "genre = $" in query and args:
@@ -160,14 +252,18 @@ class MockDB:
             limit = args[-1] if args and isinstance(args[-1], int) else 10
             return result[:limit]
             
-        elif "DISTINCT year" in query:
-            return [{'year': y} for y in sorted(set(m['year'] for m in self.movies if m.get('year')), reverse=True)]
-        elif "DISTINCT genre" in query:
-            return [{'genre': g} for g in sorted(set(m['genre'] for m in self.movies if m.get('genre')))]
+        elif "FROM movie_year_stats" in query:
+            return [{'year': y} for y in sorted(self.aggregates('year'), reverse=True)]
+        elif "FROM movie_genre_stats" in query:
+            return [{'genre': g} for g in sorted(self.aggregates('genre'))]
         return []
         
     async def fetchrow(self, query, *args):
-        if "INSERT INTO movies" in query:
+        if "FROM movie_stats" in query:
+            # Mock the movie_stats row
+            ratings = [m['rating'] for m in self.movies if m.get('rating') is not None]
+            return {'movie_count': len(self.movies), 'avg_rating': sum(ratings) / len(ratings) if ratings else None}
+        elif "INSERT INTO movies" in query:
             # Mock movie creation
             import uuid
             from datetime import datetime
@@ -182,6 +278,11 @@ class MockDB:
             }
             self.movies.append(movie)
             return movie
+        elif "AS embedded" in query:
+            for movie in self.movies:
+                if str(movie['id']) == args[0]:
+                    return {'embedded': self.embedding(movie) is not None}
+            return None
         elif "WHERE id = $1" in query:
             # Mock get by ID
             for movie in self.movies:
@@ -0,0 +1,101 @@
+import pytest
+from httpx import AsyncClient
+
+from api.cache import CacheListener, ResponseCache, response_cache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def listening_cache():
+    """The shared response cache, enabled as if the LISTEN connection were up"""
+    response_cache.invalidate()
+    response_cache.hits = response_cache.misses = 0
+    response_cache.listening = True
+    yield response_cache
+    response_cache.listening = False
+    response_cache.invalidate()
+
+
+class TestResponseCache:
+    
+    def test_ttl_and_size_bound(self):
+        """Test that entries expire after the TTL and the least recently used is evicted"""
+        clock = FakeClock()
+        cache = ResponseCache(ttl=10, max_entries=2, clock=clock)
+        cache.listening = True
+        cache.set("a", b"1", cache.generation)
+        cache.set("b", b"2", cache.generation)
+        assert cache.get("a") == b"1"
+        cache.set("c", b"3", cache.generation)
+        assert cache.get("b") is None
+        assert cache.evictions == 1
+        
+        clock.now = 10
+        assert cache.get("a") is None
+        assert cache.get("c") is None
+        assert (cache.hits, cache.misses, len(cache.entries)) == (1, 3, 0)
+    
+    
+    def test_invalidation_drops_entries_and_in_flight_results(self):
+        """Test that a response read before an invalidation is not stored after it"""
+        cache = ResponseCache(ttl=10, max_entries=10)
+        cache.set("a", b"1", cache.generation)
+        assert cache.entries == {}  # Not listening: nothing is cached
+        
+        cache.listening = True
+        cache.set("a", b"1", cache.generation)
+        generation = cache.generation
+        cache.invalidate()
+        cache.set("b", b"2", generation)
+        assert cache.entries == {}
+        assert cache.invalidations == 1
+    
+    
+    def test_listener_invalidates_on_notify_and_disconnect(self):
+        """Test that a NOTIFY clears the cache and a lost connection disables it"""
+        cache = ResponseCache(ttl=10, max_entries=10)
+        cache.listening = True
+        listener = CacheListener(cache, "postgresql://unused")
+        cache.set("a", b"1", cache.generation)
+        listener.on_notify(None, 1234, "movie_stats", "")
+        assert cache.entries == {}
+        
+        listener.on_terminate(None)
+        assert not cache.enabled
+        assert listener.lost.is_set()
+
+
+@pytest.mark.asyncio
+class TestCachedEndpoints:
+    
+    async def test_stats_served_from_cache_until_notify(self, client: AsyncClient, sample_movies, mock_db,
+                                                        listening_cache):
+        """Test that a cached summary skips the database until the movies trigger notifies"""
+        first = await client.get("/api/stats/summary")
+        assert first.json()["totalMovies"] == 10
+        
+        mock_db.movies.pop()
+        cached = await client.get("/api/stats/summary")
+        assert cached.content == first.content
+        assert cached.headers["content-type"] == "application/json"
+        
+        listening_cache.invalidate()
+        assert (await client.get("/api/stats/summary")).json()["totalMovies"] == 9
+        
+        response = await client.get("/api/stats/cache")
+        counters = response.json()
+        assert (counters["hits"], counters["entries"], counters["listening"]) == (1, 1, True)
+    
+    
+    async def test_create_movie_invalidates_genres(self, client: AsyncClient, sample_movies, listening_cache):
+        """Test that POST /api/movies is visible at once to the process that made it"""
+        assert "Western" not in (await client.get("/api/movies/genres")).json()
+        await client.post("/api/movies", json={"title": "Unforgiven", "genre": "Western", "rating": 8.2, "year": 1992})
+        assert "Western" in (await client.get("/api/movies/genres")).json()
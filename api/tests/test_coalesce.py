@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+
+from api.coalesce import SingleFlight, flights, query_key
+from api.config import settings
+
+
+@pytest.fixture
+def slow_db(mock_db, monkeypatch):
+    """Mock database whose queries take 20ms and are counted, so concurrent requests overlap"""
+    calls = []
+    fetch = mock_db.fetch
+
+    async def slow_fetch(query, *args):
+        calls.append(query)
+        await asyncio.sleep(0.02)
+        return await fetch(query, *args)
+
+    monkeypatch.setattr(mock_db, "fetch", slow_fetch)
+    return calls
+
+
+@pytest.mark.asyncio
+class TestCoalescing:
+    
+    async def test_single_flight_shares_results_and_errors(self):
+        """Test that overlapping calls share one load, later calls run again, and errors reach every caller"""
+        flight = SingleFlight()
+        loads = []
+        
+        async def load():
+            loads.append(1)
+            await asyncio.sleep(0.01)
+            return len(loads)
+        
+        assert await asyncio.gather(*[flight.do("k", load) for _ in range(5)]) == [1] * 5
+        assert await flight.do("k", load) == 2
+        assert (flight.leaders, flight.followers, flight.calls) == (2, 4, {})
+        
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+        
+        results = await asyncio.gather(flight.do("e", fail), flight.do("e", fail), return_exceptions=True)
+        assert [type(r) for r in results] == [ValueError, ValueError]
+    
+    
+    async def test_cancelled_leader_does_not_cancel_followers(self):
+        """Test that a follower still gets the result when the request that started the load goes away"""
+        flight = SingleFlight()
+        
+        async def load():
+            await asyncio.sleep(0.02)
+            return "rows"
+        
+        leader = asyncio.ensure_future(flight.do("k", load))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do("k", load))
+        await asyncio.sleep(0)
+        leader.cancel()
+        assert await follower == "rows"
+    
+    
+    async def test_query_keys_normalise_whitespace_not_types(self):
+        """Test that reformatted SQL shares a key and differently typed parameters do not"""
+        assert query_key("fetch", "SELECT 1\n  FROM movies", (1,)) == query_key("fetch", "SELECT 1 FROM movies", (1,))
+        assert query_key("fetch", "SELECT $1", (1,)) != query_key("fetch", "SELECT $1", (1.0,))
+        assert query_key("fetch", "SELECT $1", (1,)) != query_key("fetchval", "SELECT $1", (1,))
+    
+    
+    async def test_burst_of_identical_requests_runs_one_query(self, client: AsyncClient, sample_movies, slow_db):
+        """Test that concurrent identical requests share a query and different filters do not"""
+        responses = await asyncio.gather(*[client.get("/api/movies?genre=Drama") for _ in range(20)],
+                                         client.get("/api/movies?genre=Crime"))
+        assert all(r.status_code == 200 for r in responses)
+        assert len({r.content for r in responses[:20]}) == 1
+        assert [m["title"] for m in responses[-1].json()["movies"]] != [m["title"] for m in responses[0].json()["movies"]]
+        assert len(slow_db) == 2
+        assert flights.calls == {}
+    
+    
+    async def test_coalescing_is_configured_per_endpoint(self, client: AsyncClient, sample_movies, slow_db, monkeypatch):
+        """Test that an endpoint left out of COALESCE_ENDPOINTS runs every request's query"""
+        monkeypatch.setattr(settings, "COALESCE_ENDPOINTS", settings.COALESCE_ENDPOINTS - {"get_movies"})
+        await asyncio.gather(*[client.get("/api/movies?genre=Drama") for _ in range(5)])
+        assert len(slow_db) == 5
+        
+        await asyncio.gather(*[client.get("/api/stats/by-year") for _ in range(5)])
+        assert len(slow_db) == 6
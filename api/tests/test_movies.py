@@ -1,8 +1,11 @@
 import pytest
 import base64
 import json
+import uuid
 from httpx import AsyncClient
 
+from api.config import settings
+
 
 @pytest.mark.asyncio
 class TestMoviesAPI:
@@ -155,6 +158,47 @@ class TestMoviesAPI:
         assert ratings == sorted(ratings, reverse=True)
     
     
+    async def test_get_top_rated_by_genre_and_year(self, client: AsyncClient, sample_movies):
+        """Test top-rated leaderboards scoped to a genre and year, paged through ties"""
+        response = await client.get("/api/movies/top-rated?genre=Crime")
+        assert [m["title"] for m in response.json()["movies"]] == ["The Godfather", "Pulp Fiction", "Goodfellas"]
+        
+        response = await client.get("/api/movies/top-rated?genre=Drama&year=1994&limit=1")
+        data = response.json()
+        assert [m["title"] for m in data["movies"]] == ["The Shawshank Redemption"]
+        assert data["has_more"] is True
+        
+        response = await client.get(f"/api/movies/top-rated?genre=Drama&year=1994&limit=1&cursor={data['next_cursor']}")
+        data = response.json()
+        assert [m["title"] for m in data["movies"]] == ["Forrest Gump"]
+        assert data["has_more"] is False
+        
+        # Inception and Forrest Gump tie at 8.8: the cursor must not skip or repeat either
+        titles = []
+        cursor = None
+        while True:
+            url = "/api/movies/top-rated?limit=1" + (f"&cursor={cursor}" if cursor else "")
+            data = (await client.get(url)).json()
+            titles.extend(m["title"] for m in data["movies"])
+            if not data["has_more"]:
+                break
+            cursor = data["next_cursor"]
+        assert sorted(titles) == sorted(m["title"] for m in sample_movies)
+    
+    
+    async def test_top_rated_ties_and_unrated_movies(self, client: AsyncClient, sample_movies, mock_db):
+        """Test that ties are ordered by id descending and movies without a rating are left out"""
+        mock_db.movies.append({**sample_movies[0], 'id': uuid.uuid4(), 'title': "Unrated", 'rating': None})
+        
+        response = await client.get("/api/movies/top-rated?limit=100")
+        movies = response.json()["movies"]
+        assert "Unrated" not in [m["title"] for m in movies]
+        assert len(movies) == len(sample_movies)
+        tied = [m["id"] for m in movies if m["rating"] == 8.8]
+        assert len(tied) == 2 # Forrest Gump and Inception
+        assert tied == sorted(tied, reverse=True)
+    
+    
     async def test_get_available_years(self, client: AsyncClient, sample_movies):
         """Test getting distinct years"""
         response = await client.get("/api/movies/years")
@@ -193,4 +237,129 @@ class TestMoviesAPI:
         # Decode cursor to verify format
         decoded = json.loads(base64.b64decode(cursor).decode('utf-8'))
         assert "created_at" in decoded
-        assert "id" in decoded
\ No newline at end of file
+        assert "id" in decoded    
+    
+    async def test_get_similar_movies(self, client: AsyncClient, sample_movies):
+        """Test nearest neighbours of a movie, most similar first and excluding itself"""
+        godfather = next(m for m in sample_movies if m["title"] == "The Godfather")
+        response = await client.get(f"/api/movies/{godfather['id']}/similar?limit=3")
+        
+        assert response.status_code == 200
+        movies = response.json()
+        assert len(movies) == 3
+        assert str(godfather["id"]) not in [m["id"] for m in movies]
+        assert movies[0]["genre"] == "Crime"
+        similarities = [m["similarity"] for m in movies]
+        assert similarities == sorted(similarities, reverse=True)
+    
+    
+    async def test_get_similar_movies_not_embedded(self, client: AsyncClient, sample_movies):
+        """Test that a movie without an embedding has no neighbours yet, and unknown IDs 404"""
+        sample_movies[0]["embedded"] = False
+        response = await client.get(f"/api/movies/{sample_movies[0]['id']}/similar")
+        assert response.status_code == 200
+        assert response.json() == []
+        
+        response = await client.get("/api/movies/00000000-0000-0000-0000-000000000000/similar")
+        assert response.status_code == 404
+    
+    
+    async def test_semantic_search(self, client: AsyncClient, sample_movies):
+        """Test free-text k-NN search over movie embeddings"""
+        response = await client.post("/api/movies/search/semantic", json={"query": "dark knight", "limit": 2})
+        
+        assert response.status_code == 200
+        movies = response.json()
+        assert len(movies) == 2
+        assert movies[0]["title"] == "The Dark Knight"
+        assert movies[0]["similarity"] > movies[1]["similarity"]
+        
+        response = await client.post("/api/movies/search/semantic", json={"query": "?!"})
+        assert response.json() == []
+        
+        response = await client.post("/api/movies/search/semantic", json={"query": ""})
+        assert response.status_code == 422
+    
+    
+    async def test_query_embedding_matches_crawler(self):
+        """Test the query hashing against the reference vector the crawler's tests check"""
+        from api.embeddings import embed_text, vector_literal
+        
+        vector = embed_text("Dark city")
+        assert {i: round(v, 4) for i, v in enumerate(vector) if v} == {13: -0.5774, 29: 0.5774, 53: -0.5774}
+        assert vector_literal(vector)[:20] == "[0,0,0,0,0,0,0,0,0,0"
+    
+    
+    async def test_get_duplicate_clusters(self, client: AsyncClient, sample_movies):
+        """Test listing duplicate clusters page by page, skipping clusters with one member left"""
+        for movie, cluster in zip(sample_movies, ["b", "b", "a", "a", "a", "c"]):
+            movie["cluster_id"] = f"0000000{cluster}-0000-0000-0000-000000000000"
+            movie["similarity"] = 0.9
+        
+        response = await client.get("/api/movies/duplicates?limit=1")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["has_more"] is True
+        assert [len(c["movies"]) for c in data["clusters"]] == [3]
+        assert data["clusters"][0]["movies"][0]["similarity"] == 0.9
+        
+        response = await client.get(f"/api/movies/duplicates?limit=1&cursor={data['next_cursor']}")
+        data = response.json()
+        assert data["has_more"] is False
+        assert data["next_cursor"] is None
+        assert [m["title"] for m in data["clusters"][0]["movies"]] == ["The Shawshank Redemption", "The Godfather"]
+    
+    
+    async def test_search_movies_ranked(self, client: AsyncClient, sample_movies):
+        """Test q= search ordering by relevance and paging with a rank cursor"""
+        response = await client.get("/api/movies?q=the dark&limit=1")
+        assert response.status_code == 200
+        data = response.json()
+        assert [m["title"] for m in data["movies"]] == ["The Dark Knight"]
+        assert data["has_more"] is True
+        
+        decoded = json.loads(base64.b64decode(data["next_cursor"]).decode('utf-8'))
+        assert set(decoded) == {"block", "rank", "id"}
+        assert decoded["block"] is None # Still in the first block of candidates
+        
+        response = await client.get(f"/api/movies?q=the dark&limit=10&cursor={data['next_cursor']}")
+        titles = [m["title"] for m in response.json()["movies"]]
+        assert "The Dark Knight" not in titles
+        assert "The Godfather" in titles
+    
+    
+    async def test_search_movies_with_filters(self, client: AsyncClient, sample_movies):
+        """Test that q= combines with the genre, year and rating filters"""
+        response = await client.get("/api/movies?q=the&genre=Crime")
+        assert [m["title"] for m in response.json()["movies"]] == ["The Godfather"]
+        
+        response = await client.get("/api/movies?q=the&year=1994&min_rating=9")
+        assert [m["title"] for m in response.json()["movies"]] == ["The Shawshank Redemption"]
+    
+    
+    async def test_search_ranks_capped_candidates(self, client: AsyncClient, sample_movies, mock_db, monkeypatch):
+        """Test that a q= with more matches than SEARCH_CANDIDATE_LIMIT keeps its best match and pages through the rest"""
+        best = {**sample_movies[0], 'id': uuid.uuid4(), 'title': "Crime Story", 'genre': "Crime"}
+        mock_db.movies.append(best) # Matched last, behind three genre-only matches
+        monkeypatch.setattr(settings, "SEARCH_CANDIDATE_LIMIT", 2)
+        
+        response = await client.get("/api/movies?q=crime&limit=1")
+        data = response.json()
+        assert [m["title"] for m in data["movies"]] == ["Crime Story"]
+        
+        titles = []
+        while data["has_more"]:
+            titles.extend(m["title"] for m in data["movies"])
+            response = await client.get(f"/api/movies?q=crime&limit=1&cursor={data['next_cursor']}")
+            data = response.json()
+        titles.extend(m["title"] for m in data["movies"])
+        assert sorted(titles) == ["Crime Story", "Goodfellas", "Pulp Fiction", "The Godfather"]
+    
+    
+    async def test_search_rejects_date_cursor(self, client: AsyncClient, sample_movies):
+        """Test that a cursor from the unranked listing is not accepted by q= search"""
+        response = await client.get("/api/movies?limit=1")
+        cursor = response.json()["next_cursor"]
+        
+        response = await client.get(f"/api/movies?q=dark&cursor={cursor}")
+        assert response.status_code == 400
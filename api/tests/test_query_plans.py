@@ -0,0 +1,149 @@
+"""EXPLAIN every query shape GET /api/movies and /api/movies/top-rated build against a live PostgreSQL.
+
+Set TEST_DATABASE_URL to a scratch database to run these tests; database/init.sql
+is applied to it first. Without it they are skipped.
+"""
+import base64
+import itertools
+import json
+import os
+from pathlib import Path
+
+import asyncpg
+import pytest
+from httpx import AsyncClient
+
+from api.config import settings
+from api.database import db
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+INIT_SQL = Path(__file__).resolve().parents[2] / "database" / "init.sql"
+
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL not set")
+
+CURSOR = base64.b64encode(json.dumps({
+    "created_at": "2024-01-01T00:00:00+00:00",
+    "id": "00000000-0000-0000-0000-000000000000"
+}).encode()).decode()
+
+RATED_CURSOR = base64.b64encode(json.dumps({
+    "rating": 8.5,
+    "id": "00000000-0000-0000-0000-000000000000"
+}).encode()).decode()
+
+SEARCH_CURSOR = base64.b64encode(json.dumps({
+    "block": [0.5, "00000000-0000-0000-0000-000000000000"],
+    "rank": 0.5,
+    "id": "00000000-0000-0000-0000-000000000000"
+}).encode()).decode()
+
+
+def shapes(names, *values):
+    return [{key: value for key, value in zip(names, combination) if value is not None}
+            for combination in itertools.product(*values)]
+
+
+# Every combination of the keyset-paginated filters, on the first page and on a later one
+SHAPES = shapes(("genre", "min_rating", "year", "title", "cursor"),
+                ("Drama", None), (7.5, None), (1994, None), ("dark", None), (CURSOR, None))
+TOP_RATED_SHAPES = shapes(("genre", "year", "cursor"), ("Drama", None), (1994, None), (RATED_CURSOR, None))
+
+
+class RecordingDB:
+    """Stands in for the pool and records the SQL the endpoint would run."""
+
+    def __init__(self):
+        self.queries = []
+
+    def acquire(self):
+        recorder = self
+
+        class Connection:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, exc_type, exc_val, exc_tb):
+                pass
+
+            async def fetch(self, query, *args):
+                recorder.queries.append((query, args))
+                return []
+
+        return Connection()
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+@pytest.fixture
+async def pg():
+    """Connection to the test database with the current schema applied"""
+    try:
+        conn = await asyncpg.connect(TEST_DATABASE_URL)
+    except (OSError, asyncpg.PostgresError) as e:
+        pytest.skip(f"PostgreSQL not reachable: {e}")
+    await conn.execute(INIT_SQL.read_text())
+    yield conn
+    await conn.close()
+
+
+async def explain_endpoint(client, pg, path, shape):
+    """Call the endpoint, EXPLAIN the query it built and return the plan's nodes"""
+    recorder = RecordingDB()
+    db.pool = recorder
+    response = await client.get(path, params=shape)
+    assert response.status_code == 200
+    query, args = recorder.queries[0]
+
+    # Make any Sort or Seq Scan prohibitively expensive: if one still appears, no index can
+    # produce this shape in order, however much data the test database holds
+    async with pg.transaction():
+        await pg.execute("SET LOCAL enable_seqscan = off")
+        await pg.execute("SET LOCAL enable_sort = off")
+        plan = json.loads(await pg.fetchval(f"EXPLAIN (FORMAT JSON) {query}", *args))[0]["Plan"]
+    return list(plan_nodes(plan))
+
+
+def assert_ordered_index_only_scan(nodes):
+    node_types = [node["Node Type"] for node in nodes]
+    assert "Sort" not in node_types, node_types
+    assert "Incremental Sort" not in node_types, node_types
+    scans = [node for node in nodes if node.get("Relation Name") == "movies"]
+    assert [node["Node Type"] for node in scans] == ["Index Only Scan"], node_types
+
+
+@pytest.mark.parametrize("shape", SHAPES, ids=lambda shape: "+".join(shape) or "none")
+async def test_get_movies_plan_uses_keyset_index(client: AsyncClient, pg, shape):
+    """Test that a get_movies page is an ordered index-only scan: no Sort and no Seq Scan"""
+    assert_ordered_index_only_scan(await explain_endpoint(client, pg, "/api/movies", shape))
+
+
+@pytest.mark.parametrize("shape", TOP_RATED_SHAPES, ids=lambda shape: "+".join(shape) or "none")
+async def test_top_rated_plan_seeks_rated_index(client: AsyncClient, pg, shape):
+    """Test that a top-rated page is an ordered index-only scan that seeks to the cursor"""
+    nodes = await explain_endpoint(client, pg, "/api/movies/top-rated", shape)
+    assert_ordered_index_only_scan(nodes)
+    if "cursor" in shape:
+        # The cursor is an index bound, not a Filter applied to every row before it
+        scan = next(node for node in nodes if node.get("Relation Name") == "movies")
+        assert "(rating, id) <" in scan["Index Cond"].replace("ROW(", "("), scan
+        assert "Filter" not in scan, scan
+
+
+async def test_search_plan_ranks_capped_gin_matches(client: AsyncClient, pg):
+    """Test that a broad q= ranks a LIMIT of matches taken in trigram distance order, not every match"""
+    nodes = await explain_endpoint(client, pg, "/api/movies", {"q": "love", "cursor": SEARCH_CURSOR})
+    node_types = [node["Node Type"] for node in nodes]
+    # The block of candidates is a capped CTE: a Limit sits above the only movies scan
+    candidates = next(node for node in nodes if node.get("Subplan Name") == "CTE candidates")
+    assert candidates["Node Type"] == "Limit", candidates
+    assert candidates["Plan Rows"] <= settings.SEARCH_CANDIDATE_LIMIT, candidates
+    scans = [node for node in nodes if node.get("Relation Name") == "movies"]
+    assert [node["Node Type"] for node in scans] == ["Index Scan"], node_types
+    # Candidates come off the GiST index in distance order, with the match and the block start as filters
+    assert scans[0]["Index Name"] == "idx_movies_title_trgm_gist", scans[0]
+    assert "<->" in scans[0]["Order By"], scans[0]
+    assert "@@" in scans[0]["Filter"] and "<->" in scans[0]["Filter"], scans[0]
@@ -25,6 +25,7 @@ class TestStatsAPI:
         assert data["totalMovies"] == 10
         assert 8.0 < data["averageRating"] < 9.0  # Average should be around 8.8
         assert len(data["topGenres"]) == 5
+        assert data["totalGenres"] == 5
         
         # Check top genre
         top_genre = data["topGenres"][0]
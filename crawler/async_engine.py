@@ -0,0 +1,200 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from discovery import FOLDER_MIME_TYPE, JSON_FILE_QUERY
+from record_stream import is_movie_file
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 32 # Number of downloads in flight at once
+DEFAULT_LISTERS = 4 # Number of folders listed at once
+FILE_QUEUE_PER_WORKER = 4 # Discovered files buffered per download worker
+
+
+class AsyncCrawlEngine:
+    """Asyncio engine that crawls a folder tree with concurrent downloads.
+
+    The threaded engine shares the single httplib2 connection inside
+    crawler.service, which is why it has to run with one worker. Here every
+    worker owns its own authorized transport, so no two threads ever touch
+    the same connection.
+
+    Traversal is a two-stage pipeline. A bounded pool of listers drains a
+    folder work queue breadth-first, following every nextPageToken, and
+    streams the JSON files it finds onto a bounded file queue that the
+    download workers consume. Listing and downloading overlap, and tree depth
+    never turns into recursion depth. With a FlatDiscovery, a single producer
+    pages through account-wide JSON listings in place of the listers.
+
+    With a CrawlCheckpoint, traversal starts from the saved frontier. When a
+    checkpoint is due, listing pauses at page boundaries, queued downloads
+    drain and the writer flushes before progress is saved, so every page the
+    checkpoint records as listed has had its files committed.
+    """
+
+    def __init__(self, crawler, concurrency=DEFAULT_CONCURRENCY, listers=DEFAULT_LISTERS):
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        if listers < 1:
+            raise ValueError("listers must be at least 1")
+        self.crawler = crawler
+        self.concurrency = concurrency
+        self.listers = listers
+        self._executor = None
+        self._folders = None
+        self._files = None
+        self._checkpoint = None
+        self._listing_open = None
+        self._pages_in_progress = 0
+        self._pages_idle = None
+
+    def run(self, folder_id, discovery=None, checkpoint=None):
+        """Crawl folder_id and every folder below it.
+
+        Args:
+            folder_id: Root folder to crawl
+            discovery: Optional FlatDiscovery to find files without per-folder listing
+            checkpoint: Optional CrawlCheckpoint to resume from and save progress to
+        """
+        asyncio.run(self._crawl(folder_id, discovery, checkpoint))
+
+    async def _crawl(self, folder_id, discovery=None, checkpoint=None):
+        self._executor = ThreadPoolExecutor(max_workers=self.listers + self.concurrency)
+        self._folders = asyncio.Queue()
+        self._files = asyncio.Queue(maxsize=self.concurrency * FILE_QUEUE_PER_WORKER)
+        self._checkpoint = checkpoint
+        self._listing_open = asyncio.Event()
+        self._listing_open.set()
+        self._pages_in_progress = 0
+        self._pages_idle = asyncio.Condition()
+        logger.info(f"⚡ Async engine started with {self.listers} listers and {self.concurrency} downloaders")
+
+        if discovery is not None:
+            listers = [asyncio.create_task(self._flat_lister(discovery))]
+        else:
+            if checkpoint is not None:
+                for pending in checkpoint.pending_folders():
+                    self._folders.put_nowait(pending)
+            else:
+                self._folders.put_nowait((folder_id, "root", None))
+            listers = [asyncio.create_task(self._lister()) for _ in range(self.listers)]
+        downloaders = [asyncio.create_task(self._downloader()) for _ in range(self.concurrency)]
+        try:
+            if discovery is not None:
+                await listers[0]
+            else:
+                # Subfolders are queued before their parent is marked done, so once
+                # the folder queue drains the whole tree has been listed
+                await self._folders.join()
+            await self._files.join()
+        finally:
+            for task in listers + downloaders:
+                task.cancel()
+            await asyncio.gather(*listers, *downloaders, return_exceptions=True)
+            self._executor.shutdown(wait=True)
+
+    async def _run_blocking(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: func(*args, **kwargs))
+
+    async def _start_page(self):
+        """Wait for any checkpoint in progress, then count a page as being listed."""
+        await self._listing_open.wait()
+        self._pages_in_progress += 1
+
+    async def _finish_page(self):
+        async with self._pages_idle:
+            self._pages_in_progress -= 1
+            self._pages_idle.notify_all()
+
+    async def _maybe_checkpoint(self):
+        """Save progress once no page is mid-listing and every queued file is committed."""
+        if self._checkpoint is None or not self._checkpoint.due() or not self._listing_open.is_set():
+            return
+        self._listing_open.clear()
+        try:
+            async with self._pages_idle:
+                await self._pages_idle.wait_for(lambda: self._pages_in_progress == 0)
+            await self._files.join()
+            await self._run_blocking(self.crawler.save_checkpoint, self._checkpoint)
+        finally:
+            self._listing_open.set()
+
+    async def _lister(self):
+        """List folders from the work queue, one page at a time."""
+        http = self.crawler.build_http_transport()
+        while True:
+            folder_id, path, page_token = await self._folders.get()
+            try:
+                await self._list_folder(folder_id, path, http, page_token)
+            except Exception as e:
+                logger.error(f"Error crawling folder {path}: {e}", exc_info=True)
+                self.crawler.count('errors')
+            finally:
+                self._folders.task_done()
+
+    async def _list_folder(self, folder_id, path, http, page_token=None):
+        self.crawler.count('folders_processed')
+        logger.info(f"📁 Crawling folder: {path}")
+
+        checkpoint = self._checkpoint
+        while True:
+            await self._start_page()
+            try:
+                results = await self._run_blocking(
+                    self.crawler.list_folder, folder_id, page_token=page_token, http=http
+                )
+                for item in results.get('files', []):
+                    if item['mimeType'] == FOLDER_MIME_TYPE:
+                        sub_path = f"{path}/{item['name']}"
+                        if checkpoint is None or checkpoint.folder_discovered(item['id'], sub_path):
+                            self._folders.put_nowait((item['id'], sub_path, None))
+                    elif is_movie_file(item['name']) and self.crawler.should_process(item):
+                        # Blocks when downloaders fall behind, which throttles listing
+                        await self._files.put(item)
+                page_token = results.get('nextPageToken')
+                if checkpoint is not None:
+                    checkpoint.page_listed(folder_id, page_token)
+            finally:
+                await self._finish_page()
+            await self._maybe_checkpoint()
+            if not page_token:
+                break
+
+    async def _flat_lister(self, discovery):
+        """Page through account-wide JSON listings and queue the files under the root."""
+        http = self.crawler.build_http_transport()
+        checkpoint = self._checkpoint
+        try:
+            page_token = checkpoint.listing_page_token if checkpoint is not None else None
+            while True:
+                results = await self._run_blocking(
+                    self.crawler.list_all_files, JSON_FILE_QUERY, page_token=page_token, http=http
+                )
+                for item in discovery.select_files(results.get('files', [])):
+                    if self.crawler.should_process(item):
+                        await self._files.put(item)
+                page_token = results.get('nextPageToken')
+                if checkpoint is not None:
+                    checkpoint.set_listing_token(page_token)
+                if not page_token:
+                    break
+                await self._maybe_checkpoint()
+        except Exception as e:
+            logger.error(f"Error listing JSON files: {e}", exc_info=True)
+            self.crawler.count('errors')
+
+    async def _downloader(self):
+        """Download files from the file queue on a dedicated transport."""
+        http = self.crawler.build_http_transport()
+        while True:
+            item = await self._files.get()
+            try:
+                # process_drive_file handles its own errors and batching
+                await self._run_blocking(self.crawler.process_drive_file, item, http=http)
+            except Exception as e:
+                logger.error(f"Error in download worker for {item['name']}: {e}")
+                self.crawler.count('errors')
+            finally:
+                self._files.task_done()
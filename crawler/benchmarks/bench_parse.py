@@ -0,0 +1,139 @@
+"""Compare the crawler's JSON decode paths on a synthetic corpus of movie files.
+
+Each path takes the raw bytes of a downloaded file to COPY-ready text for
+every movie in it: decode, validate the core fields, hash the payload and
+encode the JSONB column.
+
+  legacy   the original path: bytes decoded to str, stdlib json.loads,
+           field coercion, canonical json.dumps for the hash, then the
+           payload dumped again for the insert
+  current  record_stream: orjson parses bytes, the raw text goes to JSONB
+           and is hashed as it is
+
+No database is needed.
+
+Usage:
+    python benchmarks/bench_parse.py --files 20000 --format json jsonl array
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import random
+import sys
+import time
+
+# Make the crawler modules importable when run from any directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import record_stream
+from bulk_loader import copy_value
+from record_stream import iter_records, movie_values
+
+FORMATS = ('json', 'jsonl', 'array')
+GENRES = ['Drama', 'Action', 'Comedy', 'Thriller', 'Sci-Fi', 'Horror', 'Romance', 'Crime']
+WORDS = ['night', 'river', 'last', 'city', 'dark', 'summer', 'king', 'road', 'secret', 'fire',
+         'café', 'Straße', 'amour', 'ночь', '夜']
+
+
+def synthetic_movie(rng, i):
+    """A movie shaped like the files in the Drive folder, with a few extra fields."""
+    return {
+        'title': ' '.join(rng.choice(WORDS).title() for _ in range(rng.randint(1, 4))),
+        'year': rng.randint(1950, 2024),
+        'rating': round(rng.uniform(1, 10), 1),
+        'genre': rng.choice(GENRES),
+        'director': f'Director {rng.randint(1, 5000)}',
+        'runtime_minutes': rng.randint(70, 200),
+        'cast': [f'Actor {rng.randint(1, 50000)}' for _ in range(rng.randint(2, 8))],
+        'plot': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(20, 120))),
+        'imdb_id': f'tt{i:07d}',
+    }
+
+
+def corpus(count, file_format, seed=42):
+    """Return [(name, bytes)]: count single-movie files, or one bulk file of count movies."""
+    rng = random.Random(seed)
+    movies = [synthetic_movie(rng, i) for i in range(count)]
+    if file_format == 'json':
+        return [(f'movie-{i}.json', json.dumps(m, indent=2, ensure_ascii=False).encode()) for i, m in enumerate(movies)]
+    if file_format == 'jsonl':
+        return [('movies.jsonl', '\n'.join(json.dumps(m, ensure_ascii=False) for m in movies).encode())]
+    return [('movies.json', json.dumps(movies, indent=1, ensure_ascii=False).encode())]
+
+
+def legacy_path(name, data):
+    """The decode path before the fast path was added, as it was in crawl_google_drive."""
+    encoded = 0
+    for _, movie_data in record_stream_legacy(name, data):
+        title = str(movie_data.get('title', 'N/A')).strip()
+        year = int(movie_data.get('year', 0))
+        rating = float(movie_data.get('rating', 0.0))
+        genre = str(movie_data.get('genre', 'N/A')).strip()
+        if not all([title, year, rating, genre]):
+            raise ValueError("Missing or invalid core data")
+        canonical = json.dumps(movie_data, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+        digest = hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+        encoded += len(copy_value(movie_data)) + len(digest) + len(title)
+    return encoded
+
+
+def record_stream_legacy(name, data):
+    if name.endswith('.jsonl'):
+        for number, line in enumerate(io.TextIOWrapper(io.BytesIO(data), encoding='utf-8', newline=''), start=1):
+            if line.strip():
+                yield number, json.loads(line)
+        return
+    text = io.TextIOWrapper(io.BytesIO(data), encoding='utf-8')
+    head = text.read(record_stream.READ_CHUNK_CHARS)
+    if head.lstrip().startswith('['):
+        yield from record_stream.iter_json_array(text, head)
+    else:
+        yield None, json.loads(head + text.read())
+
+
+def fast_path(name, data):
+    """The current path: parse bytes, validate once, raw text straight to the JSONB column."""
+    encoded = 0
+    for position, (movie_data, text) in iter_records(name, io.BytesIO(data), raw=True):
+        row, _ = movie_values(name if position is None else f'{name}#{position}', movie_data, raw=text)
+        encoded += len(copy_value(row[5])) + len(row[8]) + len(row[1])
+    return encoded
+
+
+def run_path(path, files, repeat):
+    """Best of repeat runs over every file; returns seconds."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for name, data in files:
+            path(name, data)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=20000, help="Movies per format")
+    parser.add_argument('--format', choices=FORMATS, nargs='+', default=list(FORMATS))
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    paths = [('legacy', legacy_path), ('current', fast_path)]
+
+    print(f"{'format':<8} {'path':<8} {'seconds':>9} {'movies/sec':>12} {'MB/sec':>8} {'speedup':>8}")
+    for file_format in args.format:
+        files = corpus(args.files, file_format)
+        megabytes = sum(len(data) for _, data in files) / 1e6
+        baseline = None
+        for label, path in paths:
+            elapsed = run_path(path, files, args.repeat)
+            baseline = baseline or elapsed
+            print(f"{file_format:<8} {label:<8} {elapsed:>9.3f} {args.files / elapsed:>12,.0f} "
+                  f"{megabytes / elapsed:>8.1f} {baseline / elapsed:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
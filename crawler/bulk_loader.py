@@ -0,0 +1,214 @@
+import json
+
+from psycopg2.extras import execute_batch, execute_values
+
+BULK_BATCH_BYTES = 4 * 1024 * 1024 # Flush a COPY batch once this much row data is pending
+BULK_MAX_BATCH_ROWS = 20000 # Upper bound on rows per COPY batch, however small they are
+DELETE_BATCH_SIZE = 5000 # drive_file_ids per DELETE statement
+
+MOVIE_COLUMNS = (
+    'drive_file_id', 'title', 'year', 'rating', 'genre', 'metadata',
+    'drive_md5', 'drive_modified_time', 'content_hash',
+)
+
+# Rows whose payload hash and Drive checksum match the stored copy are left untouched,
+# and updated_at only moves when the payload itself changed
+UPSERT_CONFLICT_SQL = """
+    ON CONFLICT (drive_file_id) DO UPDATE SET
+        title = EXCLUDED.title,
+        year = EXCLUDED.year,
+        rating = EXCLUDED.rating,
+        genre = EXCLUDED.genre,
+        metadata = EXCLUDED.metadata,
+        drive_md5 = EXCLUDED.drive_md5,
+        drive_modified_time = EXCLUDED.drive_modified_time,
+        content_hash = EXCLUDED.content_hash,
+        updated_at = CASE
+            WHEN {table}.content_hash IS DISTINCT FROM EXCLUDED.content_hash THEN NOW()
+            ELSE {table}.updated_at
+        END
+    WHERE {table}.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+       OR {table}.drive_md5 IS DISTINCT FROM EXCLUDED.drive_md5
+"""
+
+STAGING_TABLE = 'movies_staging'
+DEAD_LETTER_TABLE = 'crawl_dead_letters'
+
+
+def values_upsert_sql(table='movies'):
+    """Upsert statement for execute_values, returning the IDs of rows actually written."""
+    return (
+        f"INSERT INTO {table} ({', '.join(MOVIE_COLUMNS)}) VALUES %s"
+        + UPSERT_CONFLICT_SQL.format(table=table)
+        + " RETURNING drive_file_id"
+    )
+
+
+def batch_upsert(cur, rows, table='movies', page_size=100):
+    """Upsert rows with one statement per row via execute_batch.
+
+    This is the original write path, kept for benchmarking. execute_batch
+    cannot return rows, so the written count is not available.
+    """
+    placeholders = ', '.join(['%s'] * len(MOVIE_COLUMNS))
+    sql = (
+        f"INSERT INTO {table} ({', '.join(MOVIE_COLUMNS)}) VALUES ({placeholders})"
+        + UPSERT_CONFLICT_SQL.format(table=table)
+    )
+    execute_batch(cur, sql, rows, page_size=page_size)
+
+
+def values_upsert(cur, rows, table='movies', page_size=100):
+    """Upsert rows with multi-row INSERT statements; returns the number written."""
+    return len(execute_values(cur, values_upsert_sql(table), rows, page_size=page_size, fetch=True))
+
+
+def copy_upsert(cur, rows, table='movies'):
+    """Upsert rows by streaming them into a staging table with COPY and merging once.
+
+    The temporary staging table is emptied on commit, so each batch costs one
+    COPY and one INSERT ... SELECT ... ON CONFLICT regardless of its size.
+    Rows must already be unique on drive_file_id. Returns the number written.
+    """
+    columns = ', '.join(MOVIE_COLUMNS)
+    cur.execute(f"""
+        CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} (
+            drive_file_id VARCHAR(255),
+            title TEXT,
+            year INTEGER,
+            rating NUMERIC(3, 1),
+            genre TEXT,
+            metadata JSONB,
+            drive_md5 TEXT,
+            drive_modified_time TIMESTAMP WITH TIME ZONE,
+            content_hash TEXT
+        ) ON COMMIT DELETE ROWS
+    """)
+    cur.copy_expert(f"COPY {STAGING_TABLE} ({columns}) FROM STDIN", CopyRowStream(rows))
+    cur.execute(
+        f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {STAGING_TABLE}"
+        + UPSERT_CONFLICT_SQL.format(table=table)
+        + " RETURNING drive_file_id"
+    )
+    written = len(cur.fetchall())
+    # ON COMMIT only fires at commit; clear now in case the caller batches several merges
+    cur.execute(f"TRUNCATE {STAGING_TABLE}")
+    return written
+
+
+def delete_movies(cur, file_ids, table='movies', batch_size=DELETE_BATCH_SIZE):
+    """Delete the movies of the given Drive files in batches; returns the number deleted.
+
+    Matching on the part of drive_file_id before '#' also removes every
+    record loaded from a bulk file (see record_stream).
+    """
+    deleted = 0
+    for start in range(0, len(file_ids), batch_size):
+        cur.execute(
+            f"DELETE FROM {table} WHERE split_part(drive_file_id, '#', 1) = ANY(%s)",
+            (list(file_ids[start:start + batch_size]),)
+        )
+        deleted += cur.rowcount
+    return deleted
+
+
+def prune_file_rows(cur, prunes, table='movies'):
+    """Delete the rows of reloaded files that their latest parse did not produce; returns the number deleted.
+
+    prunes maps a file ID to the drive_file_ids just queued for it. A bulk
+    file that shrank loses its trailing records (and any that are now
+    invalid), and a file that changed between a single movie and a bulk file
+    loses the rows of its old shape.
+    """
+    if not prunes:
+        return 0
+    cur.execute(f"""
+        DELETE FROM {table}
+        WHERE split_part(drive_file_id, '#', 1) = ANY(%s)
+          AND drive_file_id NOT IN (SELECT unnest(%s::text[]))
+    """, (list(prunes), [drive_file_id for keep in prunes.values() for drive_file_id in keep]))
+    return cur.rowcount
+
+
+def dead_letter_rows(cur, failures, table=DEAD_LETTER_TABLE):
+    """Record rows that could not be written, with their error, for --retry-failed.
+
+    failures holds (row, error) pairs. The payload is kept as JSON text,
+    since the value that broke the insert may not be valid JSONB.
+    A row that fails again updates its entry and bumps attempts.
+    """
+    if not failures:
+        return
+    values = []
+    for row, error in failures:
+        drive_file_id = row[0]
+        payload = row[5]
+        if not isinstance(payload, str):
+            payload = json.dumps(getattr(payload, 'adapted', payload), ensure_ascii=True, default=str)
+        values.append((drive_file_id, drive_file_id.split('#', 1)[0], error, payload))
+    _insert_dead_letters(cur, values, table)
+
+
+def dead_letter_files(cur, failures, table=DEAD_LETTER_TABLE):
+    """Record whole files that could not be downloaded or parsed, for --retry-failed.
+
+    failures holds (file_id, error) pairs. There is no payload: the retry
+    downloads the file again.
+    """
+    if not failures:
+        return
+    _insert_dead_letters(cur, [(file_id, file_id, error, None) for file_id, error in failures], table)
+
+
+def _insert_dead_letters(cur, values, table):
+    execute_values(cur, f"""
+        INSERT INTO {table} (drive_file_id, source_file_id, error, payload) VALUES %s
+        ON CONFLICT (drive_file_id) DO UPDATE SET
+            error = EXCLUDED.error,
+            payload = EXCLUDED.payload,
+            attempts = {table}.attempts + 1,
+            last_failed_at = NOW()
+    """, values)
+
+
+def copy_value(value):
+    """Encode one value in PostgreSQL COPY text format."""
+    if value is None:
+        return '\\N'
+    # psycopg2's Json wrapper keeps the original object in .adapted
+    value = getattr(value, 'adapted', value)
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, ensure_ascii=False)
+    else:
+        value = str(value)
+    return (
+        value.replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+    )
+
+
+class CopyRowStream:
+    """File-like object that encodes rows for COPY lazily as they are read."""
+
+    def __init__(self, rows):
+        self._lines = ('\t'.join(copy_value(v) for v in row) + '\n' for row in rows)
+        self._buffer = ''
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            chunk = self._buffer + ''.join(self._lines)
+            self._buffer = ''
+            return chunk
+        pieces = [self._buffer]
+        length = len(self._buffer)
+        while length < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            pieces.append(line)
+            length += len(line)
+        data = ''.join(pieces)
+        chunk, self._buffer = data[:size], data[size:]
+        return chunk
@@ -0,0 +1,82 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from discovery import FOLDER_MIME_TYPE
+from record_stream import is_movie_file
+
+logger = logging.getLogger(__name__)
+
+CHANGES_PAGE_SIZE = 1000 # Largest page the Changes API returns
+CHANGE_WINDOW_MAX = 20000 # Changes collected before a window is applied and checkpointed
+
+
+def collapse_changes(changes):
+    """Reduce a window of changes to the latest state of each file.
+
+    A file edited five times in a window only needs its final revision
+    downloaded once, and a file created then deleted needs nothing but a
+    delete. Returns (upserts, removals): file resources to download and file
+    IDs to delete, in the order their last change arrived.
+    """
+    latest = {}
+    for change in changes:
+        file_id = change.get('fileId')
+        if not file_id:
+            continue
+        # Re-insert so the order follows each file's last change
+        latest.pop(file_id, None)
+        latest[file_id] = change
+
+    upserts, removals = [], []
+    for file_id, change in latest.items():
+        file_data = change.get('file') or {}
+        if change.get('removed') or file_data.get('trashed'):
+            removals.append(file_id)
+        elif file_data.get('mimeType') != FOLDER_MIME_TYPE and is_movie_file(file_data.get('name', '')):
+            upserts.append(file_data)
+    return upserts, removals
+
+
+class DownloadPool:
+    """Download threads, each with its own transport, reusable across batches.
+
+    Long-running modes keep one pool for their lifetime so every poll reuses
+    warm threads and open connections instead of paying for new TLS
+    handshakes.
+    """
+
+    def __init__(self, crawler, concurrency):
+        self.crawler = crawler
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+        self._local = threading.local()
+
+    def download(self, items, description='file'):
+        """Download items concurrently; returns whether each was handed to the writer."""
+        def process(item):
+            http = getattr(self._local, 'http', None)
+            if http is None:
+                http = self._local.http = self.crawler.build_http_transport()
+            logger.info(f"📝 Processing {description}: {item.get('name')}")
+            return self.crawler.process_drive_file(item, http=http)
+
+        # process_drive_file handles its own errors and batching
+        return list(self.executor.map(process, items))
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+def download_files(crawler, items, concurrency, description='file'):
+    """Download listed files concurrently, each worker on its own transport.
+
+    Returns a list of booleans, in the order of items, telling whether each
+    file was downloaded and handed to the writer.
+    """
+    if not items:
+        return []
+    pool = DownloadPool(crawler, min(concurrency, len(items)))
+    try:
+        return pool.download(items, description)
+    finally:
+        pool.close()
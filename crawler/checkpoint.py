@@ -0,0 +1,189 @@
+import logging
+import threading
+import time
+
+from psycopg2.extras import execute_values
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_INTERVAL = 60.0 # Seconds between durable traversal checkpoints
+
+
+class CrawlCheckpoint:
+    """Traversal progress of a full crawl, persisted in crawl_runs and crawl_folders.
+
+    The frontier maps every folder that still has to be listed to its path
+    and the nextPageToken of its listing (None when listing has not
+    started). Flat discovery keeps a single listing_page_token instead.
+    Progress is tracked in memory and written by save(); callers only save
+    once every file from the pages listed so far has been committed, so a
+    resumed crawl never skips a file that was listed but not written.
+    """
+
+    def __init__(self, conn, run_id, root_folder_id, start_page_token=None, discovery_mode=None,
+                 listing_page_token=None, interval=CHECKPOINT_INTERVAL):
+        self.conn = conn
+        self.run_id = run_id
+        self.root_folder_id = root_folder_id
+        self.start_page_token = start_page_token
+        self.discovery_mode = discovery_mode
+        self.listing_page_token = listing_page_token
+        self.listing_finished = False
+        self.interval = interval
+        self.frontier = {} # folder_id -> [path, page_token, position]
+        self.done = set()
+        self._dirty = set()
+        self._done_paths = {} # Paths of folders finished since the last save
+        self._listing_dirty = False
+        self._position = 0
+        self._lock = threading.Lock()
+        self._saved_at = time.monotonic()
+
+    @classmethod
+    def start(cls, conn, root_folder_id, start_page_token, discovery_mode, root_path='root'):
+        """Record a new crawl run, abandoning any unfinished run for the same root."""
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE crawl_runs SET status = 'abandoned', updated_at = NOW()
+                WHERE root_folder_id = %s AND status = 'running'
+            """, (root_folder_id,))
+            cur.execute("""
+                INSERT INTO crawl_runs (root_folder_id, status, discovery_mode, start_page_token)
+                VALUES (%s, 'running', %s, %s)
+                RETURNING id
+            """, (root_folder_id, discovery_mode, start_page_token))
+            run_id = cur.fetchone()[0]
+        conn.commit()
+        checkpoint = cls(conn, run_id, root_folder_id, start_page_token, discovery_mode)
+        if discovery_mode != 'flat':
+            checkpoint.folder_discovered(root_folder_id, root_path)
+        checkpoint.save()
+        return checkpoint
+
+    @classmethod
+    def resume(cls, conn, root_folder_id):
+        """Load the latest unfinished run for root_folder_id, or return None."""
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT id, start_page_token, discovery_mode, listing_page_token
+                FROM crawl_runs
+                WHERE root_folder_id = %s AND status = 'running'
+                ORDER BY created_at DESC
+                LIMIT 1
+            """, (root_folder_id,))
+            run = cur.fetchone()
+            if run is None:
+                conn.commit()
+                return None
+            run_id, start_page_token, discovery_mode, listing_page_token = run
+            checkpoint = cls(conn, run_id, root_folder_id, start_page_token, discovery_mode, listing_page_token)
+            cur.execute("""
+                SELECT folder_id, path, status, page_token, position
+                FROM crawl_folders
+                WHERE run_id = %s
+                ORDER BY position
+            """, (run_id,))
+            for folder_id, path, status, page_token, position in cur.fetchall():
+                if status == 'done':
+                    checkpoint.done.add(folder_id)
+                else:
+                    checkpoint.frontier[folder_id] = [path, page_token, position]
+                checkpoint._position = max(checkpoint._position, position + 1)
+        conn.commit()
+        return checkpoint
+
+    def pending_folders(self):
+        """Folders still to be listed, in discovery order, as (folder_id, path, page_token)."""
+        with self._lock:
+            ordered = sorted(self.frontier.items(), key=lambda entry: entry[1][2])
+            return [(folder_id, path, page_token) for folder_id, (path, page_token, _) in ordered]
+
+    def folder_discovered(self, folder_id, path):
+        """Add a folder to the frontier; returns False if it is already known."""
+        with self._lock:
+            if folder_id in self.frontier or folder_id in self.done:
+                return False
+            self.frontier[folder_id] = [path, None, self._position]
+            self._position += 1
+            self._dirty.add(folder_id)
+            return True
+
+    def page_listed(self, folder_id, next_page_token):
+        """Record that a page of folder_id was listed; the folder is done when no page follows."""
+        with self._lock:
+            if next_page_token:
+                self.frontier[folder_id][1] = next_page_token
+            else:
+                entry = self.frontier.pop(folder_id, None)
+                if entry is not None:
+                    self._done_paths[folder_id] = entry[0]
+                self.done.add(folder_id)
+            self._dirty.add(folder_id)
+
+    def set_listing_token(self, page_token):
+        """Record the next page of the flat JSON listing; None once it is exhausted."""
+        with self._lock:
+            self.listing_page_token = page_token
+            self.listing_finished = page_token is None
+            self._listing_dirty = True
+
+    def is_complete(self):
+        """Return True once every folder (or the flat listing) has been fully listed."""
+        if self.discovery_mode == 'flat':
+            return self.listing_finished
+        return not self.frontier
+
+    def due(self):
+        """Return True once a checkpoint should be written."""
+        return time.monotonic() - self._saved_at >= self.interval
+
+    def save(self):
+        """Write the progress recorded since the last save in one transaction."""
+        with self._lock:
+            rows = []
+            for folder_id in self._dirty:
+                if folder_id in self.done:
+                    rows.append((self.run_id, folder_id, self._done_paths.get(folder_id), 'done', None, 0))
+                else:
+                    path, page_token, position = self.frontier[folder_id]
+                    rows.append((self.run_id, folder_id, path, 'pending', page_token, position))
+            listing_page_token = self.listing_page_token
+            listing_dirty = self._listing_dirty
+            self._dirty = set()
+            self._done_paths = {}
+            self._listing_dirty = False
+            self._saved_at = time.monotonic()
+
+        try:
+            with self.conn.cursor() as cur:
+                if rows:
+                    execute_values(cur, """
+                        INSERT INTO crawl_folders (run_id, folder_id, path, status, page_token, position)
+                        VALUES %s
+                        ON CONFLICT (run_id, folder_id) DO UPDATE SET
+                            status = EXCLUDED.status,
+                            page_token = EXCLUDED.page_token
+                    """, rows, page_size=1000)
+                if listing_dirty:
+                    cur.execute("UPDATE crawl_runs SET listing_page_token = %s WHERE id = %s",
+                                (listing_page_token, self.run_id))
+                cur.execute("UPDATE crawl_runs SET updated_at = NOW() WHERE id = %s", (self.run_id,))
+            self.conn.commit()
+            logger.info(f"💾 Checkpoint saved: {len(self.frontier)} folders pending, {len(self.done)} done")
+        except Exception as e:
+            # Keep the changes so the next save retries them
+            logger.error(f"Error saving crawl checkpoint: {e}")
+            self.conn.rollback()
+            with self._lock:
+                self._dirty.update(row[1] for row in rows)
+                self._listing_dirty = self._listing_dirty or listing_dirty
+
+    def complete(self):
+        """Mark the run finished and drop its per-folder progress."""
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                UPDATE crawl_runs SET status = 'completed', completed_at = NOW(), updated_at = NOW()
+                WHERE id = %s
+            """, (self.run_id,))
+            cur.execute("DELETE FROM crawl_folders WHERE run_id = %s", (self.run_id,))
+        self.conn.commit()
@@ -2,7 +2,7 @@ import os
 import json
 import psycopg2
 import logging 
-from psycopg2.extras import Json, execute_batch
+from psycopg2.extras import execute_values
 from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseDownload
@@ -12,11 +12,13 @@ from dotenv import load_dotenv
 from tqdm import tqdm
 import time
 from concurrent.futures import ThreadPoolExecutor
-import ssl
+from collections import deque
 import httplib2
-from googleapiclient.errors import HttpError
-from time import sleep
+from google_auth_httplib2 import AuthorizedHttp
 import threading
+import argparse
+import signal
+import sys
 
 load_dotenv()
 
@@ -30,60 +32,147 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+from async_engine import AsyncCrawlEngine, DEFAULT_CONCURRENCY, DEFAULT_LISTERS
+from discovery import choose_discovery, DISCOVERY_MODES, FOLDER_MIME_TYPE, JSON_FILE_QUERY
+from bulk_loader import copy_upsert, dead_letter_files, delete_movies, prune_file_rows, values_upsert_sql, BULK_BATCH_BYTES, BULK_MAX_BATCH_ROWS
+from pipeline import BatchWriter, commit_prunes, salvage_batch
+from change_feed import collapse_changes, download_files, CHANGES_PAGE_SIZE, CHANGE_WINDOW_MAX
+from rate_governor import error_status, RateGovernor
+from checkpoint import CrawlCheckpoint
+from work_queue import CrawlWorker, JobQueue
+from record_stream import (
+    content_hash, is_movie_file, iter_records, movie_values, spooled_buffer, RECORD_SEPARATOR
+)
+from metrics import profiled, CrawlMetrics, MetricsExporter, METRICS_HOST
+from local_ingest import ingest_directory, LOCAL_ID_PREFIX
+from sync_daemon import ChangeSyncDaemon, DAEMON_MAX_INTERVAL, DAEMON_MIN_INTERVAL
+from embeddings import embed_pending
+from dedupe import detect_duplicates
+from movie_stats import verify_stats
+
 # The only scope needed for a service account reading files
 SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
 SERVICE_ACCOUNT_FILE = 'service-account.json'
 MAX_WORKERS = 1 # Note: Sequential processing to avoid SSL errors
-DB_BATCH_SIZE = 100 # Number of records to insert at once
-MAX_RETRIES = 3 
-RETRY_DELAY = 2 # delay between retries in seconds
+DB_BATCH_SIZE = 100 # Number of records to insert at once with the 'values' writer
+DB_WRITERS = ('copy', 'values')
+FILE_LIST_FIELDS = "id, name, mimeType, md5Checksum, modifiedTime"
+
+def drive_version_key(md5_checksum, modified_time):
+    """Return a compact key identifying a Drive file revision, or None if unknown.
+
+    The md5 checksum is stored as 16 raw bytes; files without one (e.g. Google
+    Docs formats) fall back to the modification timestamp.
+    """
+    if md5_checksum:
+        return bytes.fromhex(md5_checksum)
+    if isinstance(modified_time, str):
+        modified_time = datetime.fromisoformat(modified_time.replace('Z', '+00:00'))
+    if modified_time is not None:
+        return modified_time.timestamp()
+    return None
 
 class GoogleDriveCrawler:
-    def __init__(self):
-        self.service = self.authenticate_google_drive()
+    def __init__(self, db_writer='copy', service=None, transport_factory=None,
+                 service_account_file=SERVICE_ACCOUNT_FILE, offline=False, embed=True,
+                 dedupe=True):
+        """
+        Args:
+            db_writer: 'copy' or 'values' write path
+            service: Prebuilt Drive service (e.g. FakeDrive.service()); skips authentication
+            transport_factory: Callable returning a new HTTP transport for concurrent workers
+            service_account_file: Credentials to authenticate with; distributed workers can
+                each use a different service account to spread the Drive quota
+            offline: Skip Drive authentication entirely (local directory ingest)
+            embed: Run the embedding stage after each crawl
+            dedupe: Run duplicate detection after each crawl
+        """
+        if db_writer not in DB_WRITERS:
+            raise ValueError(f"Unknown db_writer: {db_writer}")
+        self.db_writer = db_writer
+        self.transport_factory = transport_factory
+        self.service_account_file = service_account_file
+        if service is None and not offline:
+            service = self.authenticate_google_drive()
+        self.service = service
         self.conn = psycopg2.connect(os.getenv('DATABASE_URL'))
         self.cur = self.conn.cursor()
         self.pending_inserts = [] # Hold data for batch inserts to improve database performance
+        self.pending_bytes = 0 # Approximate size of pending_inserts, used to size COPY batches
+        self.pending_prunes = {} # File ID -> drive_file_ids to keep, pruned with the pending batch
         self.insert_lock = threading.Lock() # Thread lock for batch inserts
+        self.writer = None # Dedicated writer stage, running while a crawl is in progress
+        self.writer_summary = None # Occupancy of the last writer stage, for the crawl summary
+        self.known_versions = {} # drive_file_id -> revision key of the stored copy
+        self.governor = RateGovernor() # Shared concurrency limit and retry budget for Drive calls
+        self.download_pool = None # Warm DownloadPool kept by the sync daemon between polls
+        self.metrics_exporter = None # Live metrics endpoint/textfile, when enabled
+        self.embed = embed
+        self.dedupe = dedupe
         self.stats = {
             'files_processed': 0,
+            'records_processed': 0,
+            'record_errors': 0,
+            'files_downloaded': 0,
+            'files_skipped': 0,
+            'rows_written': 0,
             'errors': 0,
             'folders_processed': 0,
             'db_batches_committed': 0,
-            'changes_processed': 0
+            'db_batches_failed': 0,
+            'db_batches_salvaged': 0,
+            'rows_dead_lettered': 0,
+            'rows_pruned': 0,
+            'movies_embedded': 0,
+            'movies_deduped': 0,
+            'duplicate_memberships': 0,
+            'changes_processed': 0,
+            'changes_applied': 0,
+            'files_deleted': 0,
+            'api_calls': 0,
+            'list_api_calls': 0
         }
+        self.metrics = CrawlMetrics(self.stats)
+        self.metrics.gauge('writer_queue_depth', "Rows waiting for the writer stage.",
+                           lambda: self.writer.queue.qsize() if self.writer is not None else 0)
     
     def authenticate_google_drive(self):
         """Authenticate using a service account."""
         logger.info("Authenticating with Google Drive using Service Account...")
-        if not os.path.exists(SERVICE_ACCOUNT_FILE):
-            logger.error(f"Service account file not found at: {SERVICE_ACCOUNT_FILE}")
+        if not os.path.exists(self.service_account_file):
+            logger.error(f"Service account file not found at: {self.service_account_file}")
             raise FileNotFoundError("You must provide a service-account.json file.")
             
         creds = Credentials.from_service_account_file(
-            SERVICE_ACCOUNT_FILE, scopes=SCOPES)
+            self.service_account_file, scopes=SCOPES)
+        # Keep the credentials so extra transports can be built for concurrent engines
+        self.credentials = creds
         
         # Build the service with credentials only
         return build('drive', 'v3', credentials=creds, cache_discovery=False)
     
-    def _retry_api_call(self, api_method, execute=True):
-        """Retry an API call with exponential backoff."""
-        for attempt in range(MAX_RETRIES):
-            try:
-                if execute:
-                    return api_method.execute()
-                else:
-                    return api_method
-            except (ssl.SSLError, HttpError, ConnectionError) as e:
-                if attempt == MAX_RETRIES - 1:
-                    logger.error(f"API call failed after {MAX_RETRIES} attempts: {str(e)}")
-                    raise e
-                wait_time = RETRY_DELAY * (2 ** attempt)
-                logger.warning(f"API call failed (attempt {attempt + 1}/{MAX_RETRIES}): {str(e)}. Retrying in {wait_time}s...")
-                sleep(wait_time)
-            except Exception as e:
-                logger.error(f"Unexpected error in API call: {str(e)}")
-                raise e
+    def build_http_transport(self):
+        """Create a new authorized HTTP transport with its own connection.
+
+        httplib2 connections are not thread-safe, so every concurrent worker
+        needs its own transport instead of sharing the one inside self.service.
+        """
+        if self.transport_factory is not None:
+            return self.transport_factory()
+        return AuthorizedHttp(self.credentials, http=httplib2.Http())
+    
+    def _retry_api_call(self, api_method, execute=True, http=None):
+        """Execute an API call through the rate governor, retrying throttled and transient failures."""
+        if not execute:
+            return api_method
+
+        def execute_once():
+            self.count('api_calls')
+            if http is not None:
+                return api_method.execute(http=http)
+            return api_method.execute()
+
+        return self.governor.call(execute_once)
     
     def test_folder_access(self, folder_id):
         """Test if the service account can access the folder."""
@@ -107,51 +196,201 @@ class GoogleDriveCrawler:
                 pass
             return False
     
-    def crawl_folder(self, folder_id, path="root"):
-        """Recursively crawl folders and find JSON files."""
-        self.stats['folders_processed'] += 1
-        logger.info(f"📁 Crawling folder: {path}")
+    def list_folder(self, folder_id, page_token=None, http=None):
+        """List one page of the direct children of a folder."""
+        query = f"'{folder_id}' in parents and trashed = false"
+        self.count('list_api_calls')
+        with self.metrics.timed('list'):
+            return self._retry_api_call(
+                self.service.files().list(
+                    q=query,
+                    fields=f"nextPageToken, files({FILE_LIST_FIELDS})",
+                    pageSize=1000,
+                    pageToken=page_token,
+                    supportsAllDrives=True,
+                    includeItemsFromAllDrives=True
+                ),
+                http=http
+            )
+    
+    def list_all_files(self, query, page_token=None, http=None):
+        """List one page of every file visible to the service account matching query."""
+        self.count('list_api_calls')
+        with self.metrics.timed('list'):
+            return self._retry_api_call(
+                self.service.files().list(
+                    q=query,
+                    fields=f"nextPageToken, files({FILE_LIST_FIELDS}, parents)",
+                    pageSize=1000,
+                    pageToken=page_token,
+                    corpora='allDrives',
+                    supportsAllDrives=True,
+                    includeItemsFromAllDrives=True
+                ),
+                http=http
+            )
+    
+    def iter_folder_pages(self, folder_id, page_token=None, http=None):
+        """Yield (items, next_page_token) for each page of a folder's children."""
+        while True:
+            results = self.list_folder(folder_id, page_token=page_token, http=http)
+            page_token = results.get('nextPageToken')
+            yield results.get('files', []), page_token
+            if not page_token:
+                break
+    
+    def crawl_folder(self, folder_id, path="root", checkpoint=None):
+        """Crawl a folder tree breadth-first and process its JSON files.
 
+        Folders are drained from a work queue instead of recursing, so tree depth
+        does not matter, and files are handed to the worker pool as soon as each
+        listing page arrives so listing and downloading overlap. With a
+        checkpoint, traversal starts from its saved frontier and progress is
+        saved every CHECKPOINT_INTERVAL seconds.
+        """
         # Use ThreadPoolExecutor for concurrent file processing set to 1 worker to avoid SSL errors
         futures = []
+        if checkpoint is not None:
+            folders = deque(checkpoint.pending_folders())
+        else:
+            folders = deque([(folder_id, path, None)])
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            while folders:
+                current_id, current_path, page_token = folders.popleft()
+                self.stats['folders_processed'] += 1
+                logger.info(f"📁 Crawling folder: {current_path}")
+                try:
+                    pages = self.iter_folder_pages(current_id, page_token=page_token)
+                    for items, next_page_token in tqdm(pages, desc=f"Listing pages in {current_path}"):
+                        for item in items:
+                            if item['mimeType'] == FOLDER_MIME_TYPE:
+                                sub_path = f"{current_path}/{item['name']}"
+                                if checkpoint is None or checkpoint.folder_discovered(item['id'], sub_path):
+                                    folders.append((item['id'], sub_path, None))
+                            elif is_movie_file(item['name']) and self.should_process(item):
+                                # Submit file processing task to the thread pool
+                                future = executor.submit(self.process_drive_file, item)
+                                futures.append(future)
+                        if checkpoint is not None:
+                            checkpoint.page_listed(current_id, next_page_token)
+                            if checkpoint.due():
+                                self.save_checkpoint(checkpoint, futures)
+                except Exception as e:
+                    logger.error(f"Error crawling folder {current_path}: {e}", exc_info=True)
+                    self.count('errors')
+            
+            # Wait for all futures to complete
+            self._wait_for(futures)
+        
+        # Commit any remaining items to ensure data is saved
+        self.flush_writes()
+
+    def crawl_flat(self, discovery, checkpoint=None):
+        """Process the JSON files under the root using flat discovery.
+
+        JSON files are listed across the whole account in large pages and kept
+        only if the discovery's parent map places them under the root. With a
+        checkpoint, listing continues from its saved page token.
+        """
+        futures = []
+        page_token = checkpoint.listing_page_token if checkpoint is not None else None
         with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
             try:
-                query = f"'{folder_id}' in parents and trashed = false"
-                results = self._retry_api_call(
-                    self.service.files().list(
-                        q=query,
-                        fields="nextPageToken, files(id, name, mimeType)",
-                        pageSize=1000,
-                        supportsAllDrives=True,
-                        includeItemsFromAllDrives=True
-                    )
-                )
-                items = results.get('files', [])
-
-                for item in tqdm(items, desc=f"Queuing items in {path}"):
-                    if item['mimeType'] == 'application/vnd.google-apps.folder':
-                        self.crawl_folder(item['id'], f"{path}/{item['name']}")
-                    elif item['name'].endswith('.json'):
-                        # Submit file processing task to the thread pool
-                        future = executor.submit(self.process_json_file, item['id'], item['name'])
-                        futures.append(future)
-                
-                # Wait for all futures to complete
-                for future in futures:
-                    try:
-                        future.result()
-                    except Exception as e:
-                        logger.error(f"Error in thread execution: {e}")
-                        
+                while True:
+                    results = self.list_all_files(JSON_FILE_QUERY, page_token=page_token)
+                    for item in discovery.select_files(results.get('files', [])):
+                        if self.should_process(item):
+                            future = executor.submit(self.process_drive_file, item)
+                            futures.append(future)
+                    page_token = results.get('nextPageToken')
+                    if checkpoint is not None:
+                        checkpoint.set_listing_token(page_token)
+                        if page_token and checkpoint.due():
+                            self.save_checkpoint(checkpoint, futures)
+                    if not page_token:
+                        break
             except Exception as e:
-                logger.error(f"Error crawling folder {path}: {e}", exc_info=True)
-                self.stats['errors'] += 1
+                logger.error(f"Error listing JSON files: {e}", exc_info=True)
+                self.count('errors')
+            
+            self._wait_for(futures)
         
-        # Commit any remaining items after processing a folder to ensure data is saved
-        self._commit_batch()
+        self.flush_writes()
+
+    def _wait_for(self, futures):
+        """Wait for submitted downloads, logging any that raised."""
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"Error in thread execution: {e}")
+        futures.clear()
+
+    def save_checkpoint(self, checkpoint, futures=None):
+        """Persist traversal progress once everything listed so far is committed."""
+        if futures:
+            self._wait_for(futures)
+        self.flush_writes()
+        checkpoint.save()
+
+    def load_known_versions(self):
+        """Load the Drive revision of every stored file so unchanged files can be skipped."""
+        self.known_versions = {}
+        try:
+            # A server-side cursor streams the rows instead of materialising them all at once
+            with self.conn.cursor(name='known_versions') as cur:
+                cur.itersize = 10000
+                cur.execute("""
+                    SELECT drive_file_id, drive_md5, drive_modified_time
+                    FROM movies
+                    WHERE drive_file_id IS NOT NULL AND content_hash IS NOT NULL
+                """)
+                for file_id, md5_checksum, modified_time in cur:
+                    key = drive_version_key(md5_checksum, modified_time)
+                    if key is not None:
+                        # Records from a bulk file share the revision of the file they came from
+                        self.known_versions[file_id.split(RECORD_SEPARATOR, 1)[0]] = key
+            self.conn.commit()
+            logger.info(f"🗂️  Loaded {len(self.known_versions)} known file versions")
+        except Exception as e:
+            logger.error(f"Error loading known file versions: {e}")
+            self.conn.rollback()
+            self.known_versions = {}
+    
+    def should_process(self, item):
+        """Return False (and count a skip) if the listing shows the stored copy is current."""
+        key = drive_version_key(item.get('md5Checksum'), item.get('modifiedTime'))
+        if key is not None and self.known_versions.get(item['id']) == key:
+            self.count('files_skipped')
+            return False
+        return True
+    
+    def process_drive_file(self, item, http=None):
+        """Process a JSON file from a Drive listing, keeping its revision details."""
+        return self.process_json_file(
+            item['id'], item['name'], http=http,
+            md5_checksum=item.get('md5Checksum'),
+            modified_time=item.get('modifiedTime')
+        )
+    
+    def process_json_file(self, file_id, filename, http=None, md5_checksum=None, modified_time=None):
+        """Download a movie file and prepare its movies for batch insertion.
+
+        Besides one movie per .json file, the file may hold a JSON array,
+        JSON Lines, gzip-compressed variants of those, or a zip archive of
+        any of them (see record_stream). Large downloads spill to disk and
+        are parsed incrementally, so memory stays bounded.
+
+        Args:
+            file_id: Google Drive file ID
+            filename: File name, used to pick the format and for logging
+            http: Optional transport to download with instead of the shared service one
+            md5_checksum: Drive md5Checksum of the listed revision, stored for skip checks
+            modified_time: Drive modifiedTime of the listed revision, stored for skip checks
 
-    def process_json_file(self, file_id, filename):
-        """Download and prepare a JSON file for batch insertion."""
+        Returns:
+            True once the file's movies are queued for writing, False if the file failed
+        """
         try:
             # Use retry logic for file download
             request = self._retry_api_call(
@@ -161,83 +400,213 @@ class GoogleDriveCrawler:
                 ),
                 execute=False  # Don't execute, just return the request object
             )
-            file_buffer = io.BytesIO()
-            downloader = MediaIoBaseDownload(file_buffer, request)
-            done = False
-            
-            # Retry mechanism for downloading chunks
-            while not done:
-                for attempt in range(MAX_RETRIES):
-                    try:
-                        status, done = downloader.next_chunk()
-                        break
-                    except (ssl.SSLError, ConnectionError) as e:
-                        if attempt == MAX_RETRIES - 1:
-                            raise e
-                        wait_time = RETRY_DELAY * (2 ** attempt)
-                        logger.warning(f"Download chunk failed for {filename} (attempt {attempt + 1}/{MAX_RETRIES}): {str(e)}. Retrying in {wait_time}s...")
-                        sleep(wait_time)
-            
-            movie_data = json.loads(file_buffer.getvalue().decode('utf-8'))
-            
-            # Validate and prepare data, but don't insert yet - batch for performance
-            title = str(movie_data.get('title', 'N/A')).strip()
-            year = int(movie_data.get('year', 0))
-            rating = float(movie_data.get('rating', 0.0))
-            genre = str(movie_data.get('genre', 'N/A')).strip()
-            
-            if not all([title, year, rating, genre]):
-                raise ValueError(f"Missing or invalid core data in {filename}")
+            if http is not None:
+                request.http = http
+            with spooled_buffer() as file_buffer:
+                downloader = MediaIoBaseDownload(file_buffer, request)
+                done = False
+                
+                def next_chunk():
+                    self.count('api_calls')
+                    return downloader.next_chunk()
 
-            # Store the complete movie data in metadata field
-            # This ensures we don't lose any additional fields from the JSON
-            
-            # Add the prepared data tuple to our pending list (thread-safe)
-            with self.insert_lock:
-                self.pending_inserts.append(
-                    (file_id, title, year, rating, genre, Json(movie_data))
-                )
-                self.stats['files_processed'] += 1
+                # The downloader keeps its progress, so a failed chunk is retried where it stopped
+                with self.metrics.timed('download'):
+                    while not done:
+                        status, done = self.governor.call(next_chunk, f"Download chunk for {filename}")
                 
-                # Commit when batch is full to optimize database performance
-                if len(self.pending_inserts) >= DB_BATCH_SIZE:
-                    self._commit_batch()
+                self.count('files_downloaded')
+                file_size = file_buffer.tell()
+                file_buffer.seek(0)
+                self.queue_records(file_id, filename, file_buffer, file_size, md5_checksum, modified_time)
+            self.count('files_processed')
+            return True
 
         except Exception as e:
             logger.error(f"Error processing file {filename} ({file_id}): {e}")
-            self.stats['errors'] += 1
+            self.count('errors')
+            return False
+    
+    def count(self, key, amount=1):
+        """Add to a stats counter shared by the download workers of every engine.
+
+        Must not be called while insert_lock is held (e.g. from _commit_batch).
+        """
+        with self.insert_lock:
+            self.stats[key] += amount
+    
+    def queue_records(self, file_id, filename, stream, file_size, md5_checksum=None, modified_time=None):
+        """Validate every movie read from stream and queue its row; returns the number queued.
+
+        A file holding a single movie is stored under its own file ID and any
+        problem with it fails the file. Records of bulk files are stored as
+        '<file_id>#<position>'; a bad record is logged and counted in
+        record_errors while the rest of the file is still loaded.
+
+        The complete movie, extra fields included, is stored in metadata as
+        the record's own JSON text, so it is never serialised again.
+
+        Once the whole file has been read, rows stored from an earlier version
+        of it that this one did not produce are pruned.
+        """
+        queued = []
+        parse_seconds = 0.0
+        started = time.perf_counter()
+        for position, record in iter_records(filename, stream, raw=True):
+            try:
+                if isinstance(record, Exception):
+                    raise record
+                movie_data, text = record
+                if position is None:
+                    row, _ = movie_values(file_id, movie_data, md5_checksum, modified_time, raw=text)
+                    size = file_size
+                else:
+                    row, size = movie_values(f"{file_id}{RECORD_SEPARATOR}{position}", movie_data,
+                                             md5_checksum, modified_time, raw=text)
+            except (ValueError, TypeError) as e:
+                if position is None:
+                    raise ValueError(f"{e} in {filename}") from e
+                logger.warning(f"Skipping record {position} of {filename}: {e}")
+                self.count('record_errors')
+                continue
+            # Time blocked on the writer is queue_wait (or db_commit), not parsing
+            parse_seconds += time.perf_counter() - started
+            self.queue_row(row, size)
+            queued.append(row[0])
+            started = time.perf_counter()
+        self.metrics.observe('parse', parse_seconds + time.perf_counter() - started)
+        self.prune_file(file_id, queued)
+        return len(queued)
+    
+    def prune_file(self, file_id, keep):
+        """Delete the rows of file_id other than keep once its pending rows are written."""
+        if self.writer is not None:
+            self.writer.prune(file_id, keep)
+            return
+        with self.insert_lock:
+            self.pending_prunes[file_id] = keep
+    
+    def queue_row(self, row, size):
+        """Hand a prepared row to the writer stage, or to the pending batch without one."""
+        if self.writer is not None:
+            # Hand the row to the writer stage; blocks only while the database is behind
+            self.writer.put(row, size)
+            self.count('records_processed')
+            return
+        
+        # Add the prepared data tuple to our pending list (thread-safe)
+        with self.insert_lock:
+            self.pending_inserts.append(row)
+            self.pending_bytes += size
+            self.stats['records_processed'] += 1
+            
+            # Commit when batch is full to optimize database performance
+            if self._batch_full():
+                self._commit_batch()
             
+    def start_writer(self):
+        """Start the dedicated database writer stage on its own connection."""
+        if self.db_writer == 'copy':
+            max_rows, max_bytes = BULK_MAX_BATCH_ROWS, BULK_BATCH_BYTES
+        else:
+            max_rows, max_bytes = DB_BATCH_SIZE, None
+        self.writer = BatchWriter(
+            lambda: psycopg2.connect(os.getenv('DATABASE_URL')),
+            self.stats,
+            stats_lock=self.insert_lock,
+            db_writer=self.db_writer,
+            max_rows=max_rows,
+            max_bytes=max_bytes,
+            metrics=self.metrics
+        )
+        self.writer.start()
+    
+    def stop_writer(self):
+        """Flush and stop the writer stage."""
+        if self.writer is None:
+            return
+        try:
+            self.writer.stop()
+        finally:
+            self.writer_summary = self.writer.summary()
+            self.writer = None
+    
+    def flush_writes(self):
+        """Commit every row prepared so far, through the writer stage if it is running."""
+        if self.writer is not None:
+            self.writer.flush()
+        else:
+            self._commit_batch()
+    
+    def _batch_full(self):
+        """Return True once the pending batch should be written.
+
+        The 'values' writer flushes every DB_BATCH_SIZE rows. COPY batches are
+        sized by data volume instead, so small rows make large batches and
+        large rows make small ones.
+        """
+        if self.db_writer == 'values':
+            return len(self.pending_inserts) >= DB_BATCH_SIZE
+        return (self.pending_bytes >= BULK_BATCH_BYTES
+                or len(self.pending_inserts) >= BULK_MAX_BATCH_ROWS)
+    
     def _commit_batch(self):
-        """Commit the pending inserts to the database in a single batch."""
-        if not self.pending_inserts:
+        """Commit the pending inserts to the database in a single batch.
+
+        Rows whose payload hash and Drive checksum match the stored copy are left
+        untouched, so re-crawling unchanged files writes nothing. updated_at only
+        moves when the payload itself changed.
+        """
+        if not self.pending_inserts and not self.pending_prunes:
             return
 
+        # A file can be listed twice (several parents, repeated changes); keep the
+        # latest row so one statement never updates the same movie twice
+        rows = list({row[0]: row for row in self.pending_inserts}.values())
+        started = time.perf_counter()
         try:
-            sql = """
-                INSERT INTO movies (drive_file_id, title, year, rating, genre, metadata)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                ON CONFLICT (drive_file_id) DO UPDATE SET 
-                    title = EXCLUDED.title,
-                    year = EXCLUDED.year,
-                    rating = EXCLUDED.rating,
-                    genre = EXCLUDED.genre,
-                    metadata = EXCLUDED.metadata,
-                    updated_at = NOW();
-            """
-            execute_batch(self.cur, sql, self.pending_inserts)
+            written = self._write_rows(self.cur, rows) if rows else 0
+            pruned = prune_file_rows(self.cur, self.pending_prunes)
             self.conn.commit()
-            logger.info(f"✅ Committed a batch of {len(self.pending_inserts)} records to the database.")
+            logger.info(f"✅ Committed a batch of {len(rows)} records to the database ({written} written"
+                        f"{f', {pruned} stale pruned' if pruned else ''}).")
             self.stats['db_batches_committed'] += 1
-            # Clear the list after committing
-            self.pending_inserts.clear()
+            self.stats['rows_written'] += written
+            self.stats['rows_pruned'] += pruned
         except Exception as e:
             logger.error("Database batch insert failed!", exc_info=True)
             self.conn.rollback()
-            self.stats['errors'] += len(self.pending_inserts) # Count these as errors
+            if not rows or salvage_batch(self.conn, rows, self._write_rows, self.stats):
+                commit_prunes(self.conn, self.pending_prunes, self.stats)
+            else:
+                self.stats['errors'] += len(self.pending_inserts) # Count these as errors
+                self.stats['db_batches_failed'] += 1
+        finally:
+            self.metrics.observe('db_commit', time.perf_counter() - started)
+            # Clear the list after committing
             self.pending_inserts.clear()
+            self.pending_prunes = {}
+            self.pending_bytes = 0
 
+    def _write_rows(self, cur, rows):
+        if self.db_writer == 'copy':
+            return copy_upsert(cur, rows)
+        return len(execute_values(cur, values_upsert_sql(), rows, page_size=DB_BATCH_SIZE, fetch=True))
+    
+    def ensure_connection(self):
+        """Reopen the main database connection if the server dropped it."""
+        if not self.conn.closed:
+            return
+        logger.warning("Database connection lost; reconnecting")
+        self.conn = psycopg2.connect(os.getenv('DATABASE_URL'))
+        self.cur = self.conn.cursor()
+    
     def get_latest_change_token(self):
-        """Get the latest stored change token from database"""
+        """Get the latest stored change token from database
+
+        Ends the read's transaction, so the sync daemon does not sit idle in
+        transaction (holding back vacuum) between polls.
+        """
         try:
             self.cur.execute("""
                 SELECT token_value 
@@ -246,9 +615,14 @@ class GoogleDriveCrawler:
                 LIMIT 1
             """)
             result = self.cur.fetchone()
+            self.conn.commit()
             return result[0] if result else None
         except Exception as e:
             logger.error(f"Error getting change token: {e}")
+            try:
+                self.conn.rollback()
+            except Exception:
+                pass
             return None
     
     def save_change_token(self, token):
@@ -280,8 +654,17 @@ class GoogleDriveCrawler:
             logger.error(f"Error getting initial change token: {e}")
             return None
     
-    def process_changes(self, start_token=None):
-        """Process changes from Google Drive using the Changes API"""
+    def process_changes(self, start_token=None, concurrency=DEFAULT_CONCURRENCY):
+        """Process changes from Google Drive using the Changes API.
+
+        Changes are read in windows of up to CHANGE_WINDOW_MAX. Each window is
+        collapsed to the latest change per file, surviving JSON files are
+        downloaded concurrently, and removed or trashed files are deleted in
+        batches. The change token only moves past a window once its writes
+        have committed, so an interrupted sync replays the window next time.
+
+        Returns False if the changes could not be read or applied.
+        """
         logger.info("🔄 Processing changes from Google Drive...")
         
         page_token = start_token or self.get_latest_change_token()
@@ -292,150 +675,689 @@ class GoogleDriveCrawler:
             if page_token:
                 self.save_change_token(page_token)
                 logger.info("✅ Initial token saved. Run crawler again to track changes.")
-                return
+                return True
             else:
                 logger.error("❌ Could not get initial token")
-                return
+                return False
         
         logger.info(f"📍 Starting from page token: {page_token[:20]}...")
         changes_found = False
         
         try:
             while page_token:
-                response = self._retry_api_call(
-                    self.service.changes().list(
-                        pageToken=page_token,
-                        fields="changes(fileId,removed,file(id,name,mimeType,trashed),time),newStartPageToken,nextPageToken",
-                        supportsAllDrives=True,
-                        includeItemsFromAllDrives=True
-                    )
-                )
-                
-                changes = response.get('changes', [])
-                
-                for change in changes:
+                changes, next_token, new_start_token = self.collect_change_window(page_token)
+                if changes:
                     changes_found = True
-                    file_data = change.get('file', {})
-                    
-                    # Process JSON files that were modified
-                    if not change.get('removed') and file_data.get('name', '').endswith('.json'):
-                        logger.info(f"📝 Processing changed file: {file_data.get('name')}")
-                        self.process_json_file(
-                            change['fileId'], 
-                            file_data['name']
-                        )
-                        self.stats['changes_processed'] += 1
+                    self.apply_change_window(changes, concurrency)
                 
-                # Check if there's a new start page token (we've processed all changes)
-                if 'newStartPageToken' in response:
-                    new_token = response['newStartPageToken']
-                    self.save_change_token(new_token)
+                # Checkpoint only after the window's writes have committed
+                checkpoint = new_start_token or next_token
+                if checkpoint != page_token:
+                    self.save_change_token(checkpoint)
+                if new_start_token:
                     logger.info("✅ All changes processed. New token saved.")
                     break
-                
-                # Get next page token if there are more changes
-                page_token = response.get('nextPageToken')
-            
-            # Commit any remaining batch inserts
-            self._commit_batch()
+                page_token = next_token
             
             if not changes_found:
                 logger.info("📭 No changes found since last sync")
+            return True
                 
         except Exception as e:
             logger.error(f"❌ Error processing changes: {e}")
-            self.stats['errors'] += 1
+            self.count('errors')
+            return False
+    
+    def collect_change_window(self, page_token):
+        """Read change pages until the feed is drained or the window is full.
+
+        Returns (changes, next_page_token, new_start_page_token); exactly one
+        of the two tokens is set.
+        """
+        changes = []
+        while True:
+            with self.metrics.timed('list'):
+                response = self._retry_api_call(
+                    self.service.changes().list(
+                        pageToken=page_token,
+                        pageSize=CHANGES_PAGE_SIZE,
+                        fields=f"changes(fileId,removed,file({FILE_LIST_FIELDS},trashed),time),newStartPageToken,nextPageToken",
+                        supportsAllDrives=True,
+                        includeItemsFromAllDrives=True
+                    )
+                )
+            changes.extend(response.get('changes', []))
+            if 'newStartPageToken' in response:
+                return changes, None, response['newStartPageToken']
+            page_token = response.get('nextPageToken')
+            if len(changes) >= CHANGE_WINDOW_MAX:
+                return changes, page_token, None
+    
+    def apply_change_window(self, changes, concurrency=DEFAULT_CONCURRENCY):
+        """Apply one window of changes and commit it; raises if any write failed.
+
+        Files that could not be downloaded or parsed are dead-lettered in the
+        same window, so the change token can still advance and --retry-failed
+        fetches them again.
+        """
+        upserts, removals = collapse_changes(changes)
+        self.stats['changes_processed'] += len(changes)
+        self.stats['changes_applied'] += len(upserts) + len(removals)
+        logger.info(f"🔄 {len(changes)} changes collapsed to {len(upserts)} files to update "
+                    f"and {len(removals)} to delete")
+        
+        failed_batches = self.stats['db_batches_failed']
+        items = [item for item in upserts if self.should_process(item)]
+        if self.download_pool is not None:
+            results = self.download_pool.download(items, 'changed file')
+        else:
+            results = download_files(self, items, concurrency, 'changed file')
+        self.flush_writes()
+        if self.stats['db_batches_failed'] != failed_batches:
+            raise RuntimeError("a database batch failed; the change token was not advanced")
+        
+        failed = [item for item, ok in zip(items, results) if not ok]
+        if failed:
+            try:
+                dead_letter_files(self.cur, [
+                    (item['id'], f"could not download or parse {item.get('name')} while applying changes")
+                    for item in failed
+                ])
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+            self.stats['rows_dead_lettered'] += len(failed)
+            logger.warning(f"☠️  Dead-lettered {len(failed)} changed files that failed (rerun with --retry-failed)")
+        
+        if removals:
+            try:
+                deleted = delete_movies(self.cur, removals)
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+            for file_id in removals:
+                self.known_versions.pop(file_id, None)
+            self.stats['files_deleted'] += deleted
+            logger.info(f"🗑️  Deleted {deleted} removed or trashed movies")
     
-    def run(self, folder_id, mode='full'):
+    def run(self, folder_id, mode='full', engine='threaded', concurrency=DEFAULT_CONCURRENCY,
+            listers=DEFAULT_LISTERS, discovery_mode='auto', resume=False):
         """Main crawler execution.
         
         Args:
             folder_id: Google Drive folder ID to crawl
             mode: 'full' for complete crawl, 'changes' for incremental updates
+            engine: 'threaded' for the sequential worker pool, 'async' for the asyncio engine
+            concurrency: Maximum concurrent downloads for the async engine
+            listers: Number of concurrent folder listers for the async engine
+            discovery_mode: 'recursive', 'flat' or 'auto' to choose from a folder-count estimate
+            resume: Continue the last interrupted full crawl of folder_id from its checkpoint
+
+        Returns:
+            True if the crawl or sync completed, False if it failed or left folders unlisted
         """
         logger.info("🚀 Starting Google Drive crawler...")
         logger.info(f"📍 Root folder ID: {folder_id}")
         logger.info(f"🎯 Mode: {mode}")
         
-        if mode == 'changes':
-            # Process only changes since last sync
-            self.process_changes()
-        else:
-            # Full crawl mode
-            if not self.service or not self.test_folder_access(folder_id):
-                logger.critical("Cannot proceed without folder access. Exiting.")
-                return
-            
-            start_time = time.time()
-            try:
-                self.crawl_folder(folder_id)
+        start_time = time.time()
+        self.load_known_versions()
+        self.start_writer()
+        try:
+            if mode == 'changes':
+                # Process only changes since last sync
+                succeeded = self.process_changes(concurrency=concurrency)
+            else:
+                # Full crawl mode
+                if not self.service or not self.test_folder_access(folder_id):
+                    logger.critical("Cannot proceed without folder access. Exiting.")
+                    return False
+                
+                logger.info(f"⚙️  Engine: {engine}")
+                checkpoint = CrawlCheckpoint.resume(self.conn, folder_id) if resume else None
+                if checkpoint is not None:
+                    logger.info(f"⏯️  Resuming crawl {checkpoint.run_id}: {len(checkpoint.frontier)} folders "
+                                f"pending, {len(checkpoint.done)} done")
+                    discovery_mode, discovery = choose_discovery(self, folder_id, checkpoint.discovery_mode)
+                else:
+                    if resume:
+                        logger.info("⏯️  No interrupted crawl to resume, starting a new one")
+                    # Taken before listing starts so edits made during the crawl are picked up by --changes
+                    start_page_token = self.get_initial_change_token()
+                    discovery_mode, discovery = choose_discovery(self, folder_id, discovery_mode)
+                    checkpoint = CrawlCheckpoint.start(self.conn, folder_id, start_page_token, discovery_mode)
+                logger.info(f"🔎 Discovery: {discovery_mode}")
+                if engine == 'async':
+                    AsyncCrawlEngine(self, concurrency=concurrency, listers=listers).run(
+                        folder_id, discovery=discovery, checkpoint=checkpoint
+                    )
+                elif discovery is not None:
+                    self.crawl_flat(discovery, checkpoint=checkpoint)
+                else:
+                    self.crawl_folder(folder_id, checkpoint=checkpoint)
                 
                 # Final commit for any remaining items
-                self._commit_batch()
+                self.flush_writes()
                 
-                # After full crawl, get initial token for future change tracking
-                initial_token = self.get_initial_change_token()
-                if initial_token:
-                    self.save_change_token(initial_token)
-                    logger.info("💾 Initial change token saved for future incremental updates")
-                    
-            finally:
-                # Ensure resources are cleaned up
-                pass
+                succeeded = checkpoint.is_complete()
+                if succeeded:
+                    checkpoint.complete()
+                    if checkpoint.start_page_token:
+                        self.save_change_token(checkpoint.start_page_token)
+                        logger.info("💾 Change token from the start of the crawl saved for future incremental updates")
+                else:
+                    checkpoint.save()
+                    logger.warning("⚠️  Some folders could not be listed. Run again with --resume to retry them.")
+        finally:
+            # Ensure pending rows are written and the writer connection is closed
+            self.stop_writer()
+        self.process_new_movies()
             
-            elapsed_time = time.time() - start_time
+        elapsed_time = time.time() - start_time
+        files_per_sec = self.stats['files_processed'] / elapsed_time if elapsed_time > 0 else 0.0
         
         # Print summary
         logger.info("="*50)
         logger.info("📊 CRAWL SUMMARY")
         logger.info("="*50)
-        logger.info(f"✅ Files processed: {self.stats['files_processed']}")
+        logger.info(f"✅ Files processed: {self.stats['files_processed']} "
+                    f"({self.stats['records_processed']} movies, {self.stats['record_errors']} bad records)")
+        logger.info(f"⬇️  Files downloaded: {self.stats['files_downloaded']}")
+        logger.info(f"⏭️  Files skipped (unchanged): {self.stats['files_skipped']}")
+        logger.info(f"✍️  Rows written: {self.stats['rows_written']}")
         logger.info(f"📁 Folders processed: {self.stats['folders_processed']}")
         logger.info(f"📦 DB batches committed: {self.stats['db_batches_committed']}")
+        if self.writer_summary:
+            logger.info(f"🚰 Writer stage: {self.writer_summary}")
+        logger.info(f"⏲️  Stage latency: {self.metrics.summary()}")
         if mode == 'changes':
-            logger.info(f"🔄 Changes processed: {self.stats['changes_processed']}")
+            logger.info(f"🔄 Changes processed: {self.stats['changes_processed']} "
+                        f"({self.stats['changes_applied']} after collapsing, {self.stats['files_deleted']} deleted)")
+        if self.stats['movies_embedded']:
+            logger.info(f"🧭 Movies embedded: {self.stats['movies_embedded']}")
+        if self.stats['movies_deduped']:
+            logger.info(f"👯 Movies matched for duplicates: {self.stats['movies_deduped']} "
+                        f"({self.stats['duplicate_memberships']} cluster memberships written)")
         logger.info(f"❌ Errors: {self.stats['errors']}")
+        if self.stats['rows_dead_lettered']:
+            logger.info(f"☠️  Rows dead-lettered: {self.stats['rows_dead_lettered']} (rerun with --retry-failed)")
+        if self.stats['rows_pruned']:
+            logger.info(f"✂️  Stale rows pruned: {self.stats['rows_pruned']}")
         if mode == 'full':
-            logger.info(f"⏱️  Time elapsed: {elapsed_time:.2f} seconds")
+            logger.info(f"🔎 Discovery mode: {discovery_mode} ({self.stats['list_api_calls']} listing API calls)")
+        logger.info(f"🌐 Drive API calls: {self.stats['api_calls']}")
+        logger.info(f"🚦 Rate governor: {self.governor.summary()}")
+        logger.info(f"⏱️  Time elapsed: {elapsed_time:.2f} seconds")
+        logger.info(f"🚄 Throughput: {files_per_sec:.1f} files/sec")
+        return succeeded
+    
+    def run_daemon(self, concurrency=DEFAULT_CONCURRENCY, min_interval=DAEMON_MIN_INTERVAL,
+                   max_interval=DAEMON_MAX_INTERVAL, push_port=None, push_token=None, push_address=None):
+        """Apply Drive changes continuously until SIGTERM or Ctrl-C.
+
+        The daemon finishes the poll in progress, then the writer stage
+        flushes its pending batch before the process exits.
+        """
+        logger.info("🚀 Starting Google Drive change sync daemon...")
+        daemon = ChangeSyncDaemon(self, concurrency=concurrency, min_interval=min_interval,
+                                  max_interval=max_interval, push_port=push_port,
+                                  push_token=push_token, push_address=push_address)
+        handlers = {sig: signal.signal(sig, lambda signum, frame: daemon.stop())
+                    for sig in (signal.SIGTERM, signal.SIGINT)}
+        start_time = time.time()
+        self.load_known_versions()
+        self.start_writer()
+        try:
+            daemon.run()
+        finally:
+            self.stop_writer()
+            for sig, handler in handlers.items():
+                signal.signal(sig, handler)
+        
+        logger.info("="*50)
+        logger.info("📊 SYNC DAEMON SUMMARY")
+        logger.info("="*50)
+        logger.info(f"🛰️  Polls: {daemon.summary()}")
+        logger.info(f"🔄 Changes processed: {self.stats['changes_processed']} "
+                    f"({self.stats['changes_applied']} after collapsing, {self.stats['files_deleted']} deleted)")
+        logger.info(f"✍️  Rows written: {self.stats['rows_written']}")
+        if self.writer_summary:
+            logger.info(f"🚰 Writer stage: {self.writer_summary}")
+        logger.info(f"⏲️  Stage latency: {self.metrics.summary()}")
+        if self.stats['movies_embedded']:
+            logger.info(f"🧭 Movies embedded: {self.stats['movies_embedded']}")
+        if self.stats['movies_deduped']:
+            logger.info(f"👯 Movies matched for duplicates: {self.stats['movies_deduped']} "
+                        f"({self.stats['duplicate_memberships']} cluster memberships written)")
+        logger.info(f"❌ Errors: {self.stats['errors']}")
+        logger.info(f"🌐 Drive API calls: {self.stats['api_calls']}")
+        logger.info(f"🚦 Rate governor: {self.governor.summary()}")
+        logger.info(f"⏱️  Uptime: {time.time() - start_time:.2f} seconds")
+    
+    def run_local_ingest(self, directory, processes=None):
+        """Load movie files from a local directory tree instead of Drive.
+
+        Used for initial loads and disaster recovery: files are parsed across
+        a process pool and written through the same batched writer.
+        """
+        logger.info(f"🚀 Ingesting movie files from {directory}")
+        start_time = time.time()
+        self.load_known_versions()
+        self.start_writer()
+        try:
+            ingest_directory(self, directory, processes=processes)
+        finally:
+            self.stop_writer()
+        self.process_new_movies()
+        
+        elapsed_time = time.time() - start_time
+        files_per_sec = self.stats['files_processed'] / elapsed_time if elapsed_time > 0 else 0.0
+        logger.info("="*50)
+        logger.info("📊 INGEST SUMMARY")
+        logger.info("="*50)
+        logger.info(f"✅ Files processed: {self.stats['files_processed']} "
+                    f"({self.stats['records_processed']} movies, {self.stats['record_errors']} bad records)")
+        logger.info(f"⏭️  Files skipped (unchanged): {self.stats['files_skipped']}")
+        logger.info(f"✍️  Rows written: {self.stats['rows_written']}")
+        logger.info(f"📦 DB batches committed: {self.stats['db_batches_committed']}")
+        if self.writer_summary:
+            logger.info(f"🚰 Writer stage: {self.writer_summary}")
+        logger.info(f"⏲️  Stage latency: {self.metrics.summary()}")
+        if self.stats['movies_embedded']:
+            logger.info(f"🧭 Movies embedded: {self.stats['movies_embedded']}")
+        if self.stats['movies_deduped']:
+            logger.info(f"👯 Movies matched for duplicates: {self.stats['movies_deduped']} "
+                        f"({self.stats['duplicate_memberships']} cluster memberships written)")
+        logger.info(f"❌ Errors: {self.stats['errors']}")
+        logger.info(f"⏱️  Time elapsed: {elapsed_time:.2f} seconds")
+        logger.info(f"🚄 Throughput: {files_per_sec:.1f} files/sec")
+    
+    def retry_failed(self, concurrency=DEFAULT_CONCURRENCY, ingest_dir=None, processes=None):
+        """Reprocess only the files with dead-lettered rows instead of re-running the crawl.
+
+        Each file is downloaded again (or re-read from ingest_dir for locally
+        ingested files) and all of its rows go back through the writer. Dead
+        letters of files that were reprocessed are cleared unless a row
+        failed again; files that no longer exist on Drive are cleared too.
+        """
+        logger.info("🚀 Retrying dead-lettered files...")
+        start_time = time.time()
+        self.cur.execute("""
+            SELECT source_file_id, COUNT(*), NOW()
+            FROM crawl_dead_letters
+            GROUP BY source_file_id
+            ORDER BY source_file_id
+        """)
+        entries = self.cur.fetchall()
+        self.conn.commit()
+        if not entries:
+            logger.info("✅ No dead-lettered rows to retry")
+            return
+        started_at = entries[0][2]
+        drive_ids = [file_id for file_id, _, _ in entries if not file_id.startswith(LOCAL_ID_PREFIX)]
+        local_ids = {file_id for file_id, _, _ in entries if file_id.startswith(LOCAL_ID_PREFIX)}
+        logger.info(f"☠️  {sum(count for _, count, _ in entries)} dead-lettered rows in "
+                    f"{len(drive_ids)} Drive files and {len(local_ids)} local files")
+        
+        retried, gone = [], []
+        self.start_writer()
+        try:
+            if drive_ids and self.service is None:
+                logger.warning("⚠️  Skipping Drive files: no service account in --ingest-dir mode")
+            elif drive_ids:
+                items = []
+                for file_id in drive_ids:
+                    try:
+                        item = self._retry_api_call(self.service.files().get(
+                            fileId=file_id,
+                            fields="id, name, md5Checksum, modifiedTime, trashed",
+                            supportsAllDrives=True
+                        ))
+                    except Exception as e:
+                        if error_status(e) != 404:
+                            logger.error(f"Could not look up {file_id}: {e}")
+                            continue
+                        item = {'id': file_id, 'trashed': True}
+                    if item.get('trashed'):
+                        gone.append(file_id)
+                    else:
+                        items.append(item)
+                results = download_files(self, items, concurrency, 'dead-lettered file')
+                retried.extend(item['id'] for item, ok in zip(items, results) if ok)
+            if local_ids and ingest_dir is None:
+                logger.warning("⚠️  Skipping local files: pass --ingest-dir to re-read them")
+            elif local_ids:
+                retried.extend(ingest_directory(self, ingest_dir, processes=processes, only=local_ids))
+        finally:
+            self.stop_writer()
+        self.process_new_movies()
+        
+        # Rows that failed again were dead-lettered after started_at and stay for the next retry
+        cleared = 0
+        try:
+            self.cur.execute("DELETE FROM crawl_dead_letters WHERE source_file_id = ANY(%s) AND last_failed_at < %s",
+                             (retried + gone, started_at))
+            cleared = self.cur.rowcount
+            self.conn.commit()
+        except Exception as e:
+            logger.error(f"Could not clear retried dead letters: {e}")
+            self.conn.rollback()
+        
+        logger.info("="*50)
+        logger.info("📊 RETRY SUMMARY")
+        logger.info("="*50)
+        logger.info(f"🔁 Files reprocessed: {len(retried)} ({len(gone)} no longer on Drive)")
+        logger.info(f"✍️  Rows written: {self.stats['rows_written']}")
+        logger.info(f"🧹 Dead letters cleared: {cleared}")
+        logger.info(f"☠️  Rows dead-lettered again: {self.stats['rows_dead_lettered']}")
+        if self.stats['movies_embedded']:
+            logger.info(f"🧭 Movies embedded: {self.stats['movies_embedded']}")
+        if self.stats['movies_deduped']:
+            logger.info(f"👯 Movies matched for duplicates: {self.stats['movies_deduped']} "
+                        f"({self.stats['duplicate_memberships']} cluster memberships written)")
+        logger.info(f"❌ Errors: {self.stats['errors']}")
+        logger.info(f"⏱️  Time elapsed: {time.time() - start_time:.2f} seconds")
+    
+    def seed_distributed_crawl(self, folder_id):
+        """Queue a new distributed crawl of folder_id for --worker processes to run."""
+        if not self.service or not self.test_folder_access(folder_id):
+            logger.critical("Cannot proceed without folder access. Exiting.")
+            return None
+        # Taken before any worker lists a folder so edits made during the crawl are picked up by --changes
+        start_page_token = self.get_initial_change_token()
+        run_id = JobQueue.create_run(self.conn, folder_id, start_page_token)
+        logger.info(f"🌱 Queued distributed crawl {run_id}; start workers with --worker")
+        return run_id
+    
+    def run_worker(self, folder_id, worker_id=None, concurrency=DEFAULT_CONCURRENCY):
+        """Work on the running distributed crawl of folder_id until its job queue drains.
+
+        Any number of workers, on any host that can reach the database, can
+        run at once. The worker that completes the run saves the change token
+        captured when it was seeded.
+
+        Returns False if there was no run to work on, or if this worker
+        completed it and some of its jobs failed.
+        """
+        run_id = JobQueue.active_run(self.conn, folder_id)
+        if run_id is None:
+            logger.error("❌ No distributed crawl is running for this folder. Queue one with --seed.")
+            return False
+        
+        start_time = time.time()
+        heartbeat_conn = psycopg2.connect(os.getenv('DATABASE_URL'))
+        worker = CrawlWorker(self, JobQueue(self.conn, run_id), JobQueue(heartbeat_conn, run_id),
+                             worker_id=worker_id, concurrency=concurrency)
+        # Finish the current batch and hand back claims instead of waiting for leases to expire
+        previous_handler = signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+        self.load_known_versions()
+        self.start_writer()
+        try:
+            worker.run()
+        finally:
+            self.stop_writer()
+            signal.signal(signal.SIGTERM, previous_handler)
+            heartbeat_conn.close()
+        
+        succeeded = True
+        if worker.finished_run:
+            counts = worker.queue.counts()
+            succeeded = not counts.get('failed')
+            logger.info(f"🏁 Distributed crawl {run_id} complete: {counts.get('done', 0)} jobs done, "
+                        f"{counts.get('failed', 0)} failed")
+            if worker.start_page_token:
+                self.save_change_token(worker.start_page_token)
+                logger.info("💾 Change token from the start of the crawl saved for future incremental updates")
+            # Only one worker completes the run, so only one processes its movies
+            self.process_new_movies()
+        
+        elapsed_time = time.time() - start_time
+        logger.info("="*50)
+        logger.info(f"📊 WORKER SUMMARY ({worker.worker_id})")
+        logger.info("="*50)
+        logger.info(f"👷 Jobs: {worker.summary()}")
+        logger.info(f"✅ Files processed: {self.stats['files_processed']}")
+        logger.info(f"✍️  Rows written: {self.stats['rows_written']}")
+        logger.info(f"📦 DB batches committed: {self.stats['db_batches_committed']}")
+        if self.writer_summary:
+            logger.info(f"🚰 Writer stage: {self.writer_summary}")
+        logger.info(f"⏲️  Stage latency: {self.metrics.summary()}")
+        if self.stats['movies_embedded']:
+            logger.info(f"🧭 Movies embedded: {self.stats['movies_embedded']}")
+        if self.stats['movies_deduped']:
+            logger.info(f"👯 Movies matched for duplicates: {self.stats['movies_deduped']} "
+                        f"({self.stats['duplicate_memberships']} cluster memberships written)")
+        logger.info(f"❌ Errors: {self.stats['errors']}")
+        logger.info(f"🌐 Drive API calls: {self.stats['api_calls']}")
+        logger.info(f"🚦 Rate governor: {self.governor.summary()}")
+        logger.info(f"⏱️  Time elapsed: {elapsed_time:.2f} seconds")
+        return succeeded
+    
+    def process_new_movies(self):
+        """Stages over the movies a run wrote, once the writer has committed them."""
+        self.embed_movies()
+        self.detect_duplicates()
+    
+    def embed_movies(self):
+        """Embedding stage: embed movies written or changed since their last embedding.
+
+        Runs once the writer stage has committed its rows. A failure, e.g. a
+        database without the pgvector extension, is logged and the movies are
+        picked up again by the next run.
+        """
+        if not self.embed:
+            return
+        try:
+            self.ensure_connection()
+            self.stats['movies_embedded'] += embed_pending(self.conn, metrics=self.metrics)
+        except Exception as e:
+            logger.error(f"Embedding stage failed: {e}")
+            self.count('errors')
+            try:
+                self.conn.rollback()
+            except Exception:
+                pass
+    
+    def detect_duplicates(self, rebuild=False):
+        """Duplicate detection stage: match new and retitled movies against the catalog.
+
+        Failures are logged like those of the embedding stage; unmatched
+        movies stay pending for the next run.
+        """
+        if not self.dedupe:
+            return
+        try:
+            self.ensure_connection()
+            matched, written = detect_duplicates(self.conn, metrics=self.metrics, rebuild=rebuild)
+            self.stats['movies_deduped'] += matched
+            self.stats['duplicate_memberships'] += written
+        except Exception as e:
+            logger.error(f"Duplicate detection failed: {e}")
+            self.count('errors')
+            try:
+                self.conn.rollback()
+            except Exception:
+                pass
+    
+    def check_stats(self, rebuild=False):
+        """Compare the aggregate stats tables with movies and rebuild them if they drifted.
+
+        The database triggers keep them current, so a mismatch means rows were
+        changed with the triggers disabled; rebuild recomputes them regardless.
+        Returns the number of aggregates that differed.
+        """
+        self.ensure_connection()
+        return verify_stats(self.conn, rebuild=rebuild)
+    
+    def start_metrics_export(self, port=None, path=None, host=METRICS_HOST):
+        """Publish live metrics on http://host:port/metrics and/or to a textfile."""
+        self.metrics_exporter = MetricsExporter(self.metrics, port=port, path=path, host=host)
+        self.metrics_exporter.start()
     
     def close(self):
         """Clean up connections."""
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.stop()
+            self.metrics_exporter = None
         self.cur.close()
         self.conn.close()
         logger.info("Database connection closed.")
 
+def parse_args(argv=None):
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Crawl movie JSON files from Google Drive into PostgreSQL.")
+    parser.add_argument('--changes', action='store_true',
+                        help="Run incremental update using Changes API (default: full crawl of the folder)")
+    parser.add_argument('--engine', choices=['threaded', 'async'], default='threaded',
+                        help="Crawl engine for full crawls (default: threaded)")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Concurrent downloads for the async engine, --changes, --daemon and --worker (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument('--listers', type=int, default=DEFAULT_LISTERS,
+                        help=f"Concurrent folder listers for the async engine (default: {DEFAULT_LISTERS})")
+    parser.add_argument('--db-writer', choices=DB_WRITERS, default='copy',
+                        help="Database write path: COPY into a staging table and merge, or multi-row "
+                             "INSERT ... VALUES (default: copy)")
+    parser.add_argument('--discovery', choices=DISCOVERY_MODES, default='auto',
+                        help="How full crawls find files: per-folder listing, flat account-wide listing, "
+                             "or auto to pick from a folder-count estimate (default: auto)")
+    parser.add_argument('--resume', action='store_true',
+                        help="Continue the last interrupted full crawl from its saved checkpoint")
+    parser.add_argument('--daemon', action='store_true',
+                        help="Keep running and apply changes continuously instead of a one-shot --changes run")
+    parser.add_argument('--min-interval', type=float, default=DAEMON_MIN_INTERVAL,
+                        help=f"Daemon poll interval while changes keep arriving, in seconds (default: {DAEMON_MIN_INTERVAL:.0f})")
+    parser.add_argument('--max-interval', type=float, default=DAEMON_MAX_INTERVAL,
+                        help=f"Longest daemon poll interval when idle, in seconds (default: {DAEMON_MAX_INTERVAL:.0f})")
+    parser.add_argument('--push-port', type=int,
+                        help="Local port for Drive push notifications that trigger an immediate poll")
+    parser.add_argument('--push-address',
+                        help="Public HTTPS URL forwarding to --push-port; opens and renews a changes().watch channel")
+    parser.add_argument('--push-token', default=os.getenv('DRIVE_PUSH_TOKEN'),
+                        help="Secret expected in X-Goog-Channel-Token (default: $DRIVE_PUSH_TOKEN)")
+    parser.add_argument('--ingest-dir', metavar='PATH',
+                        help="Load movie files from a local directory tree instead of Google Drive")
+    parser.add_argument('--processes', type=int,
+                        help="Parser processes for --ingest-dir (default: one per CPU)")
+    parser.add_argument('--metrics-port', type=int,
+                        help="Serve live Prometheus metrics on this port at /metrics")
+    parser.add_argument('--metrics-host', default=METRICS_HOST,
+                        help=f"Interface for --metrics-port; 0.0.0.0 to allow remote scrapes (default: {METRICS_HOST})")
+    parser.add_argument('--metrics-file', metavar='PATH',
+                        help="Write Prometheus metrics to this textfile periodically and at exit")
+    parser.add_argument('--profile', metavar='PATH',
+                        help="Profile the run with cProfile and write the stats dump to PATH")
+    parser.add_argument('--retry-failed', action='store_true',
+                        help="Reprocess only the files with dead-lettered rows (with --ingest-dir: local files)")
+    parser.add_argument('--embed', action='store_true',
+                        help="Only run the embedding stage over stored movies that have no current embedding")
+    parser.add_argument('--no-embed', action='store_true',
+                        help="Skip the embedding stage after crawls (e.g. on a database without pgvector)")
+    parser.add_argument('--dedupe', action='store_true',
+                        help="Only run duplicate detection over stored movies added or retitled since the last run")
+    parser.add_argument('--dedupe-rebuild', action='store_true',
+                        help="Discard all duplicate clusters and match the whole catalog again")
+    parser.add_argument('--no-dedupe', action='store_true',
+                        help="Skip duplicate detection after crawls")
+    parser.add_argument('--check-stats', action='store_true',
+                        help="Only compare the aggregate stats tables with movies, rebuilding them if they differ")
+    parser.add_argument('--rebuild-stats', action='store_true',
+                        help="Recompute the aggregate stats tables from movies without comparing first")
+    parser.add_argument('--seed', action='store_true',
+                        help="Queue a distributed full crawl in the crawl_jobs table for --worker processes")
+    parser.add_argument('--worker', action='store_true',
+                        help="Claim and run jobs of the queued distributed crawl until it completes")
+    parser.add_argument('--worker-id',
+                        help="Name recorded on the jobs this worker claims (default: hostname-pid)")
+    parser.add_argument('--service-account', default=SERVICE_ACCOUNT_FILE,
+                        help=f"Service account key file (default: {SERVICE_ACCOUNT_FILE})")
+    return parser.parse_args(argv)
+
 def main():
     """Main execution function."""
-    import sys
-    
+    args = parse_args()
+    with profiled(args.profile):
+        succeeded = run_cli(args)
+    if not succeeded:
+        sys.exit(1)
+
+def run_cli(args):
+    """Run the mode selected on the command line; returns False if it failed."""
     if not os.getenv('DATABASE_URL'):
         logger.critical("DATABASE_URL environment variable not set.")
-        return
-
-    if not os.path.exists(SERVICE_ACCOUNT_FILE):
-        logger.critical(f"'{SERVICE_ACCOUNT_FILE}' not found. Please follow setup instructions.")
-        return
-
-    # Check for command line argument
-    mode = 'full'
-    if len(sys.argv) > 1:
-        if sys.argv[1] == '--changes':
-            mode = 'changes'
-        elif sys.argv[1] == '--help':
-            print("Usage: python crawl_google_drive.py [--changes]")
-            print("  --changes  : Run incremental update using Changes API")
-            print("  (default)  : Run full crawl of the folder")
-            return
+        return False
 
-    crawler = GoogleDriveCrawler()
+    if args.ingest_dir:
+        if not os.path.isdir(args.ingest_dir):
+            logger.critical(f"'{args.ingest_dir}' is not a directory.")
+            return False
+        crawler = GoogleDriveCrawler(db_writer=args.db_writer, offline=True, embed=not args.no_embed,
+                                     dedupe=not args.no_dedupe)
+        try:
+            if args.metrics_port is not None or args.metrics_file:
+                crawler.start_metrics_export(port=args.metrics_port, path=args.metrics_file,
+                                             host=args.metrics_host)
+            if args.retry_failed:
+                crawler.retry_failed(ingest_dir=args.ingest_dir, processes=args.processes)
+            else:
+                crawler.run_local_ingest(args.ingest_dir, processes=args.processes)
+            return True
+        except Exception as e:
+            logger.critical("An uncaught exception occurred!", exc_info=True)
+            return False
+        finally:
+            crawler.close()
+
+    if args.embed or args.dedupe or args.dedupe_rebuild or args.check_stats or args.rebuild_stats:
+        crawler = GoogleDriveCrawler(offline=True)
+        try:
+            if args.embed:
+                crawler.embed_movies()
+                logger.info(f"🧭 Movies embedded: {crawler.stats['movies_embedded']}")
+            if args.dedupe or args.dedupe_rebuild:
+                crawler.detect_duplicates(rebuild=args.dedupe_rebuild)
+                logger.info(f"👯 Movies matched for duplicates: {crawler.stats['movies_deduped']} "
+                            f"({crawler.stats['duplicate_memberships']} cluster memberships written)")
+            if args.check_stats or args.rebuild_stats:
+                crawler.check_stats(rebuild=args.rebuild_stats)
+        finally:
+            crawler.close()
+        return True
+
+    if not os.path.exists(args.service_account):
+        logger.critical(f"'{args.service_account}' not found. Please follow setup instructions.")
+        return False
+
+    mode = 'changes' if args.changes else 'full'
+
+    crawler = GoogleDriveCrawler(db_writer=args.db_writer, service_account_file=args.service_account,
+                                 embed=not args.no_embed, dedupe=not args.no_dedupe)
     try:
+        if args.metrics_port is not None or args.metrics_file:
+            crawler.start_metrics_export(port=args.metrics_port, path=args.metrics_file,
+                                         host=args.metrics_host)
+        if args.retry_failed:
+            crawler.retry_failed(concurrency=args.concurrency)
+            return True
         folder_id = os.getenv('GOOGLE_FOLDER_ID')
         if not folder_id:
             logger.critical("GOOGLE_FOLDER_ID environment variable not set.")
-            return
-        crawler.run(folder_id, mode=mode)
+            return False
+        if args.daemon:
+            crawler.run_daemon(concurrency=args.concurrency, min_interval=args.min_interval,
+                               max_interval=args.max_interval, push_port=args.push_port,
+                               push_token=args.push_token, push_address=args.push_address)
+            return True
+        if args.seed:
+            return crawler.seed_distributed_crawl(folder_id) is not None
+        if args.worker:
+            return crawler.run_worker(folder_id, worker_id=args.worker_id, concurrency=args.concurrency)
+        return crawler.run(folder_id, mode=mode, engine=args.engine, concurrency=args.concurrency,
+                           listers=args.listers, discovery_mode=args.discovery, resume=args.resume)
     except Exception as e:
         logger.critical("An uncaught exception occurred!", exc_info=True)
+        return False
     finally:
         crawler.close()
 
@@ -0,0 +1,257 @@
+import hashlib
+import logging
+import random
+import re
+import time
+import unicodedata
+from array import array
+from functools import lru_cache
+
+from psycopg2.extras import execute_values
+
+logger = logging.getLogger(__name__)
+
+SHINGLE_SIZE = 3 # Characters per title shingle
+MINHASH_BANDS = 16 # LSH bands x rows = signature length; 16 x 4 finds ~99% of pairs at Jaccard 0.7
+MINHASH_ROWS = 4
+MINHASH_SEED = 20240501 # Changing the seed, bands or rows needs a --dedupe-rebuild
+DUPLICATE_THRESHOLD = 0.7 # Minimum Jaccard similarity of title shingles for a duplicate
+DEDUPE_BATCH_SIZE = 5000 # Movies hashed, matched and committed per transaction
+DEDUPE_STAGE = 'dedupe' # movie_pending.stage the movies triggers queue movies under (database/init.sql)
+SHINGLE_CACHE_SIZE = 1 << 15 # Hashed shingles kept in memory; titles share most of their shingles
+MERSENNE_PRIME = (1 << 61) - 1
+
+_rng = random.Random(MINHASH_SEED)
+# One universal hash function (a * x + b) mod p per signature slot
+PERMUTATIONS = [(_rng.randrange(1, MERSENNE_PRIME), _rng.randrange(0, MERSENNE_PRIME))
+                for _ in range(MINHASH_BANDS * MINHASH_ROWS)]
+
+YEAR_SUFFIX = re.compile(r"[\(\[]\s*\d{4}\s*[\)\]]")
+LEADING_ARTICLE = re.compile(r"^(the|a|an)\s+")
+TRAILING_ARTICLE = re.compile(r",\s*(the|a|an)$")
+NON_ALNUM = re.compile(r"[^\w]+|_", re.UNICODE)
+
+
+def normalise_title(title):
+    """Fold a title to the form duplicates share.
+
+    "Dark Knight, The (2008)" and "The Dark Knight" both become "dark knight":
+    accents, case, a year in brackets, leading or trailing articles and
+    punctuation are all dropped.
+    """
+    text = unicodedata.normalize('NFKD', title or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    text = YEAR_SUFFIX.sub(' ', text).replace('&', ' and ').strip()
+    text = TRAILING_ARTICLE.sub('', text)
+    text = LEADING_ARTICLE.sub('', text)
+    return ' '.join(NON_ALNUM.sub(' ', text).split())
+
+
+def shingles(title):
+    """Character shingles of a normalised title, padded so word edges count."""
+    text = f" {title} "
+    if len(text) <= SHINGLE_SIZE:
+        return {text}
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+@lru_cache(maxsize=SHINGLE_CACHE_SIZE)
+def hashed_shingle(shingle):
+    """Every hash function applied to one shingle."""
+    x = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'little')
+    return array('Q', [(a * x + b) % MERSENNE_PRIME for a, b in PERMUTATIONS])
+
+
+def signature(shingle_set):
+    """MinHash signature: the minimum of each hash function over the shingles."""
+    return list(map(min, zip(*[hashed_shingle(s) for s in shingle_set])))
+
+
+def band_keys(shingle_set):
+    """One signed 64-bit LSH bucket key per band of the signature.
+
+    Two titles share a bucket in a band when all MINHASH_ROWS values of the
+    band agree, which happens with probability Jaccard ** MINHASH_ROWS.
+    """
+    values = signature(shingle_set)
+    keys = []
+    for band in range(MINHASH_BANDS):
+        rows = values[band * MINHASH_ROWS:(band + 1) * MINHASH_ROWS]
+        data = band.to_bytes(2, 'little') + b''.join(v.to_bytes(8, 'little') for v in rows)
+        keys.append(int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little', signed=True))
+    return keys
+
+
+def merge_clusters(pairs, memberships):
+    """Union verified duplicate pairs with the clusters their movies already belong to.
+
+    pairs are (movie_id, movie_id, similarity) and memberships map movie_id
+    to (cluster_id, similarity) for every member of every cluster touched.
+    Returns {movie_id: (cluster_id, similarity)} for every movie whose row
+    must be written. A cluster is identified by its smallest movie ID, so
+    merging clusters keeps the result independent of processing order.
+    """
+    parent = {}
+
+    def find(node):
+        parent.setdefault(node, node)
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    def union(a, b):
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    best = {movie_id: similarity for movie_id, (_, similarity) in memberships.items()}
+    for movie_id, (cluster_id, _) in memberships.items():
+        union(movie_id, cluster_id)
+    for a, b, similarity in pairs:
+        union(a, b)
+        best[a] = max(best.get(a, 0.0), similarity)
+        best[b] = max(best.get(b, 0.0), similarity)
+
+    result = {}
+    for movie_id, similarity in best.items():
+        cluster_id = find(movie_id)
+        if memberships.get(movie_id) != (cluster_id, similarity):
+            result[movie_id] = (cluster_id, similarity)
+    return result
+
+
+def match_batch(cur, movies):
+    """Hash a batch of (id, title, year) movies into LSH buckets and record their duplicates.
+
+    Candidates are the movies sharing a bucket and a year with a movie of the
+    batch, found by one indexed join, so the work grows with the batch and
+    the size of its buckets rather than with the catalog. Each candidate
+    pair is confirmed on the exact Jaccard similarity of the title shingles.
+    Returns the number of duplicate memberships written.
+    """
+    ids = [movie_id for movie_id, _, _ in movies]
+    cur.execute("DELETE FROM movie_lsh_bands WHERE movie_id = ANY(%s::uuid[])", (ids,))
+    cur.execute("DELETE FROM movie_duplicates WHERE movie_id = ANY(%s::uuid[])", (ids,))
+
+    bands, titles = [], {}
+    for movie_id, title, year in movies:
+        normalised = normalise_title(title)
+        if not normalised:
+            continue
+        titles[movie_id] = shingles(normalised)
+        bands.extend((movie_id, year or 0, key) for key in band_keys(titles[movie_id]))
+    if not bands:
+        return 0
+    execute_values(cur, "INSERT INTO movie_lsh_bands (movie_id, year, band_key) VALUES %s ON CONFLICT DO NOTHING",
+                   bands, template="(%s::uuid, %s, %s)", page_size=10000)
+
+    cur.execute("""
+        SELECT DISTINCT n.movie_id::text, o.movie_id::text
+        FROM movie_lsh_bands n
+        JOIN movie_lsh_bands o ON o.year = n.year AND o.band_key = n.band_key AND o.movie_id <> n.movie_id
+        WHERE n.movie_id = ANY(%s::uuid[])
+    """, (list(titles),))
+    candidates = cur.fetchall()
+    if not candidates:
+        return 0
+
+    others = {b for _, b in candidates if b not in titles}
+    if others:
+        cur.execute("SELECT id::text, title FROM movies WHERE id = ANY(%s::uuid[])", (list(others),))
+        for movie_id, title in cur.fetchall():
+            titles[movie_id] = shingles(normalise_title(title))
+    pairs = {}
+    for a, b in candidates:
+        if b in titles:
+            similarity = jaccard(titles[a], titles[b])
+            if similarity >= DUPLICATE_THRESHOLD:
+                pairs[min(a, b), max(a, b)] = similarity
+    if not pairs:
+        return 0
+
+    involved = list({movie_id for pair in pairs for movie_id in pair})
+    cur.execute("""
+        SELECT movie_id::text, cluster_id::text, similarity
+        FROM movie_duplicates
+        WHERE cluster_id IN (SELECT cluster_id FROM movie_duplicates WHERE movie_id = ANY(%s::uuid[]))
+    """, (involved,))
+    memberships = {movie_id: (cluster_id, similarity) for movie_id, cluster_id, similarity in cur.fetchall()}
+    updates = merge_clusters([(a, b, s) for (a, b), s in pairs.items()], memberships)
+    execute_values(cur, """
+        INSERT INTO movie_duplicates (movie_id, cluster_id, similarity)
+        VALUES %s
+        ON CONFLICT (movie_id) DO UPDATE SET
+            cluster_id = EXCLUDED.cluster_id,
+            similarity = EXCLUDED.similarity,
+            detected_at = NOW()
+    """, [(movie_id, cluster_id, similarity) for movie_id, (cluster_id, similarity) in updates.items()],
+        template="(%s::uuid, %s::uuid, %s)")
+    return len(updates)
+
+
+def detect_duplicates(conn, batch_size=DEDUPE_BATCH_SIZE, metrics=None, rebuild=False):
+    """Match every movie added or retitled since the last run against the catalog.
+
+    The movies triggers queue new and retitled movies in movie_pending, so a
+    run reads only its queue, in id order and batch_size at a time. Each
+    batch is matched and taken off the queue in its own transaction; movies
+    itself is never updated, and an entry renewed while its movie was being
+    matched stays for the next run. rebuild forgets every bucket and cluster
+    first and queues the whole catalog again, e.g.
+    after changing the MinHash parameters. Each batch is observed as the
+    'dedupe' stage when metrics are given. Returns (movies matched,
+    duplicate memberships written).
+    """
+    started = time.monotonic()
+    if rebuild:
+        with conn.cursor() as cur:
+            cur.execute("TRUNCATE movie_lsh_bands, movie_duplicates")
+            cur.execute("""
+                INSERT INTO movie_pending (stage, movie_id)
+                SELECT %s, id FROM movies
+                ON CONFLICT (stage, movie_id) DO UPDATE SET queued_at = EXCLUDED.queued_at
+            """, (DEDUPE_STAGE,))
+        conn.commit()
+        logger.info("🧹 Cleared duplicate buckets and clusters for a full rebuild")
+
+    matched = written = 0
+    last_id = None
+    while True:
+        batch_started = time.perf_counter()
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT p.movie_id::text, p.queued_at, m.title, m.year
+                FROM movie_pending p
+                JOIN movies m ON m.id = p.movie_id
+                WHERE p.stage = '{DEDUPE_STAGE}'
+                  AND (%s::uuid IS NULL OR p.movie_id > %s::uuid)
+                ORDER BY p.movie_id
+                LIMIT %s
+            """, (last_id, last_id, batch_size))
+            rows = cur.fetchall()
+            if not rows:
+                break
+            movies = [(movie_id, title, year) for movie_id, _, title, year in rows]
+            written += match_batch(cur, movies)
+            execute_values(cur, f"""
+                DELETE FROM movie_pending p
+                USING (VALUES %s) AS v (id, queued_at)
+                WHERE p.stage = '{DEDUPE_STAGE}' AND p.movie_id = v.id::uuid AND p.queued_at = v.queued_at
+            """, [(movie_id, queued_at) for movie_id, queued_at, _, _ in rows],
+                template="(%s, %s::timestamptz)", page_size=batch_size)
+        conn.commit()
+        if metrics is not None:
+            metrics.observe('dedupe', time.perf_counter() - batch_started)
+        matched += len(movies)
+        last_id = movies[-1][0]
+        logger.info(f"👯 Matched {matched} movies for duplicates")
+    conn.commit() # End the empty read's transaction rather than leave it idle
+    if matched:
+        logger.info(f"👯 Duplicate detection: {matched} movies, {written} cluster memberships written "
+                    f"in {time.monotonic() - started:.1f}s")
+    return matched, written
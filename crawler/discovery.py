@@ -0,0 +1,161 @@
+import logging
+
+from record_stream import is_movie_file
+
+logger = logging.getLogger(__name__)
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+FLAT_DISCOVERY_MIN_FOLDERS = 200 # Folders under the root above which flat discovery saves round trips
+PROBE_PARENTS_PER_QUERY = 50 # Folder IDs OR-ed into one query while probing the tree size
+
+FOLDER_QUERY = f"mimeType = '{FOLDER_MIME_TYPE}' and trashed = false"
+# Candidate movie files; names are checked with is_movie_file since Drive name matching is fuzzy
+JSON_FILE_QUERY = ("(mimeType = 'application/json' or mimeType = 'application/zip' or mimeType = 'application/gzip'"
+                   " or name contains '.json' or name contains '.ndjson' or name contains '.zip') and trashed = false")
+
+DISCOVERY_MODES = ('auto', 'recursive', 'flat')
+
+
+class FlatDiscovery:
+    """Resolve which JSON files sit under a root folder from flat listings.
+
+    Instead of one files().list call per folder, every folder visible to the
+    service account is listed in a few large pages (with parents), and an
+    in-memory parent map decides whether a file's ancestors reach the root.
+    """
+
+    def __init__(self, root_id):
+        self.root_id = root_id
+        self.folder_parents = {} # Folder ID -> parent folder IDs
+        self._under_root = {root_id: True} # Memoized ancestry lookups
+
+    def add_folders(self, items):
+        """Record the parents of a page of folder items."""
+        for item in items:
+            self.folder_parents[item['id']] = item.get('parents', [])
+
+    def folder_under_root(self, folder_id):
+        """Return True if folder_id is the root or one of its descendants."""
+        known = self._under_root.get(folder_id)
+        if known is not None:
+            return known
+
+        # Iterative search over ancestors so deep trees cannot hit the recursion limit
+        came_from = {folder_id: None}
+        stack = [folder_id]
+        found = None
+        while stack:
+            current = stack.pop()
+            known = self._under_root.get(current)
+            if known:
+                found = current
+                break
+            if known is False:
+                continue
+            for parent in self.folder_parents.get(current, []):
+                if parent not in came_from:
+                    came_from[parent] = current
+                    stack.append(parent)
+
+        if found is None:
+            # The search was exhaustive, so nothing visited leads to the root
+            for visited in came_from:
+                self._under_root[visited] = False
+            return False
+
+        # Everything on the path from folder_id to the matched ancestor is under the root
+        node = found
+        while node is not None:
+            self._under_root[node] = True
+            node = came_from[node]
+        return True
+
+    def is_under_root(self, parents):
+        """Return True if any of the given parents is under the root."""
+        return any(self.folder_under_root(parent) for parent in parents)
+
+    def count_folders_under_root(self):
+        """Count the known folders below the root (excluding the root itself)."""
+        return sum(
+            1 for folder_id in self.folder_parents
+            if folder_id != self.root_id and self.folder_under_root(folder_id)
+        )
+
+    def select_files(self, items):
+        """Yield the JSON file items in a page that sit under the root."""
+        for item in items:
+            if item.get('mimeType') == FOLDER_MIME_TYPE or not is_movie_file(item['name']):
+                continue
+            if self.is_under_root(item.get('parents', [])):
+                yield item
+
+
+def probe_folder_count(crawler, folder_id, limit=FLAT_DISCOVERY_MIN_FOLDERS):
+    """Count the folders under folder_id, stopping once limit is reached.
+
+    The tree is walked breadth-first one level at a time, with the folder IDs
+    of a level OR-ed into a few parent queries, so the probe never costs more
+    calls than the folders it finds and stops early on wide trees.
+
+    Returns (count, calls), where count is capped at limit.
+    """
+    count, calls = 0, 0
+    seen = {folder_id}
+    level = [folder_id]
+    while level and count < limit:
+        next_level = []
+        for start in range(0, len(level), PROBE_PARENTS_PER_QUERY):
+            parents = " or ".join(f"'{parent}' in parents" for parent in level[start:start + PROBE_PARENTS_PER_QUERY])
+            page_token = None
+            while count < limit:
+                results = crawler.list_all_files(f"({parents}) and {FOLDER_QUERY}", page_token=page_token)
+                calls += 1
+                for item in results.get('files', []):
+                    if item['id'] not in seen:
+                        seen.add(item['id'])
+                        next_level.append(item['id'])
+                        count += 1
+                page_token = results.get('nextPageToken')
+                if not page_token:
+                    break
+            if count >= limit:
+                break
+        level = next_level
+    return min(count, limit), calls
+
+
+def choose_discovery(crawler, folder_id, mode='auto'):
+    """Pick the discovery mode for a full crawl.
+
+    Returns a (mode, discovery) tuple. For flat mode the returned
+    FlatDiscovery already holds the complete folder map. Recursive listing
+    costs about one call per folder under the root, so in auto mode a probe
+    counts the folders under the root up to FLAT_DISCOVERY_MIN_FOLDERS and
+    the account-wide folder listing only runs once flat discovery is chosen.
+    """
+    if mode not in DISCOVERY_MODES:
+        raise ValueError(f"Unknown discovery mode: {mode}")
+    if mode == 'recursive':
+        return 'recursive', None
+
+    if mode == 'auto':
+        folder_count, calls = probe_folder_count(crawler, folder_id)
+        if folder_count < FLAT_DISCOVERY_MIN_FOLDERS:
+            logger.info(f"🔎 Found {folder_count} folders under the root ({calls} probe calls)")
+            return 'recursive', None
+        logger.info(f"🔎 At least {folder_count} folders under the root ({calls} probe calls)")
+
+    discovery = FlatDiscovery(folder_id)
+    page_token = None
+    pages = 0
+    while True:
+        results = crawler.list_all_files(FOLDER_QUERY, page_token=page_token)
+        discovery.add_folders(results.get('files', []))
+        pages += 1
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            break
+
+    logger.info(f"🔎 Mapped {discovery.count_folders_under_root()} folders under the root "
+                f"({pages} folder listing calls)")
+    return 'flat', discovery
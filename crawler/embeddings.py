@@ -0,0 +1,152 @@
+import hashlib
+import logging
+import math
+import re
+import time
+
+from psycopg2.extras import execute_values
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIM = 256 # Must match the vector(...) column in database/init.sql and api/embeddings.py
+EMBED_BATCH_SIZE = 1000 # Movies embedded and updated per transaction
+EMBED_STAGE = 'embed' # movie_pending.stage the movies triggers queue movies under (database/init.sql)
+TITLE_WEIGHT = 2.0 # Title and genre words count more than words from the plot and other metadata
+GENRE_WEIGHT = 2.0
+MAX_METADATA_CHARS = 20000 # Text taken from one movie's metadata; the rest is ignored
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+# Already stored in their own columns, or not descriptive text
+SKIPPED_METADATA_KEYS = frozenset({'title', 'genre', 'year', 'rating', 'id', 'imdb_id', 'url', 'poster'})
+
+
+def tokens(text):
+    """Lowercase word tokens of text."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def add_features(vector, text, weight):
+    """Hash the words and word bigrams of text into vector, scaled by weight.
+
+    Each feature lands on one of EMBEDDING_DIM slots with a sign taken from
+    the same hash, so collisions cancel out on average instead of piling up.
+    blake2b keeps the mapping identical across processes and machines.
+    """
+    words = tokens(text)
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    for feature in features:
+        digest = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+        vector[digest % EMBEDDING_DIM] += weight if digest >> 63 else -weight
+
+
+def metadata_text(metadata):
+    """Concatenate the descriptive string values of a movie's metadata."""
+    parts = []
+    size = 0
+
+    def collect(value, key=None):
+        nonlocal size
+        if size >= MAX_METADATA_CHARS or key in SKIPPED_METADATA_KEYS:
+            return
+        if isinstance(value, str):
+            parts.append(value)
+            size += len(value)
+        elif isinstance(value, dict):
+            for k, v in value.items():
+                collect(v, k)
+        elif isinstance(value, list):
+            for v in value:
+                collect(v)
+
+    collect(metadata)
+    return ' '.join(parts)[:MAX_METADATA_CHARS]
+
+
+def normalise(vector):
+    """Scale vector to unit length, so cosine distance is a plain dot product."""
+    norm = math.sqrt(sum(v * v for v in vector))
+    return [v / norm for v in vector] if norm else vector
+
+
+def embed_movie(title, genre, metadata):
+    """Embedding of a movie from its title, genre and metadata text."""
+    vector = [0.0] * EMBEDDING_DIM
+    add_features(vector, title or '', TITLE_WEIGHT)
+    add_features(vector, genre or '', GENRE_WEIGHT)
+    if metadata:
+        add_features(vector, metadata_text(metadata), 1.0)
+    return normalise(vector)
+
+
+def embed_text(text):
+    """Embedding of free text, e.g. a search query, in the same space as movies."""
+    vector = [0.0] * EMBEDDING_DIM
+    add_features(vector, text, 1.0)
+    return normalise(vector)
+
+
+def vector_literal(vector):
+    """pgvector text representation of a vector."""
+    return '[' + ','.join(f"{v:.6g}" for v in vector) + ']'
+
+
+def embed_pending(conn, batch_size=EMBED_BATCH_SIZE, metrics=None, table='movies',
+                  embeddings_table='movie_embeddings', pending_table='movie_pending'):
+    """Embed every movie queued for the embedding stage.
+
+    Runs as the last crawler stage. The movies triggers queue new movies and
+    movies whose title, genre or metadata changed in movie_pending, so a run
+    reads only its queue, in id order and batch_size at a time. Each batch
+    is upserted into movie_embeddings and taken off the queue in one
+    transaction, so an interrupted run keeps its progress and movies itself
+    is never updated. A queue entry renewed while its movie was being
+    embedded stays for the next run. Each batch is observed as the 'embed'
+    stage when metrics are given. Returns the number embedded.
+    """
+    started = time.monotonic()
+    embedded = 0
+    last_id = None
+    while True:
+        batch_started = time.perf_counter()
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT p.movie_id, p.queued_at, m.title, m.genre, m.metadata, m.content_hash
+                FROM {pending_table} p
+                JOIN {table} m ON m.id = p.movie_id
+                WHERE p.stage = '{EMBED_STAGE}'
+                  AND (%s::uuid IS NULL OR p.movie_id > %s::uuid)
+                ORDER BY p.movie_id
+                LIMIT %s
+            """, (last_id, last_id, batch_size))
+            rows = cur.fetchall()
+            if not rows:
+                break
+            values = [
+                (str(movie_id), vector_literal(embed_movie(title, genre, metadata)), digest)
+                for movie_id, _, title, genre, metadata, digest in rows
+            ]
+            # The join skips movies deleted since they were read
+            execute_values(cur, f"""
+                INSERT INTO {embeddings_table} (movie_id, embedding, content_hash)
+                SELECT m.id, v.embedding::vector, v.content_hash
+                FROM (VALUES %s) AS v (id, embedding, content_hash)
+                JOIN {table} m ON m.id = v.id::uuid
+                ON CONFLICT (movie_id) DO UPDATE
+                SET embedding = EXCLUDED.embedding, content_hash = EXCLUDED.content_hash
+            """, values, page_size=batch_size)
+            execute_values(cur, f"""
+                DELETE FROM {pending_table} p
+                USING (VALUES %s) AS v (id, queued_at)
+                WHERE p.stage = '{EMBED_STAGE}' AND p.movie_id = v.id::uuid AND p.queued_at = v.queued_at
+            """, [(str(movie_id), queued_at) for movie_id, queued_at, *_ in rows],
+                template="(%s, %s::timestamptz)", page_size=batch_size)
+        conn.commit()
+        if metrics is not None:
+            metrics.observe('embed', time.perf_counter() - batch_started)
+        embedded += len(rows)
+        last_id = str(rows[-1][0])
+        logger.info(f"🧭 Embedded {embedded} movies")
+    conn.commit() # End the empty read's transaction rather than leave it idle
+    if embedded:
+        logger.info(f"🧭 Embedding stage: {embedded} movies in {time.monotonic() - started:.1f}s")
+    return embedded
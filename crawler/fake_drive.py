@@ -0,0 +1,457 @@
+"""Offline stand-in for the Google Drive v3 API.
+
+FakeDrive serves a generated folder tree of synthetic movie JSON files over
+an httplib2-compatible transport, so the crawler's real googleapiclient code
+paths (request building, execute(), MediaIoBaseDownload, HttpError) run
+unchanged without credentials or network access. It supports files().list,
+files().get, files().get_media, changes().list, changes().getStartPageToken
+and about().get, with configurable latency, page sizes and injected SSL
+errors and 429/403 rate-limit responses.
+
+Usage:
+    drive = FakeDrive(num_files=10000, num_folders=200, latency=0.01)
+    crawler = GoogleDriveCrawler(service=drive.service(), transport_factory=drive.http)
+"""
+import hashlib
+import json
+import random
+import re
+import ssl
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import httplib2
+
+from discovery import FOLDER_MIME_TYPE
+
+ROOT_FOLDER_ID = 'fake-root'
+DEFAULT_PAGE_SIZE = 100 # Drive's default when pageSize is not given
+MAX_PAGE_SIZE = 1000 # Drive's upper limit for pageSize
+
+GENRES = ['Drama', 'Action', 'Comedy', 'Thriller', 'Sci-Fi', 'Horror', 'Romance', 'Crime']
+WORDS = ['night', 'river', 'last', 'city', 'dark', 'summer', 'king', 'road', 'secret', 'fire']
+
+
+def synthetic_movie(rng, index):
+    """Return a realistic movie payload."""
+    return {
+        'title': ' '.join(rng.choice(WORDS).title() for _ in range(rng.randint(1, 4))) + f' {index}',
+        'year': rng.randint(1950, 2024),
+        'rating': round(rng.uniform(1, 10), 1),
+        'genre': rng.choice(GENRES),
+        'director': f'Director {rng.randint(1, 5000)}',
+        'cast': [f'Actor {rng.randint(1, 50000)}' for _ in range(rng.randint(2, 8))],
+        'plot': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(20, 80))),
+    }
+
+
+class QueryError(ValueError):
+    """Raised for q= expressions the fake does not understand."""
+
+
+_TOKEN_RE = re.compile(r"\s*(\(|\)|!=|=|'(?:[^'\\]|\\.)*'|[A-Za-z]+)")
+
+
+def parse_query(query):
+    """Compile a Drive q= expression into a predicate over file dicts.
+
+    Supports the subset the crawler uses: 'X' in parents, mimeType/name/trashed
+    comparisons, name contains 'X', and/or/not and parentheses.
+    """
+    tokens = []
+    position = 0
+    query = query.strip()
+    while position < len(query):
+        match = _TOKEN_RE.match(query, position)
+        if not match:
+            raise QueryError(f"Cannot parse query near: {query[position:]}")
+        tokens.append(match.group(1))
+        position = match.end()
+
+    def peek():
+        return tokens[0] if tokens else None
+
+    def take(expected=None):
+        if not tokens:
+            raise QueryError("Unexpected end of query")
+        token = tokens.pop(0)
+        if expected is not None and token.lower() != expected:
+            raise QueryError(f"Expected {expected}, got {token}")
+        return token
+
+    def literal(token):
+        if token.startswith("'"):
+            return token[1:-1].replace("\\'", "'").replace('\\\\', '\\')
+        if token.lower() in ('true', 'false'):
+            return token.lower() == 'true'
+        raise QueryError(f"Expected a value, got {token}")
+
+    def clause():
+        token = take()
+        if token == '(':
+            predicate = expression()
+            take(')')
+            return predicate
+        if token.lower() == 'not':
+            inner = clause()
+            return lambda f: not inner(f)
+        if token.startswith("'"):
+            value = literal(token)
+            take('in')
+            take('parents')
+            return lambda f: value in f.get('parents', [])
+        field = token
+        operator = take()
+        value = literal(take())
+        if operator.lower() == 'contains':
+            return lambda f: str(value).lower() in str(f.get(field, '')).lower()
+        if operator == '=':
+            return lambda f: f.get(field) == value
+        if operator == '!=':
+            return lambda f: f.get(field) != value
+        raise QueryError(f"Unsupported operator {operator}")
+
+    def conjunction():
+        predicates = [clause()]
+        while peek() and peek().lower() == 'and':
+            take()
+            predicates.append(clause())
+        return lambda f: all(p(f) for p in predicates)
+
+    def expression():
+        predicates = [conjunction()]
+        while peek() and peek().lower() == 'or':
+            take()
+            predicates.append(conjunction())
+        return lambda f: any(p(f) for p in predicates)
+
+    predicate = expression()
+    if tokens:
+        raise QueryError(f"Unexpected trailing tokens: {' '.join(tokens)}")
+    return predicate
+
+
+class FakeDrive:
+    """In-memory Drive with a generated tree of synthetic movie files."""
+
+    def __init__(self, num_files=1000, num_folders=20, non_json_files=0, seed=0,
+                 latency=0.0, download_latency=0.0, max_page_size=MAX_PAGE_SIZE,
+                 ssl_error_rate=0.0, rate_limit_rate=0.0, forbidden_rate=0.0, retry_after=None,
+                 max_qps=None):
+        """
+        Args:
+            num_files: Number of synthetic movie JSON files
+            num_folders: Number of folders below the root, arranged as a random tree
+            non_json_files: Number of extra files the crawler should ignore
+            seed: Seed for the tree, the payloads and error injection
+            latency: Seconds added to every request
+            download_latency: Extra seconds added to every media download
+            max_page_size: Cap on pageSize for list calls
+            ssl_error_rate: Fraction of requests that raise ssl.SSLError
+            rate_limit_rate: Fraction of requests answered with 429
+            forbidden_rate: Fraction of requests answered with 403 rateLimitExceeded
+            retry_after: Retry-After header value (seconds) on rate-limit responses
+            max_qps: Requests per second above which requests are answered with 429
+        """
+        self.latency = latency
+        self.download_latency = download_latency
+        self.max_page_size = max_page_size
+        self.ssl_error_rate = ssl_error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.forbidden_rate = forbidden_rate
+        self.retry_after = retry_after
+        self.max_qps = max_qps
+
+        self.calls = Counter()
+        self._recent = deque() # Arrival times within the last second, for max_qps
+        self.files = {}
+        self.children = defaultdict(list)
+        self.changes = []
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._error_rng = random.Random(seed + 1)
+        self._clock = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        self._version = 0
+        self._query_cache = {}
+
+        self._add(ROOT_FOLDER_ID, 'root', FOLDER_MIME_TYPE, [])
+        folder_ids = [ROOT_FOLDER_ID]
+        for i in range(num_folders):
+            folder_id = f'fake-folder-{i}'
+            self._add(folder_id, f'folder_{i}', FOLDER_MIME_TYPE, [self._rng.choice(folder_ids)])
+            folder_ids.append(folder_id)
+        for i in range(num_files):
+            content = json.dumps(synthetic_movie(self._rng, i)).encode('utf-8')
+            self._add(f'fake-file-{i}', f'movie_{i}.json', 'application/json',
+                      [self._rng.choice(folder_ids)], content)
+        for i in range(non_json_files):
+            self._add(f'fake-other-{i}', f'poster_{i}.jpg', 'image/jpeg',
+                      [self._rng.choice(folder_ids)], b'\xff\xd8')
+        self.folder_ids = folder_ids
+
+    # -- Store -------------------------------------------------------------
+
+    def _tick(self):
+        self._clock += timedelta(seconds=1)
+        return self._clock.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+    def _add(self, file_id, name, mime_type, parents, content=None):
+        entry = {
+            'id': file_id,
+            'name': name,
+            'mimeType': mime_type,
+            'parents': parents,
+            'trashed': False,
+            'modifiedTime': self._tick(),
+        }
+        if content is not None:
+            entry['md5Checksum'] = hashlib.md5(content).hexdigest()
+            entry['size'] = str(len(content))
+            entry['_content'] = content
+        self.files[file_id] = entry
+        for parent in parents:
+            self.children[parent].append(file_id)
+        self._version += 1
+        return entry
+
+    def _record_change(self, file_id, removed=False):
+        self.changes.append({'fileId': file_id, 'removed': removed, 'time': self._clock.strftime('%Y-%m-%dT%H:%M:%S.000Z')})
+        self._version += 1
+
+    def add_file(self, parent_id=ROOT_FOLDER_ID, payload=None):
+        """Create a new movie file and record the change; returns its ID."""
+        with self._lock:
+            index = len(self.files)
+            payload = payload if payload is not None else synthetic_movie(self._rng, index)
+            file_id = f'fake-new-{index}'
+            self._add(file_id, f'movie_new_{index}.json', 'application/json', [parent_id],
+                      json.dumps(payload).encode('utf-8'))
+            self._record_change(file_id)
+            return file_id
+
+    def update_file(self, file_id, payload=None):
+        """Replace a file's content (a new synthetic payload by default) and record the change."""
+        with self._lock:
+            entry = self.files[file_id]
+            payload = payload if payload is not None else synthetic_movie(self._rng, len(self.changes))
+            content = json.dumps(payload).encode('utf-8')
+            entry['_content'] = content
+            entry['md5Checksum'] = hashlib.md5(content).hexdigest()
+            entry['size'] = str(len(content))
+            entry['modifiedTime'] = self._tick()
+            self._record_change(file_id)
+
+    def trash_file(self, file_id):
+        """Move a file to the trash and record the change."""
+        with self._lock:
+            self.files[file_id]['trashed'] = True
+            self.files[file_id]['modifiedTime'] = self._tick()
+            self._record_change(file_id)
+
+    def delete_file(self, file_id):
+        """Permanently delete a file and record a removal."""
+        with self._lock:
+            entry = self.files.pop(file_id)
+            for parent in entry['parents']:
+                self.children[parent].remove(file_id)
+            self._tick()
+            self._record_change(file_id, removed=True)
+
+    def random_edits(self, count, seed=0):
+        """Edit count random JSON files (with repeats) and return the edited IDs."""
+        rng = random.Random(seed)
+        json_ids = sorted(f for f, e in self.files.items() if e['mimeType'] == 'application/json')
+        edited = [rng.choice(json_ids) for _ in range(count)]
+        for file_id in edited:
+            self.update_file(file_id)
+        return edited
+
+    def json_file_ids(self):
+        """IDs of the non-trashed JSON files under the root."""
+        return sorted(
+            f for f, e in self.files.items()
+            if e['mimeType'] == 'application/json' and not e['trashed']
+        )
+
+    # -- Transport ---------------------------------------------------------
+
+    def http(self):
+        """Return a new transport; pass as transport_factory to the crawler."""
+        return FakeDriveHttp(self)
+
+    def service(self):
+        """Build a real googleapiclient Drive service on top of the fake transport."""
+        from googleapiclient.discovery import build
+        return build('drive', 'v3', http=self.http(), static_discovery=True, cache_discovery=False)
+
+    def total_calls(self):
+        """Number of API requests served, including injected failures."""
+        return sum(v for k, v in self.calls.items() if not k.startswith('errors.'))
+
+    def handle(self, uri, method='GET', headers=None):
+        """Serve one HTTP request and return (status, headers, body bytes)."""
+        parts = urlsplit(uri)
+        params = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        path = unquote(parts.path)
+        prefix = '/drive/v3/'
+        if not path.startswith(prefix) or method != 'GET':
+            return self._error(404, 'notFound', f'Unsupported request: {method} {path}')
+        route = path[len(prefix):]
+
+        if route == 'files':
+            endpoint = 'files.list'
+        elif route.startswith('files/'):
+            endpoint = 'files.get_media' if params.get('alt') == 'media' else 'files.get'
+        elif route == 'changes':
+            endpoint = 'changes.list'
+        elif route == 'changes/startPageToken':
+            endpoint = 'changes.getStartPageToken'
+        elif route == 'about':
+            endpoint = 'about.get'
+        else:
+            return self._error(404, 'notFound', f'Unknown route: {route}')
+
+        with self._lock:
+            self.calls[endpoint] += 1
+            roll = self._error_rng.random()
+            over_quota = self._over_quota()
+        delay = self.latency + (self.download_latency if endpoint == 'files.get_media' else 0.0)
+        if delay:
+            time.sleep(delay)
+
+        if roll < self.ssl_error_rate:
+            with self._lock:
+                self.calls['errors.ssl'] += 1
+            raise ssl.SSLError('Injected SSL error: record layer failure')
+        roll -= self.ssl_error_rate
+        if over_quota or roll < self.rate_limit_rate:
+            with self._lock:
+                self.calls['errors.429'] += 1
+            return self._error(429, 'rateLimitExceeded', 'Rate Limit Exceeded')
+        roll -= self.rate_limit_rate
+        if roll < self.forbidden_rate:
+            with self._lock:
+                self.calls['errors.403'] += 1
+            return self._error(403, 'rateLimitExceeded', 'Rate Limit Exceeded')
+
+        with self._lock:
+            if endpoint == 'files.list':
+                return self._list_files(params)
+            if endpoint in ('files.get', 'files.get_media'):
+                return self._get_file(route[len('files/'):], endpoint == 'files.get_media', headers or {})
+            if endpoint == 'changes.list':
+                return self._list_changes(params)
+            if endpoint == 'changes.getStartPageToken':
+                return self._json({'startPageToken': str(len(self.changes))})
+            return self._json({'user': {'emailAddress': 'crawler@fake-drive.local'}})
+
+    def _over_quota(self):
+        """Record a request and report whether the last second exceeded max_qps."""
+        if self.max_qps is None:
+            return False
+        now = time.monotonic()
+        self._recent.append(now)
+        while self._recent and self._recent[0] <= now - 1.0:
+            self._recent.popleft()
+        return len(self._recent) > self.max_qps
+
+    def _json(self, payload, status=200):
+        return status, {'content-type': 'application/json; charset=UTF-8'}, json.dumps(payload).encode('utf-8')
+
+    def _error(self, status, reason, message):
+        headers = {'content-type': 'application/json; charset=UTF-8'}
+        if status in (403, 429) and self.retry_after is not None:
+            headers['retry-after'] = str(self.retry_after)
+        body = {'error': {'code': status, 'message': message,
+                          'errors': [{'domain': 'usageLimits', 'reason': reason, 'message': message}]}}
+        return status, headers, json.dumps(body).encode('utf-8')
+
+    @staticmethod
+    def _public(entry):
+        return {k: v for k, v in entry.items() if not k.startswith('_')}
+
+    def _page_size(self, params):
+        requested = int(params.get('pageSize', DEFAULT_PAGE_SIZE))
+        return max(1, min(requested, self.max_page_size, MAX_PAGE_SIZE))
+
+    def _list_files(self, params):
+        query = params.get('q', 'trashed = false')
+        cache_key = (query, self._version)
+        matches = self._query_cache.get(cache_key)
+        if matches is None:
+            try:
+                predicate = parse_query(query)
+            except QueryError as e:
+                return self._error(400, 'invalid', str(e))
+            # Single-parent conjunctions only need to look at that folder's children
+            parent = re.match(r"\s*'([^']+)' in parents and ", query)
+            if parent and ' or ' not in query:
+                candidates = (self.files[f] for f in self.children.get(parent.group(1), []))
+            else:
+                candidates = self.files.values()
+            matches = sorted(entry['id'] for entry in candidates if predicate(entry))
+            self._query_cache = {cache_key: matches}
+
+        start = int(params.get('pageToken') or 0)
+        end = start + self._page_size(params)
+        payload = {'files': [self._public(self.files[f]) for f in matches[start:end]]}
+        if end < len(matches):
+            payload['nextPageToken'] = str(end)
+        return self._json(payload)
+
+    def _get_file(self, file_id, media, headers):
+        entry = self.files.get(file_id)
+        if entry is None:
+            return self._error(404, 'notFound', f'File not found: {file_id}')
+        if not media:
+            return self._json(self._public(entry))
+
+        content = entry.get('_content', b'')
+        start, end = 0, len(content) - 1
+        byte_range = {k.lower(): v for k, v in headers.items()}.get('range')
+        if byte_range:
+            first, last = byte_range.split('=', 1)[1].split('-')
+            start, end = int(first), min(int(last), len(content) - 1)
+        body = content[start:end + 1]
+        response_headers = {
+            'content-type': 'application/json',
+            'content-range': f'bytes {start}-{end}/{len(content)}',
+            'content-length': str(len(body)),
+        }
+        return 206 if byte_range else 200, response_headers, body
+
+    def _list_changes(self, params):
+        start = int(params.get('pageToken') or 0)
+        end = start + self._page_size(params)
+        changes = []
+        for change in self.changes[start:end]:
+            item = {'kind': 'drive#change', 'fileId': change['fileId'],
+                    'removed': change['removed'], 'time': change['time']}
+            entry = self.files.get(change['fileId'])
+            if entry is not None and not change['removed']:
+                item['file'] = self._public(entry)
+            changes.append(item)
+        payload = {'changes': changes}
+        if end < len(self.changes):
+            payload['nextPageToken'] = str(end)
+        else:
+            payload['newStartPageToken'] = str(len(self.changes))
+        return self._json(payload)
+
+
+class FakeDriveHttp:
+    """httplib2.Http-compatible transport that serves requests from a FakeDrive."""
+
+    def __init__(self, drive):
+        self.drive = drive
+        # googleapiclient reads these attributes off the transport
+        self.timeout = None
+        self.redirect_codes = set()
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=5, connection_type=None):
+        status, response_headers, content = self.drive.handle(uri, method=method, headers=headers)
+        response = httplib2.Response(dict(response_headers, status=str(status)))
+        return response, content
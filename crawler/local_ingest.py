@@ -0,0 +1,213 @@
+import io
+import itertools
+import logging
+import mmap
+import multiprocessing
+import os
+import queue
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from bulk_loader import BULK_BATCH_BYTES, BULK_MAX_BATCH_ROWS
+from record_stream import is_movie_file, iter_records, movie_values, RECORD_SEPARATOR
+
+logger = logging.getLogger(__name__)
+
+LOCAL_ID_PREFIX = 'local:' # drive_file_id prefix of movies loaded from disk
+INGEST_CHUNKSIZE = 64 # Files handed to a worker process per task
+INGEST_QUEUED_CHUNKS = 4 # Row chunks per worker process waiting for the parent before workers block
+INGEST_WINDOW = 20000 # Files queued to the pool at once, so walking a huge tree stays bounded
+MAX_REPORTED_ERRORS = 5 # Bad records per file described in the log; the rest are only counted
+
+_results = None # Queue a worker process sends its messages to, set by _init_worker
+
+
+class MappedFile(io.RawIOBase):
+    """Read-only raw stream over an mmap, so the parsers can read it like a file."""
+
+    def __init__(self, mapped):
+        self._mapped = mapped
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._mapped.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self._mapped.seek(offset, whence)
+        return self._mapped.tell()
+
+    def tell(self):
+        return self._mapped.tell()
+
+
+def local_file_id(relpath):
+    """drive_file_id for a file loaded from disk, stable across machines."""
+    # '#' separates bulk record positions, so it cannot appear in the file part
+    return LOCAL_ID_PREFIX + relpath.replace(os.sep, '/').replace(RECORD_SEPARATOR, '%23')
+
+
+def walk_movie_files(root):
+    """Yield (path, relpath, size, modified_time) for every movie file under root, depth-first."""
+    directories = [root]
+    while directories:
+        directory = directories.pop()
+        try:
+            entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+        except OSError as e:
+            logger.error(f"Cannot list {directory}: {e}")
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                directories.append(entry.path)
+            elif entry.is_file() and is_movie_file(entry.name):
+                stat = entry.stat()
+                modified_time = datetime.fromtimestamp(stat.st_mtime, timezone.utc).isoformat()
+                yield entry.path, os.path.relpath(entry.path, root), stat.st_size, modified_time
+
+
+def parse_local_file(task, send):
+    """Parse and validate one file, sending its rows in bounded chunks.
+
+    Rows ready for the writer go out as send(('rows', relpath, rows)) with
+    (row, size) pairs, BULK_MAX_BATCH_ROWS or BULK_BATCH_BYTES at a time, so
+    neither the worker nor the pipe to the parent ever holds a whole large
+    file. The file ends with send(('done', relpath, record_errors, messages,
+    error, seconds)): the number of bad records with a few of their messages,
+    the error that failed the file, if any, and the time spent parsing. Rows
+    sent before such an error stay sent, as with a Drive download.
+    """
+    started = time.perf_counter()
+    path, relpath, size, modified_time = task
+    file_id = local_file_id(relpath)
+    record_errors, messages, error = 0, [], None
+    chunk, chunk_bytes = [], 0
+    try:
+        with open(path, 'rb') as f, mapped_stream(f) as stream:
+            for position, result in _file_rows(relpath, stream, file_id, modified_time):
+                if isinstance(result, Exception):
+                    if position is None:
+                        raise result
+                    record_errors += 1
+                    if len(messages) < MAX_REPORTED_ERRORS:
+                        messages.append(f"record {position}: {result}")
+                    continue
+                chunk.append(result)
+                chunk_bytes += result[1]
+                if len(chunk) >= BULK_MAX_BATCH_ROWS or chunk_bytes >= BULK_BATCH_BYTES:
+                    send(('rows', relpath, chunk))
+                    chunk, chunk_bytes = [], 0
+        if chunk:
+            send(('rows', relpath, chunk))
+    except Exception as e:
+        error = str(e)
+    send(('done', relpath, record_errors, messages, error, time.perf_counter() - started))
+
+
+@contextmanager
+def mapped_stream(f):
+    """Buffered stream over an mmap of f, so pages come straight from the page cache."""
+    if os.fstat(f.fileno()).st_size == 0:
+        yield io.BytesIO() # An empty file cannot be mapped
+        return
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        yield io.BufferedReader(MappedFile(mapped))
+
+
+def _init_worker(results):
+    global _results
+    _results = results
+
+
+def _parse_in_worker(task):
+    parse_local_file(task, _results.put)
+
+
+def _file_rows(name, stream, file_id, modified_time):
+    """Yield (position, (row, size)) for each record, or (position, error) for a bad one."""
+    for position, record in iter_records(name, stream, raw=True):
+        drive_file_id = file_id if position is None else f"{file_id}{RECORD_SEPARATOR}{position}"
+        try:
+            if isinstance(record, Exception):
+                raise record
+            movie_data, text = record
+            yield position, movie_values(drive_file_id, movie_data, None, modified_time, raw=text)
+        except (ValueError, TypeError) as e:
+            yield position, e
+
+
+def ingest_directory(crawler, root, processes=None, chunksize=INGEST_CHUNKSIZE, window=INGEST_WINDOW,
+                     only=None):
+    """Load every movie file under root into the crawler's writer stage.
+
+    Files are parsed and validated across a process pool with the same rules
+    as Drive downloads and the rows are handed to crawler.queue_row(), so
+    they go through the batched writer. Workers stream rows back in bounded
+    chunks over a queue that holds INGEST_QUEUED_CHUNKS per process, so a
+    huge file costs no more memory than a small one. Files whose
+    modification time matches the stored copy are skipped, so an interrupted
+    backfill can be rerun.
+
+    Args:
+        crawler: GoogleDriveCrawler with known versions loaded and its writer running
+        root: Directory to walk
+        processes: Worker processes (default: one per CPU)
+        only: Set of file IDs to reload regardless of their stored copy (--retry-failed)
+
+    Returns:
+        IDs of the files whose rows were all queued
+    """
+    if only is not None:
+        tasks = (task for task in walk_movie_files(root) if local_file_id(task[1]) in only)
+    else:
+        tasks = (task for task in walk_movie_files(root)
+                 if crawler.should_process({'id': local_file_id(task[1]), 'modifiedTime': task[3]}))
+    loaded = []
+    processes = processes or os.cpu_count()
+    results = multiprocessing.Queue(maxsize=processes * INGEST_QUEUED_CHUNKS)
+    with multiprocessing.Pool(processes=processes, initializer=_init_worker, initargs=(results,)) as pool:
+        while True:
+            batch = list(itertools.islice(tasks, window))
+            if not batch:
+                break
+            parsing = pool.map_async(_parse_in_worker, batch, chunksize=chunksize)
+            kept = {} # relpath -> drive_file_ids queued so far
+            pending = len(batch)
+            while pending:
+                try:
+                    item = results.get(timeout=1)
+                except queue.Empty:
+                    if parsing.ready():
+                        parsing.get() # Re-raises a worker failure instead of waiting forever
+                    continue
+                if item[0] == 'rows':
+                    _, relpath, rows = item
+                    keep = kept.setdefault(relpath, [])
+                    for row, size in rows:
+                        crawler.queue_row(row, size)
+                        keep.append(row[0])
+                    continue
+                _, relpath, record_errors, messages, error, seconds = item
+                pending -= 1
+                keep = kept.pop(relpath, [])
+                crawler.metrics.observe('parse', seconds)
+                if error is not None:
+                    logger.error(f"Error processing file {relpath}: {error}")
+                    crawler.count('errors')
+                    continue
+                for message in messages:
+                    logger.warning(f"Skipping {message} of {relpath}")
+                crawler.count('record_errors', record_errors)
+                crawler.prune_file(local_file_id(relpath), keep)
+                crawler.count('files_processed')
+                loaded.append(local_file_id(relpath))
+            logger.info(f"📂 {crawler.stats['files_processed']} files ingested "
+                        f"({crawler.stats['records_processed']} movies)")
+    return loaded
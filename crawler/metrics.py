@@ -0,0 +1,264 @@
+import bisect
+import cProfile
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+METRICS_FILE_INTERVAL = 15.0 # Seconds between rewrites of the --metrics-file textfile
+METRIC_PREFIX = 'crawler'
+METRICS_HOST = '127.0.0.1' # Interface the /metrics endpoint binds; the counters are not meant to be public
+# From 3.12 cProfile runs on sys.monitoring, which allows a single active profiler
+PER_THREAD_PROFILES = sys.version_info < (3, 12)
+
+# Stages timed by the crawler, in pipeline order
+STAGES = {
+    'list': "Drive listing calls (folder pages, flat listings, change pages)",
+    'download': "Downloading one file from Drive",
+    'parse': "Parsing and validating the movies of one file",
+    'queue_wait': "Time a producer blocked handing a row to the writer stage",
+    'db_commit': "Writing and committing one batch to PostgreSQL",
+    'embed': "Embedding and storing one batch of movies",
+    'dedupe': "Matching one batch of movies against the catalog for duplicates",
+}
+
+
+class Histogram:
+    """Thread-safe cumulative latency histogram in the Prometheus model."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1) # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += seconds
+            self.count += 1
+
+    def snapshot(self):
+        """Return (cumulative bucket counts, sum, count) taken under the lock."""
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative, running = [], 0
+        for c in counts:
+            running += c
+            cumulative.append(running)
+        return cumulative, total, count
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (None without samples)."""
+        cumulative, _, count = self.snapshot()
+        if not count:
+            return None
+        for bound, seen in zip(self.buckets + (float('inf'),), cumulative):
+            if seen >= q * count:
+                return bound
+        return float('inf')
+
+
+class CrawlMetrics:
+    """Per-stage latency histograms plus the crawler's stats as counters.
+
+    Stages are timed with observe() or the timed() context manager from any
+    thread. render() produces the Prometheus text exposition format, served
+    by --metrics-port or written to --metrics-file.
+    """
+
+    def __init__(self, stats, stages=STAGES):
+        self.stats = stats
+        self.stages = dict(stages)
+        self.histograms = {stage: Histogram() for stage in self.stages}
+        self.gauges = {} # name -> (help, callable returning the current value)
+        self.started = time.monotonic()
+
+    def observe(self, stage, seconds):
+        self.histograms[stage].observe(seconds)
+
+    @contextmanager
+    def timed(self, stage):
+        """Time the body of a with block as one observation of stage."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.histograms[stage].observe(time.perf_counter() - started)
+
+    def gauge(self, name, help_text, read):
+        """Export read() as a gauge, evaluated at every scrape."""
+        self.gauges[name] = (help_text, read)
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        lines = [
+            f"# HELP {METRIC_PREFIX}_stage_seconds Latency of crawler stages.",
+            f"# TYPE {METRIC_PREFIX}_stage_seconds histogram",
+        ]
+        for stage, histogram in self.histograms.items():
+            cumulative, total, count = histogram.snapshot()
+            for bound, seen in zip(histogram.buckets + (float('inf'),), cumulative):
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{METRIC_PREFIX}_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {seen}')
+            lines.append(f'{METRIC_PREFIX}_stage_seconds_sum{{stage="{stage}"}} {total!r}')
+            lines.append(f'{METRIC_PREFIX}_stage_seconds_count{{stage="{stage}"}} {count}')
+        for key, value in list(self.stats.items()):
+            name = f"{METRIC_PREFIX}_{key}_total"
+            lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name} {value}")
+        for key, (help_text, read) in self.gauges.items():
+            name = f"{METRIC_PREFIX}_{key}"
+            try:
+                value = read()
+            except Exception:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_uptime_seconds gauge")
+        lines.append(f"{METRIC_PREFIX}_uptime_seconds {time.monotonic() - self.started:.3f}")
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path):
+        """Write render() to path atomically, for node_exporter's textfile collector."""
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, 'w') as f:
+            f.write(self.render())
+        os.replace(temporary, path)
+
+    def summary(self):
+        """Return per-stage counts, p50/p95 and total time for the crawl summary."""
+        parts = []
+        for stage, histogram in self.histograms.items():
+            _, total, count = histogram.snapshot()
+            if not count:
+                continue
+            p50, p95 = histogram.quantile(0.5), histogram.quantile(0.95)
+            parts.append(f"{stage} {count}× p50≤{p50:g}s p95≤{p95:g}s total {total:.2f}s")
+        return ', '.join(parts) if parts else 'no samples'
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serves the crawler metrics on GET /metrics."""
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = self.server.metrics.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"Metrics endpoint: {format % args}")
+
+
+class MetricsExporter:
+    """Publishes CrawlMetrics live over HTTP and/or to a textfile while a crawl runs."""
+
+    def __init__(self, metrics, port=None, path=None, host=METRICS_HOST, interval=METRICS_FILE_INTERVAL):
+        self.metrics = metrics
+        self.port = port
+        self.path = path
+        self.host = host
+        self.interval = interval
+        self.server = None
+        self._stop = threading.Event()
+        self._writer = None
+
+    def start(self):
+        if self.port is not None:
+            self.server = ThreadingHTTPServer((self.host, self.port), MetricsHandler)
+            self.server.metrics = self.metrics
+            threading.Thread(target=self.server.serve_forever, name='metrics-endpoint', daemon=True).start()
+            logger.info(f"📈 Serving metrics on http://{self.host}:{self.server.server_address[1]}/metrics")
+        if self.path:
+            self._writer = threading.Thread(target=self._write_loop, name='metrics-file', daemon=True)
+            self._writer.start()
+            logger.info(f"📈 Writing metrics to {self.path} every {self.interval:.0f}s")
+
+    def _write_loop(self):
+        while not self._stop.wait(self.interval):
+            self._write()
+
+    def _write(self):
+        try:
+            self.metrics.write_textfile(self.path)
+        except OSError as e:
+            logger.warning(f"Could not write metrics to {self.path}: {e}")
+
+    def stop(self):
+        """Stop serving and write the final figures to the textfile."""
+        self._stop.set()
+        if self._writer is not None:
+            self._writer.join()
+            self._write()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+@contextmanager
+def profiled(path):
+    """Profile the body with cProfile, across every thread it starts, and dump stats to path.
+
+    The dump is a standard pstats file: browse it with `python -m pstats`,
+    snakeviz, or turn it into a flame graph with flameprof. Worker processes
+    of --ingest-dir are not included. With path None this does nothing.
+
+    Before Python 3.12 each new thread gets a profiler of its own, merged
+    into the dump. From 3.12 a second active profiler raises, so one profiler
+    is used: sys.monitoring hands it the calls of every thread, but calls
+    running at once in several threads share its stack, so their times are
+    approximate. If another profiler is already active the body runs
+    unprofiled.
+    """
+    if not path:
+        yield
+        return
+    profiles = []
+    lock = threading.Lock()
+
+    def start_thread_profile(frame, event, arg):
+        # Runs on the first event of each new thread and replaces itself with a profiler
+        profile = cProfile.Profile()
+        with lock:
+            profiles.append(profile)
+        profile.enable()
+
+    main = cProfile.Profile()
+    try:
+        main.enable()
+    except ValueError as e:
+        logger.warning(f"🔬 Not profiling: {e}")
+        yield
+        return
+    if PER_THREAD_PROFILES:
+        threading.setprofile(start_thread_profile)
+    try:
+        yield
+    finally:
+        main.disable()
+        if PER_THREAD_PROFILES:
+            threading.setprofile(None)
+        stats = pstats.Stats(main)
+        with lock:
+            for profile in profiles:
+                stats.add(profile)
+        stats.dump_stats(path)
+        logger.info(f"🔬 Profile of {1 + len(profiles)} threads written to {path}")
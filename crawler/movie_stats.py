@@ -0,0 +1,80 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# The aggregates of movie_stats, movie_genre_stats and movie_year_stats, computed
+# from movies in one scan. GROUPING() tells the sets apart: 3 is the whole
+# catalog, 1 a genre and 2 a year.
+ACTUAL_SQL = """
+    SELECT GROUPING(genre, year), genre, year, COUNT(*), COUNT(rating), COALESCE(SUM(rating), 0)
+    FROM movies
+    GROUP BY GROUPING SETS ((), (genre), (year))
+"""
+STORED_SQL = """
+    SELECT 3, NULL, NULL, movie_count, rated_count, rating_sum FROM movie_stats
+    UNION ALL
+    SELECT 1, genre, NULL, movie_count, rated_count, rating_sum FROM movie_genre_stats
+    UNION ALL
+    SELECT 2, NULL, year, movie_count, rated_count, rating_sum FROM movie_year_stats
+"""
+SCOPES = {3: 'total', 1: 'genre', 2: 'year'}
+
+
+def stats_by_key(rows):
+    """{(scope, genre or year): (movie_count, rated_count, rating_sum)}, without the NULL genre and year groups."""
+    result = {}
+    for grouping, genre, year, movie_count, rated_count, rating_sum in rows:
+        scope = SCOPES[grouping]
+        key = genre if scope == 'genre' else year
+        if scope != 'total' and key is None:
+            continue
+        result[scope, key] = (movie_count, rated_count, rating_sum)
+    return result
+
+
+def check_stats(conn):
+    """Compare the aggregate tables with the same aggregates computed from movies.
+
+    Both sides are read from one REPEATABLE READ snapshot, so writes running
+    alongside the check are not reported. Returns (scope, key, stored,
+    actual) for every aggregate that differs, where stored or actual is None
+    for a row that is missing on that side.
+    """
+    conn.commit()
+    with conn.cursor() as cur:
+        cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        cur.execute(STORED_SQL)
+        stored = stats_by_key(cur.fetchall())
+        cur.execute(ACTUAL_SQL)
+        actual = stats_by_key(cur.fetchall())
+    conn.commit()
+    return [(scope, key, stored.get((scope, key)), actual.get((scope, key)))
+            for scope, key in sorted(set(stored) | set(actual), key=lambda k: (k[0], str(k[1])))
+            if stored.get((scope, key)) != actual.get((scope, key))]
+
+
+def rebuild_stats(conn):
+    """Recompute every aggregate table from movies; returns seconds taken."""
+    started = time.monotonic()
+    with conn.cursor() as cur:
+        cur.execute("SELECT rebuild_movie_stats()")
+    conn.commit()
+    return time.monotonic() - started
+
+
+def verify_stats(conn, rebuild=False):
+    """Check the aggregate tables and rebuild them if they drifted, or unconditionally with rebuild.
+
+    Returns the number of aggregates that differed from movies.
+    """
+    mismatches = [] if rebuild else check_stats(conn)
+    for scope, key, stored, actual in mismatches[:20]:
+        logger.warning(f"📊 {scope} {'' if key is None else key}: stored {stored}, actual {actual}")
+    if mismatches:
+        logger.warning(f"📊 {len(mismatches)} aggregates differ from movies")
+    elif not rebuild:
+        logger.info("📊 Aggregate stats match movies")
+        return 0
+    logger.info(f"🧮 Rebuilt aggregate stats in {rebuild_stats(conn):.1f}s")
+    return len(mismatches)
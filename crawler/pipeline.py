@@ -0,0 +1,351 @@
+import logging
+import queue
+import threading
+import time
+from contextlib import nullcontext
+
+from bulk_loader import copy_upsert, dead_letter_rows, prune_file_rows, values_upsert
+
+logger = logging.getLogger(__name__)
+
+WRITER_QUEUE_SIZE = 10000 # Parsed rows buffered between download workers and the writer
+WRITER_FLUSH_INTERVAL = 2.0 # Seconds a partial batch may wait before it is written
+WRITER_POLL_INTERVAL = 0.5 # Seconds between writer liveness checks while blocked on it
+
+SALVAGE_SAVEPOINT = 'salvage'
+
+_STOP = object()
+_FLUSH = object()
+_PRUNE = object()
+
+
+def salvage_batch(conn, rows, write, stats, stats_lock=None):
+    """Keep the good rows of a batch that failed as a whole and dead-letter the rest.
+
+    The batch is bisected inside one transaction: each half is retried under
+    a savepoint and a half that fails again is split further, so k bad rows
+    in n cost O(k log n) statements. Rows that fail on their own are stored
+    in crawl_dead_letters with their error for --retry-failed. If every row
+    fails, the problem is the database rather than the data: nothing is
+    dead-lettered and the batch is reported as failed.
+
+    Args:
+        conn: Connection the batch failed on, already rolled back
+        rows: Rows of the batch, unique on drive_file_id
+        write: Callable(cur, rows) writing rows and returning the number written
+        stats: Crawler stats dict, updated once the salvage is committed
+        stats_lock: Lock guarding stats when other threads update it too
+
+    Returns:
+        True once the good rows and the dead letters are committed, False if
+        nothing could be salvaged (everything is rolled back)
+    """
+    written, failures = 0, []
+    pending = [rows]
+    try:
+        with conn.cursor() as cur:
+            while pending:
+                chunk = pending.pop()
+                if chunk is rows and len(rows) > 1:
+                    # The whole batch is known to fail; start with its halves
+                    middle = len(rows) // 2
+                    pending.extend([rows[middle:], rows[:middle]])
+                    continue
+                cur.execute(f"SAVEPOINT {SALVAGE_SAVEPOINT}")
+                try:
+                    written += write(cur, chunk)
+                except Exception as e:
+                    if conn.closed:
+                        raise
+                    cur.execute(f"ROLLBACK TO SAVEPOINT {SALVAGE_SAVEPOINT}")
+                    if len(chunk) == 1:
+                        failures.append((chunk[0], str(e).strip()))
+                    else:
+                        middle = len(chunk) // 2
+                        pending.extend([chunk[middle:], chunk[:middle]])
+                    continue
+                cur.execute(f"RELEASE SAVEPOINT {SALVAGE_SAVEPOINT}")
+            if len(rows) > 1 and len(failures) == len(rows):
+                raise RuntimeError(f"all {len(rows)} rows failed individually")
+            dead_letter_rows(cur, failures)
+        conn.commit()
+    except Exception as e:
+        logger.error(f"Could not salvage the failed batch: {e}")
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        return False
+
+    for row, error in failures:
+        logger.warning(f"☠️  Dead-lettered {row[0]}: {error.splitlines()[0] if error else 'unknown error'}")
+    logger.info(f"🩹 Salvaged {len(rows) - len(failures)} of {len(rows)} records from a failed batch "
+                f"({written} written, {len(failures)} dead-lettered).")
+    with stats_lock or nullcontext():
+        stats['db_batches_committed'] += 1
+        stats['db_batches_salvaged'] += 1
+        stats['rows_written'] += written
+        stats['rows_dead_lettered'] += len(failures)
+        stats['errors'] += len(failures)
+    return True
+
+
+def commit_prunes(conn, prunes, stats, stats_lock=None):
+    """Prune stale rows of reloaded files on their own, after their batch had to be salvaged.
+
+    Returns True once committed; a failure is logged and counted as an error.
+    """
+    if not prunes:
+        return True
+    try:
+        with conn.cursor() as cur:
+            pruned = prune_file_rows(cur, prunes)
+        conn.commit()
+    except Exception as e:
+        logger.error(f"Could not prune stale rows of {len(prunes)} files: {e}")
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        with stats_lock or nullcontext():
+            stats['errors'] += 1
+        return False
+    with stats_lock or nullcontext():
+        stats['rows_pruned'] += pruned
+    return True
+
+
+class BatchWriter:
+    """Dedicated database writer stage fed by download workers.
+
+    Workers put parsed rows on a bounded queue and go straight back to
+    downloading. A single writer thread drains the queue on its own
+    connection and flushes whenever a batch is full or WRITER_FLUSH_INTERVAL
+    has passed. When the database falls behind the queue fills up and put()
+    blocks, which slows the download stage down instead of buffering without
+    limit. If the writer thread dies, its error is kept and re-raised by
+    put(), flush() and stop() instead of leaving them blocked forever.
+    """
+
+    def __init__(self, connect, stats, stats_lock=None, db_writer='copy', max_rows=100, max_bytes=None,
+                 queue_size=WRITER_QUEUE_SIZE, flush_interval=WRITER_FLUSH_INTERVAL, metrics=None):
+        """
+        Args:
+            connect: Callable returning a new psycopg2 connection for the writer
+            stats: Crawler stats dict, updated with batch, row and error counts
+            stats_lock: Lock the download workers hold while updating stats
+            db_writer: 'copy' or 'values' write path
+            max_rows: Flush once this many rows are pending
+            max_bytes: Flush once this much row data is pending (None to ignore size)
+            metrics: CrawlMetrics receiving queue_wait and db_commit timings
+        """
+        self.connect = connect
+        self.stats = stats
+        self.stats_lock = stats_lock or threading.Lock()
+        self.db_writer = db_writer
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.metrics = metrics
+        self.queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._conn = None
+        self.error = None
+        self._occupancy_lock = threading.Lock()
+        self.occupancy = {
+            'queue_capacity': queue_size,
+            'queue_max_depth': 0,
+            'queue_depth_total': 0,
+            'queue_samples': 0,
+            'producer_wait_seconds': 0.0,
+            'writer_busy_seconds': 0.0,
+            'writer_seconds': 0.0,
+        }
+
+    def start(self):
+        """Open the writer connection and start draining the queue."""
+        self._conn = self.connect()
+        self._started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+        self._thread.start()
+
+    def put(self, row, size=0):
+        """Queue a parsed row, blocking while the writer is behind."""
+        self._check_writer()
+        try:
+            self.queue.put_nowait((row, size))
+            waited = 0.0
+        except queue.Full:
+            started = time.monotonic()
+            self._put((row, size))
+            waited = time.monotonic() - started
+            with self._occupancy_lock:
+                self.occupancy['producer_wait_seconds'] += waited
+        if self.metrics is not None:
+            self.metrics.observe('queue_wait', waited)
+
+    def prune(self, file_id, keep):
+        """Queue the deletion of file_id's rows other than keep, done with the batch it lands in."""
+        self._check_writer()
+        self._put((_PRUNE, (file_id, keep)))
+
+    def flush(self):
+        """Block until every row queued so far has been committed."""
+        if self._thread is None:
+            return
+        done = threading.Event()
+        self._put((_FLUSH, done))
+        while not done.wait(WRITER_POLL_INTERVAL):
+            self._check_writer()
+
+    def stop(self):
+        """Flush everything still queued, then close the writer connection.
+
+        Raises the writer thread's error if it died; the connection is closed
+        either way.
+        """
+        if self._thread is None:
+            return
+        try:
+            self._put(_STOP)
+            self._thread.join()
+            if self.error is not None:
+                # The queue had room, so _STOP went in without noticing the dead writer
+                raise RuntimeError(f"Database writer thread died: {self.error!r}") from self.error
+        finally:
+            self._thread = None
+            self.occupancy['writer_seconds'] = time.monotonic() - self._started_at
+            self._conn.close()
+
+    def _put(self, item):
+        """Put item on the queue, waiting for room while the writer is alive."""
+        while True:
+            try:
+                self.queue.put(item, timeout=WRITER_POLL_INTERVAL)
+                return
+            except queue.Full:
+                self._check_writer()
+
+    def _check_writer(self):
+        """Raise if the writer thread has died; rows queued to it would never be written."""
+        if self._thread is not None and not self._thread.is_alive():
+            raise RuntimeError(f"Database writer thread died: {self.error!r}") from self.error
+
+    def _run(self):
+        try:
+            self._drain()
+        except BaseException as e:
+            self.error = e
+            logger.critical("Database writer thread died!", exc_info=True)
+
+    def _drain(self):
+        batch, batch_bytes, prunes = [], 0, {}
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._flush(batch, prunes)
+                return
+
+            flush_requested = None
+            if item is not None:
+                row, size = item
+                if row is _FLUSH:
+                    flush_requested = size
+                elif row is _PRUNE:
+                    file_id, keep = size
+                    prunes[file_id] = keep
+                else:
+                    self._sample_depth()
+                    batch.append(row)
+                    batch_bytes += size
+
+            batch_full = (len(batch) >= self.max_rows
+                          or (self.max_bytes is not None and batch_bytes >= self.max_bytes))
+            if batch_full or flush_requested is not None or time.monotonic() >= deadline:
+                self._flush(batch, prunes)
+                batch, batch_bytes, prunes = [], 0, {}
+                deadline = time.monotonic() + self.flush_interval
+                if flush_requested is not None:
+                    flush_requested.set()
+
+    def _sample_depth(self):
+        depth = self.queue.qsize()
+        self.occupancy['queue_depth_total'] += depth
+        self.occupancy['queue_samples'] += 1
+        if depth > self.occupancy['queue_max_depth']:
+            self.occupancy['queue_max_depth'] = depth
+
+    def _flush(self, batch, prunes=None):
+        """Write one batch, and prune the stale rows of files finished in it, on the writer connection."""
+        if not batch and not prunes:
+            return
+        started = time.monotonic()
+        # A file can be queued twice (several parents, repeated changes); keep the
+        # latest row so one statement never updates the same movie twice
+        rows = list({row[0]: row for row in batch}.values())
+        try:
+            with self._conn.cursor() as cur:
+                written = self._write(cur, rows) if rows else 0
+                pruned = prune_file_rows(cur, prunes)
+            self._conn.commit()
+            logger.info(f"✅ Committed a batch of {len(rows)} records to the database ({written} written"
+                        f"{f', {pruned} stale pruned' if pruned else ''}).")
+            with self.stats_lock:
+                self.stats['db_batches_committed'] += 1
+                self.stats['rows_written'] += written
+                self.stats['rows_pruned'] += pruned
+        except Exception:
+            logger.error("Database batch insert failed!", exc_info=True)
+            if self._rollback() and (not rows or salvage_batch(self._conn, rows, self._write, self.stats,
+                                                               self.stats_lock)):
+                commit_prunes(self._conn, prunes, self.stats, self.stats_lock)
+            else:
+                with self.stats_lock:
+                    self.stats['errors'] += len(batch)
+                    self.stats['db_batches_failed'] += 1
+        finally:
+            elapsed = time.monotonic() - started
+            self.occupancy['writer_busy_seconds'] += elapsed
+            if self.metrics is not None:
+                self.metrics.observe('db_commit', elapsed)
+
+    def _write(self, cur, rows):
+        if self.db_writer == 'copy':
+            return copy_upsert(cur, rows)
+        return values_upsert(cur, rows, page_size=self.max_rows)
+
+    def _rollback(self):
+        """Roll back a failed batch, reconnecting if the connection itself is gone.
+
+        Long-running modes (the sync daemon) can outlive a database restart;
+        the failed batch is reported as usual and the next one gets a fresh
+        connection. Returns True if the old connection is still usable.
+        """
+        try:
+            self._conn.rollback()
+            return True
+        except Exception:
+            logger.warning("Writer connection lost; reconnecting")
+            try:
+                self._conn = self.connect()
+            except Exception as e:
+                logger.error(f"Writer could not reconnect, will retry on the next batch: {e}")
+            return False
+
+    def summary(self):
+        """Return human-readable occupancy figures for the crawl summary."""
+        samples = self.occupancy['queue_samples']
+        average_depth = self.occupancy['queue_depth_total'] / samples if samples else 0.0
+        writer_seconds = self.occupancy['writer_seconds']
+        busy = self.occupancy['writer_busy_seconds'] / writer_seconds * 100 if writer_seconds else 0.0
+        return (
+            f"queue avg {average_depth:.0f}/{self.occupancy['queue_capacity']}, "
+            f"max {self.occupancy['queue_max_depth']}, "
+            f"writer busy {busy:.0f}%, "
+            f"downloads blocked {self.occupancy['producer_wait_seconds']:.1f}s"
+        )
@@ -0,0 +1,229 @@
+import json
+import logging
+import random
+import ssl
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+GOVERNOR_INITIAL_LIMIT = 8 # Drive calls allowed in flight when a crawl starts
+GOVERNOR_MIN_LIMIT = 1 # Never throttle below one call in flight
+GOVERNOR_MAX_LIMIT = 64 # Upper bound on calls in flight, however well Drive keeps up
+DECREASE_FACTOR = 0.5 # Multiplicative decrease applied to the limit on a rate-limit response
+BACKOFF_BASE = 1.0 # First backoff delay in seconds, doubled per consecutive failure
+BACKOFF_CAP = 64.0 # Longest backoff delay in seconds
+RETRY_BUDGET_BASE = 50 # Retries available to a crawl before any call has succeeded
+RETRY_BUDGET_RATIO = 0.1 # Extra retries earned per successful call
+MAX_ATTEMPTS_PER_CALL = 8 # Give up on a single call after this many attempts
+
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+TRANSIENT_STATUSES = {500, 502, 503, 504}
+
+SUCCESS = 'success'
+THROTTLED = 'throttled' # Drive asked us to slow down
+TRANSIENT = 'transient' # Network or server hiccup, worth retrying as-is
+FATAL = 'fatal' # Retrying cannot help (not found, permission denied, bad request)
+
+
+def error_status(error):
+    """HTTP status of an HttpError-like exception, or None."""
+    resp = getattr(error, 'resp', None)
+    status = getattr(resp, 'status', None)
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def error_reasons(error):
+    """Reason codes from a Drive error response body."""
+    content = getattr(error, 'content', None)
+    if not content:
+        return set()
+    try:
+        body = json.loads(content.decode('utf-8') if isinstance(content, bytes) else content)
+        return {item.get('reason') for item in body['error'].get('errors', [])}
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return set()
+
+
+def classify_error(error):
+    """Decide how a failed Drive call should be retried."""
+    status = error_status(error)
+    if status is None:
+        if isinstance(error, (ssl.SSLError, ConnectionError, TimeoutError)):
+            return TRANSIENT
+        return FATAL
+    if status == 429 or (status == 403 and error_reasons(error) & RATE_LIMIT_REASONS):
+        return THROTTLED
+    if status in TRANSIENT_STATUSES:
+        return TRANSIENT
+    return FATAL
+
+
+def retry_after_seconds(error):
+    """Seconds requested by a Retry-After header (delta or HTTP date), or None."""
+    resp = getattr(error, 'resp', None)
+    if resp is None or not hasattr(resp, 'get'):
+        return None
+    value = resp.get('retry-after')
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateGovernor:
+    """Shared admission control and retry policy for Drive API calls.
+
+    Every call takes a slot before it runs. The number of slots follows
+    additive-increase/multiplicative-decrease: each success grows the limit
+    by 1/limit (about one slot per round of calls), and a rate-limit response
+    halves it and pauses all callers for the Retry-After delay, or a jittered
+    exponential backoff when Drive does not send one. Calls that were already
+    in flight when the limit was cut do not cut it again, so one burst of 429s
+    counts as a single congestion signal.
+
+    Retries of transient failures come out of one budget for the whole crawl:
+    a base allowance plus a share of every successful call. When the budget
+    is spent, failing calls raise instead of retrying, so a crawl against an
+    unhealthy API fails fast instead of sleeping through every file.
+    Throttled calls are retried up to MAX_ATTEMPTS_PER_CALL times without
+    touching the budget, since the governor already paces them.
+    """
+
+    def __init__(self, initial_limit=GOVERNOR_INITIAL_LIMIT, min_limit=GOVERNOR_MIN_LIMIT,
+                 max_limit=GOVERNOR_MAX_LIMIT, retry_budget=RETRY_BUDGET_BASE,
+                 retry_ratio=RETRY_BUDGET_RATIO, sleep=time.sleep, rng=None):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(max(min_limit, min(initial_limit, max_limit)))
+        self.retry_budget = retry_budget
+        self.retry_ratio = retry_ratio
+        self._sleep = sleep
+        self._rng = rng or random.Random()
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._consecutive_throttles = 0
+        self.stats = {
+            'calls': 0,
+            'successes': 0,
+            'throttled': 0,
+            'transient_errors': 0,
+            'retries': 0, # Transient retries charged to the budget
+            'budget_exhausted': 0,
+            'peak_limit': self.limit,
+            'min_limit_seen': self.limit,
+        }
+
+    def acquire(self):
+        """Wait for a free slot and any rate-limit pause; returns the call's start time."""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    self._cond.wait(self._paused_until - now)
+                elif self._in_flight >= int(self.limit):
+                    self._cond.wait()
+                else:
+                    self._in_flight += 1
+                    self.stats['calls'] += 1
+                    return now
+
+    def release(self, started, outcome, retry_after=None):
+        """Return a slot and adjust the limit for the call's outcome."""
+        with self._cond:
+            self._in_flight -= 1
+            if outcome == SUCCESS:
+                self.stats['successes'] += 1
+                self._consecutive_throttles = 0
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+                self.stats['peak_limit'] = max(self.stats['peak_limit'], self.limit)
+            elif outcome == THROTTLED:
+                self.stats['throttled'] += 1
+                if started >= self._last_decrease:
+                    self._consecutive_throttles += 1
+                    self.limit = max(self.min_limit, self.limit * DECREASE_FACTOR)
+                    self.stats['min_limit_seen'] = min(self.stats['min_limit_seen'], self.limit)
+                    self._last_decrease = time.monotonic()
+                    delay = retry_after if retry_after is not None else self.backoff(self._consecutive_throttles)
+                    self._paused_until = max(self._paused_until, self._last_decrease + delay)
+                    logger.warning(f"🚦 Drive rate limit hit; concurrency limit now {self.limit:.1f}, "
+                                   f"pausing calls for {delay:.1f}s")
+            elif outcome == TRANSIENT:
+                self.stats['transient_errors'] += 1
+            self._cond.notify_all()
+
+    def backoff(self, attempt):
+        """Jittered exponential delay for the given attempt (1-based)."""
+        ceiling = min(BACKOFF_CAP, BACKOFF_BASE * (2 ** (attempt - 1)))
+        return ceiling / 2 + self._rng.uniform(0, ceiling / 2)
+
+    def spend_retry(self):
+        """Take one retry from the crawl's budget; False once it is spent."""
+        with self._cond:
+            if self.stats['retries'] >= self.retries_allowed():
+                self.stats['budget_exhausted'] += 1
+                return False
+            self.stats['retries'] += 1
+            return True
+
+    def retries_allowed(self):
+        return int(self.retry_budget + self.retry_ratio * self.stats['successes'])
+
+    def wait_time(self):
+        """Seconds until a rate-limit pause ends (0 when not paused)."""
+        with self._cond:
+            return max(0.0, self._paused_until - time.monotonic())
+
+    def call(self, func, description='API call'):
+        """Run func under the governor, retrying throttled and transient failures."""
+        attempt = 0
+        while True:
+            started = self.acquire()
+            try:
+                result = func()
+            except Exception as e:
+                outcome = classify_error(e)
+                retry_after = retry_after_seconds(e) if outcome == THROTTLED else None
+                self.release(started, outcome, retry_after)
+                if outcome == FATAL:
+                    raise
+                attempt += 1
+                if attempt >= MAX_ATTEMPTS_PER_CALL:
+                    logger.error(f"{description} failed after {attempt} attempts: {e}")
+                    raise
+                # Throttled retries are already paced by the shared pause and limit,
+                # so only transient failures draw on the crawl's budget
+                if outcome == TRANSIENT and not self.spend_retry():
+                    logger.error(f"{description} failed and the crawl's retry budget is spent: {e}")
+                    raise
+                if outcome == THROTTLED:
+                    # acquire() waits out the shared pause; the jitter spreads the restart
+                    delay = self._rng.uniform(0, BACKOFF_BASE)
+                else:
+                    delay = self.backoff(attempt)
+                logger.warning(f"{description} failed (attempt {attempt}, {outcome}): {e}. "
+                               f"Retrying in {delay + self.wait_time():.1f}s...")
+                self._sleep(delay)
+            else:
+                self.release(started, SUCCESS)
+                return result
+
+    def summary(self):
+        """Return human-readable governor figures for the crawl summary."""
+        return (
+            f"limit {self.limit:.1f} (range {self.stats['min_limit_seen']:.1f}-{self.stats['peak_limit']:.1f}), "
+            f"throttled {self.stats['throttled']}, transient errors {self.stats['transient_errors']}, "
+            f"retries {self.stats['retries']}/{self.retries_allowed()}"
+        )
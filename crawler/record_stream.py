@@ -0,0 +1,252 @@
+import gzip
+import hashlib
+import io
+import json
+import tempfile
+import zipfile
+
+import orjson
+
+SPOOL_MAX_BYTES = 16 * 1024 * 1024 # Downloads larger than this spill from memory to a temporary file
+READ_CHUNK_CHARS = 1024 * 1024 # Characters read at a time while scanning a JSON array
+MAX_RECORD_CHARS = 64 * 1024 * 1024 # A single array element larger than this is treated as corrupt
+
+RECORD_SEPARATOR = '#' # Joins a bulk file's Drive ID and a record position in drive_file_id (never part of a Drive ID)
+
+# Containers holding many movies; a plain .json file holds one movie or a JSON array of them
+BULK_SUFFIXES = ('.jsonl', '.ndjson', '.jsonl.gz', '.ndjson.gz', '.json.gz', '.zip')
+
+
+def is_movie_file(name):
+    """Return True for file names the crawler knows how to read movies from."""
+    name = name.lower()
+    return name.endswith('.json') or name.endswith(BULK_SUFFIXES)
+
+
+def loads(data):
+    """Parse JSON from text or UTF-8 bytes with orjson.
+
+    Documents orjson refuses but the stdlib accepts (NaN, Infinity) fall
+    back to json, so they are handled exactly as before.
+    """
+    try:
+        return orjson.loads(data)
+    except orjson.JSONDecodeError:
+        return json.loads(data)
+
+
+def canonical_json(movie_data):
+    """Serialise a movie payload independently of key order and whitespace."""
+    return json.dumps(movie_data, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+
+def canonical_bytes(movie_data):
+    """UTF-8 canonical form of a payload, by orjson.
+
+    Payloads orjson cannot encode (NaN, integers over 64 bits) fall back to
+    canonical_json. The two agree except on floats in exponent notation
+    (1e-07 vs 1e-7).
+    """
+    try:
+        return orjson.dumps(movie_data, option=orjson.OPT_SORT_KEYS)
+    except orjson.JSONEncodeError:
+        return canonical_json(movie_data).encode('utf-8')
+
+
+def content_hash(movie_data):
+    """Hash a parsed movie payload independently of key order and whitespace."""
+    return hashlib.sha256(canonical_bytes(movie_data)).hexdigest()
+
+
+def validate_movie(movie_data):
+    """Return the promoted (title, year, rating, genre) of a movie.
+
+    Raises ValueError (or TypeError) if the movie is not an object or is
+    missing one of its core fields. Values that already have the right JSON
+    type are taken as they are; anything else is coerced as before.
+    """
+    if type(movie_data) is not dict:
+        raise ValueError(f"expected a JSON object, got {type(movie_data).__name__}")
+    get = movie_data.get
+    title = get('title', 'N/A')
+    title = (title if type(title) is str else str(title)).strip()
+    year = get('year', 0)
+    if type(year) is not int:
+        year = int(year)
+    rating = get('rating', 0.0)
+    if type(rating) is not float:
+        rating = float(rating)
+    genre = get('genre', 'N/A')
+    genre = (genre if type(genre) is str else str(genre)).strip()
+    
+    if not (title and year and rating and genre):
+        raise ValueError("Missing or invalid core data")
+    return title, year, rating, genre
+
+
+def movie_values(drive_file_id, movie_data, md5_checksum=None, modified_time=None, raw=None):
+    """Validate a movie and build its movies row.
+
+    The metadata payload is JSON text ready for the JSONB column: the
+    record's own text from the file when raw is given (see
+    iter_records(raw=True)), or the canonical form otherwise. Either way the
+    content hash is taken over that same text, so a record is never
+    serialised again just to hash it. With raw text the hash follows the
+    file's formatting: reordering keys or changing whitespace in a record
+    counts as a change and rewrites (and re-embeds) it. Returns (row, size),
+    size being the payload length for sizing write batches. Plain values
+    keep the row picklable, so it can be built in a worker process.
+    """
+    title, year, rating, genre = validate_movie(movie_data)
+    if raw is None:
+        encoded = canonical_bytes(movie_data)
+        payload = encoded.decode('utf-8')
+    elif isinstance(raw, bytes):
+        encoded, payload = raw, raw.decode('utf-8')
+    else:
+        encoded, payload = raw.encode('utf-8'), raw
+    row = (drive_file_id, title, year, rating, genre, payload,
+           md5_checksum, modified_time, hashlib.sha256(encoded).hexdigest())
+    return row, len(payload)
+
+
+def spooled_buffer():
+    """A download buffer that stays in memory for small files and spills to disk for large ones."""
+    return tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+
+
+def iter_records(name, stream, raw=False):
+    """Yield (position, record) for every movie in a downloaded file.
+
+    The format is chosen from the file name: JSON Lines, a .json file holding
+    one object or an array of them, gzip-compressed variants of either, or a
+    zip archive of any of these. Files are read incrementally, so memory
+    stays bounded by the largest single record.
+
+    position is None for a .json file holding a single object (the file is
+    the record). Otherwise it is the record's 1-based number, prefixed with
+    its member path inside a zip archive, e.g. 'movies/part-1.jsonl:42'.
+    A record that cannot be decoded is yielded as the exception instead, so
+    callers can report it and carry on; errors that make the rest of the
+    file unreadable (a corrupt archive, a broken array) are raised.
+
+    With raw=True each record is yielded as (value, text) instead, text
+    being the record's exact JSON (bytes or str) as it appears in the file.
+    JSON Lines and single-object files are parsed straight from bytes.
+    """
+    lowered = name.lower()
+    if lowered.endswith('.zip'):
+        yield from _iter_zip(stream, raw)
+    elif lowered.endswith('.gz'):
+        with gzip.GzipFile(fileobj=stream, mode='rb') as unzipped:
+            yield from iter_records(name[:-3], unzipped, raw)
+    elif lowered.endswith(('.jsonl', '.ndjson')):
+        yield from _iter_json_lines(stream, raw)
+    else:
+        yield from _iter_json_document(stream, raw)
+
+
+def _iter_zip(stream, raw=False):
+    with zipfile.ZipFile(stream) as archive:
+        for info in archive.infolist():
+            member = info.filename
+            if info.is_dir() or member.lower().endswith('.zip') or not is_movie_file(member):
+                continue
+            with archive.open(info) as member_stream:
+                for position, record in iter_records(member, member_stream, raw):
+                    yield f"{member}:{position or 1}", record
+
+
+def _iter_json_lines(stream, raw=False):
+    for number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            value = loads(line)
+        except ValueError as e:
+            yield number, e
+            continue
+        yield number, (value, line) if raw else value
+
+
+def _iter_json_document(stream, raw=False):
+    head = stream.read(READ_CHUNK_CHARS)
+    if head.lstrip()[:1] == b'[':
+        # Arrays are scanned as text, element by element; start again from the top
+        if stream.seekable():
+            stream.seek(0)
+        else:
+            stream = io.BytesIO(head + stream.read())
+        yield from iter_json_array(io.TextIOWrapper(stream, encoding='utf-8'), raw=raw)
+    else:
+        # A single movie per file: small, so it is parsed in one go
+        data = head + stream.read()
+        value = loads(data)
+        yield None, (value, data) if raw else value
+
+
+def iter_json_array(text, buffer='', raw=False):
+    """Yield (number, element) for each element of a JSON array read incrementally from text.
+
+    With raw=True elements are yielded as (value, element_text).
+    """
+    decoder = json.JSONDecoder()
+    pos = 0
+    eof = False
+
+    def read_more():
+        nonlocal buffer, pos, eof
+        chunk = text.read(READ_CHUNK_CHARS)
+        if not chunk:
+            eof = True
+            return False
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        if len(buffer) > MAX_RECORD_CHARS:
+            raise ValueError(f"array element larger than {MAX_RECORD_CHARS} characters")
+        return True
+
+    def next_token():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            if not read_more():
+                return None
+
+    if next_token() != '[':
+        raise ValueError("expected a JSON array")
+    pos += 1
+    number = 0
+    while True:
+        token = next_token()
+        if token is None:
+            raise ValueError(f"unterminated JSON array after element {number}")
+        if token == ']' and number == 0:
+            return
+        if number:
+            if token == ']':
+                return
+            if token != ',':
+                raise ValueError(f"expected ',' or ']' after element {number}")
+            pos += 1
+            if next_token() is None:
+                raise ValueError(f"unterminated JSON array after element {number}")
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                # The element may just be cut off at the end of the buffer
+                if read_more():
+                    continue
+                raise
+            if end == len(buffer) and not eof and read_more():
+                continue # A number or literal may continue in the next chunk
+            break
+        number += 1
+        element = (value, buffer[pos:end]) if raw else value
+        pos = end
+        yield number, element
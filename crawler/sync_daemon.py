@@ -0,0 +1,208 @@
+import logging
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from async_engine import DEFAULT_CONCURRENCY
+from change_feed import DownloadPool
+
+logger = logging.getLogger(__name__)
+
+DAEMON_MIN_INTERVAL = 5.0 # Seconds between polls while changes keep arriving
+DAEMON_MAX_INTERVAL = 300.0 # Longest wait between polls when the Drive is idle
+DAEMON_BACKOFF = 2.0 # Interval growth factor after each poll that found nothing
+PUSH_CHANNEL_TTL = 24 * 3600 # Lifetime requested for a push notification channel, in seconds
+
+
+class PushHandler(BaseHTTPRequestHandler):
+    """Accepts Drive push notifications and wakes the daemon for an early poll.
+
+    Drive sends a 'sync' message when a channel is opened, then a POST with
+    X-Goog-Resource-State set to 'change' whenever the change feed moves.
+    The body carries nothing useful; the daemon reads the feed itself.
+    """
+
+    def do_POST(self):
+        daemon = self.server.sync_daemon
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        if daemon.push_token and self.headers.get('X-Goog-Channel-Token') != daemon.push_token:
+            self.send_response(403)
+            self.end_headers()
+            return
+        if self.headers.get('X-Goog-Resource-State') != 'sync':
+            daemon.notify()
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        logger.debug(f"Push endpoint: {format % args}")
+
+
+class ChangeSyncDaemon:
+    """Keeps a crawler warm and applies Drive changes as they happen.
+
+    The Drive service, database connections, writer stage and download
+    threads all live for the whole daemon, so a poll costs one
+    changes().list call when nothing changed. Polls run every min_interval
+    seconds while changes flow, and the wait doubles after every empty poll
+    up to max_interval. A push notification, when the endpoint is enabled,
+    cuts the wait short.
+    """
+
+    def __init__(self, crawler, concurrency=DEFAULT_CONCURRENCY, min_interval=DAEMON_MIN_INTERVAL,
+                 max_interval=DAEMON_MAX_INTERVAL, push_port=None, push_host='127.0.0.1',
+                 push_token=None, push_address=None):
+        """
+        Args:
+            crawler: GoogleDriveCrawler whose writer stage is running
+            push_port: Local port for the push notification endpoint (None to only poll)
+            push_token: Shared secret Drive echoes in X-Goog-Channel-Token
+            push_address: Public HTTPS URL forwarding to the endpoint; when set, a
+                changes().watch channel is opened and renewed there
+        """
+        self.crawler = crawler
+        self.concurrency = concurrency
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.push_port = push_port
+        self.push_host = push_host
+        self.push_token = push_token
+        self.push_address = push_address
+        self.interval = min_interval
+        self.channel = None
+        self.server = None
+        self.stats = {
+            'polls': 0,
+            'active_polls': 0,
+            'failed_polls': 0,
+            'push_notifications': 0,
+        }
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+    def notify(self):
+        """Poll as soon as possible (called by the push endpoint)."""
+        self.stats['push_notifications'] += 1
+        self._wake.set()
+
+    def stop(self):
+        """Finish the current poll and exit; safe to call from a signal handler."""
+        self._stop.set()
+        self._wake.set()
+
+    def run(self):
+        """Poll until stop() is called."""
+        self.crawler.download_pool = DownloadPool(self.crawler, self.concurrency)
+        if self.push_port is not None:
+            self.start_push_endpoint()
+        logger.info(f"🛰️  Change sync daemon started (polling every {self.min_interval:.0f}-"
+                    f"{self.max_interval:.0f}s)")
+        try:
+            while not self._stop.is_set():
+                if self.push_address:
+                    self.renew_channel()
+                self._wake.clear()
+                changes, failed = self.poll()
+                self.interval = self.next_interval(self.interval, changes, failed)
+                logger.debug(f"Next poll in {self.interval:.0f}s")
+                self._wake.wait(self.interval)
+        finally:
+            self.stop_channel()
+            if self.server is not None:
+                self.server.shutdown()
+                self.server.server_close()
+            self.crawler.download_pool.close()
+            self.crawler.download_pool = None
+            logger.info("🛰️  Change sync daemon stopped")
+
+    def poll(self):
+        """Apply every change since the last poll; returns (changes_seen, failed)."""
+        self.stats['polls'] += 1
+        self.crawler.ensure_connection()
+        changes_before = self.crawler.stats['changes_processed']
+        errors_before = self.crawler.stats['errors']
+        self.crawler.process_changes(concurrency=self.concurrency)
+        changes = self.crawler.stats['changes_processed'] - changes_before
+        failed = self.crawler.stats['errors'] != errors_before
+        if changes:
+            self.stats['active_polls'] += 1
+            # Embed and match the changed movies as soon as the writer has committed them
+            self.crawler.flush_writes()
+            self.crawler.process_new_movies()
+        if failed:
+            self.stats['failed_polls'] += 1
+        return changes, failed
+
+    def next_interval(self, interval, changes, failed):
+        """Poll again quickly while changes flow, back off while idle or failing."""
+        if changes and not failed:
+            return self.min_interval
+        return min(self.max_interval, max(self.min_interval, interval * DAEMON_BACKOFF))
+
+    def start_push_endpoint(self):
+        """Serve push notifications on push_host:push_port from a background thread."""
+        self.server = ThreadingHTTPServer((self.push_host, self.push_port), PushHandler)
+        self.server.sync_daemon = self
+        threading.Thread(target=self.server.serve_forever, name='push-endpoint', daemon=True).start()
+        logger.info(f"📬 Listening for Drive push notifications on "
+                    f"http://{self.push_host}:{self.server.server_address[1]}")
+
+    def renew_channel(self):
+        """Open a changes().watch channel, or replace one that is about to expire."""
+        margin = 2 * self.max_interval
+        if self.channel is not None and self.channel['expires_at'] - time.time() > margin:
+            return
+        page_token = self.crawler.get_latest_change_token()
+        if not page_token:
+            return
+        body = {
+            'id': str(uuid.uuid4()),
+            'type': 'web_hook',
+            'address': self.push_address,
+            'expiration': int((time.time() + PUSH_CHANNEL_TTL) * 1000),
+        }
+        if self.push_token:
+            body['token'] = self.push_token
+        try:
+            response = self.crawler._retry_api_call(
+                self.crawler.service.changes().watch(
+                    pageToken=page_token,
+                    body=body,
+                    supportsAllDrives=True,
+                    includeItemsFromAllDrives=True
+                )
+            )
+        except Exception as e:
+            logger.error(f"Could not open a push notification channel, polling only: {e}")
+            return
+        self.stop_channel()
+        expiration = response.get('expiration')
+        self.channel = {
+            'id': response.get('id', body['id']),
+            'resourceId': response.get('resourceId'),
+            'expires_at': int(expiration) / 1000 if expiration else time.time() + PUSH_CHANNEL_TTL,
+        }
+        logger.info(f"📬 Push channel {self.channel['id']} open until "
+                    f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.channel['expires_at']))}")
+
+    def stop_channel(self):
+        """Close the current push channel, if any."""
+        if self.channel is None:
+            return
+        channel, self.channel = self.channel, None
+        try:
+            self.crawler._retry_api_call(
+                self.crawler.service.channels().stop(body={'id': channel['id'], 'resourceId': channel['resourceId']})
+            )
+        except Exception as e:
+            logger.warning(f"Could not stop push channel {channel['id']}: {e}")
+
+    def summary(self):
+        """Return human-readable daemon figures for the shutdown summary."""
+        return (
+            f"{self.stats['polls']} polls ({self.stats['active_polls']} with changes, "
+            f"{self.stats['failed_polls']} failed), {self.stats['push_notifications']} push notifications"
+        )
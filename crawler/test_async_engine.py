@@ -0,0 +1,233 @@
+import unittest
+import threading
+import time
+
+from async_engine import AsyncCrawlEngine
+from checkpoint import CrawlCheckpoint
+from discovery import FlatDiscovery, FOLDER_MIME_TYPE
+
+
+class FakeCrawler:
+    """Minimal stand-in for GoogleDriveCrawler used by the async engine."""
+
+    def __init__(self, tree, download_delay=0.0, page_size=1000):
+        self.tree = tree
+        self.page_size = page_size
+        self.list_calls = 0
+        self.download_delay = download_delay
+        self.stats = {'files_processed': 0, 'errors': 0, 'folders_processed': 0}
+        self.lock = threading.Lock()
+        self.transports_built = 0
+        self.in_use = set()
+        self.shared_transport = False
+        self.max_in_flight = 0
+        self.downloaded = []
+
+    def count(self, key, amount=1):
+        with self.lock:
+            self.stats[key] += amount
+
+    def build_http_transport(self):
+        self.transports_built += 1
+        return object()
+
+    def list_folder(self, folder_id, page_token=None, http=None):
+        with self.lock:
+            self.list_calls += 1
+        items = self.tree.get(folder_id, [])
+        start = int(page_token or 0)
+        page = {'files': items[start:start + self.page_size]}
+        if start + self.page_size < len(items):
+            page['nextPageToken'] = str(start + self.page_size)
+        return page
+
+    def list_all_files(self, query, page_token=None, http=None):
+        with self.lock:
+            self.list_calls += 1
+        items = self.tree.get('*', [])
+        start = int(page_token or 0)
+        page = {'files': items[start:start + self.page_size]}
+        if start + self.page_size < len(items):
+            page['nextPageToken'] = str(start + self.page_size)
+        return page
+
+    def should_process(self, item):
+        return True
+
+    def process_drive_file(self, item, http=None):
+        self.process_json_file(item['id'], item['name'], http=http)
+
+    def save_checkpoint(self, checkpoint, futures=None):
+        checkpoint.save()
+
+    def process_json_file(self, file_id, filename, http=None):
+        with self.lock:
+            if http in self.in_use:
+                self.shared_transport = True
+            self.in_use.add(http)
+            self.max_in_flight = max(self.max_in_flight, len(self.in_use))
+        time.sleep(self.download_delay)
+        with self.lock:
+            self.in_use.discard(http)
+            self.downloaded.append(file_id)
+            self.stats['files_processed'] += 1
+
+
+class MemoryCheckpoint(CrawlCheckpoint):
+    """Checkpoint that records snapshots instead of writing to Postgres."""
+
+    def __init__(self, crawler, **kwargs):
+        super().__init__(None, 'run-1', 'root', interval=0, **kwargs)
+        self.crawler = crawler
+        self.snapshots = []
+
+    def save(self):
+        with self.crawler.lock:
+            downloaded = set(self.crawler.downloaded)
+        self.snapshots.append((set(self.done), downloaded))
+        self._saved_at = time.monotonic()
+
+
+def folder(folder_id, name):
+    return {'id': folder_id, 'name': name, 'mimeType': FOLDER_MIME_TYPE}
+
+
+def json_file(file_id):
+    return {'id': file_id, 'name': f'{file_id}.json', 'mimeType': 'application/json'}
+
+
+class TestAsyncCrawlEngine(unittest.TestCase):
+
+    def test_crawls_nested_folders(self):
+        """Test that every JSON file in the tree is processed once"""
+        tree = {
+            'root': [json_file('a'), folder('sub', 'sub'), {'id': 'x', 'name': 'notes.txt', 'mimeType': 'text/plain'}],
+            'sub': [json_file('b'), folder('deep', 'deep')],
+            'deep': [json_file('c')],
+        }
+        crawler = FakeCrawler(tree)
+
+        AsyncCrawlEngine(crawler, concurrency=4, listers=2).run('root')
+
+        self.assertEqual(sorted(crawler.downloaded), ['a', 'b', 'c'])
+        self.assertEqual(crawler.stats['folders_processed'], 3)
+        self.assertEqual(crawler.transports_built, 6)
+
+    def test_follows_every_listing_page(self):
+        """Test that large folders are not truncated to the first page"""
+        tree = {
+            'root': [json_file(f'f{i}') for i in range(25)] + [folder('sub', 'sub')],
+            'sub': [json_file(f'g{i}') for i in range(7)],
+        }
+        crawler = FakeCrawler(tree, page_size=10)
+
+        AsyncCrawlEngine(crawler, concurrency=4).run('root')
+
+        self.assertEqual(len(crawler.downloaded), 32)
+        self.assertEqual(crawler.list_calls, 4)
+
+    def test_deep_tree_does_not_recurse(self):
+        """Test that tree depth does not turn into recursion depth"""
+        depth = 3000
+        tree = {f'd{i}': [folder(f'd{i + 1}', f'd{i + 1}'), json_file(f'f{i}')] for i in range(depth)}
+        crawler = FakeCrawler(tree)
+
+        AsyncCrawlEngine(crawler, concurrency=4).run('d0')
+
+        self.assertEqual(len(crawler.downloaded), depth)
+        self.assertEqual(crawler.stats['folders_processed'], depth + 1)
+
+    def test_downloads_run_concurrently_without_sharing_transports(self):
+        """Test that downloads overlap and each uses its own transport"""
+        tree = {'root': [json_file(f'f{i}') for i in range(20)]}
+        crawler = FakeCrawler(tree, download_delay=0.05)
+
+        AsyncCrawlEngine(crawler, concurrency=8).run('root')
+
+        self.assertEqual(len(crawler.downloaded), 20)
+        self.assertGreater(crawler.max_in_flight, 1)
+        self.assertLessEqual(crawler.max_in_flight, 8)
+        self.assertFalse(crawler.shared_transport)
+
+    def test_flat_discovery_replaces_folder_listing(self):
+        """Test that flat discovery downloads only the files under the root"""
+        discovery = FlatDiscovery('root')
+        discovery.add_folders([{'id': 'sub', 'parents': ['root']}])
+        tree = {'*': [
+            {'id': 'a', 'name': 'a.json', 'mimeType': 'application/json', 'parents': ['root']},
+            {'id': 'b', 'name': 'b.json', 'mimeType': 'application/json', 'parents': ['sub']},
+            {'id': 'c', 'name': 'c.json', 'mimeType': 'application/json', 'parents': ['elsewhere']},
+        ]}
+        crawler = FakeCrawler(tree, page_size=2)
+
+        AsyncCrawlEngine(crawler, concurrency=2).run('root', discovery=discovery)
+
+        self.assertEqual(sorted(crawler.downloaded), ['a', 'b'])
+        self.assertEqual(crawler.list_calls, 2)
+        self.assertEqual(crawler.stats['folders_processed'], 0)
+
+    def test_listing_error_is_counted(self):
+        """Test that a failed folder listing is recorded as an error"""
+        crawler = FakeCrawler({})
+
+        def failing_list_folder(folder_id, page_token=None, http=None):
+            raise Exception("List failed")
+        crawler.list_folder = failing_list_folder
+
+        AsyncCrawlEngine(crawler, concurrency=2).run('root')
+
+        self.assertEqual(crawler.stats['errors'], 1)
+
+    def test_checkpoints_only_record_committed_pages(self):
+        """Test that every folder a checkpoint marks done has all its files downloaded"""
+        tree = {
+            'root': [json_file(f'r{i}') for i in range(6)] + [folder('a', 'a'), folder('b', 'b')],
+            'a': [json_file(f'a{i}') for i in range(5)] + [folder('c', 'c')],
+            'b': [json_file(f'b{i}') for i in range(4)],
+            'c': [json_file('c0')],
+        }
+        crawler = FakeCrawler(tree, download_delay=0.01, page_size=3)
+        checkpoint = MemoryCheckpoint(crawler)
+        checkpoint.folder_discovered('root', 'root')
+
+        AsyncCrawlEngine(crawler, concurrency=3, listers=2).run('root', checkpoint=checkpoint)
+
+        self.assertEqual(len(crawler.downloaded), 16)
+        self.assertTrue(checkpoint.snapshots)
+        for done, downloaded in checkpoint.snapshots:
+            for folder_id in done:
+                expected = {i['id'] for i in tree[folder_id] if i['mimeType'] == 'application/json'}
+                self.assertLessEqual(expected, downloaded)
+        self.assertTrue(checkpoint.is_complete())
+        self.assertEqual(checkpoint.done, {'root', 'a', 'b', 'c'})
+
+    def test_resumes_from_saved_frontier(self):
+        """Test that a resumed crawl lists only the pending folders, from their saved page"""
+        tree = {
+            'root': [json_file('r0'), folder('a', 'a'), folder('b', 'b')],
+            'a': [json_file('a0')],
+            'b': [json_file('b0'), json_file('b1'), json_file('b2'), folder('c', 'c')],
+            'c': [json_file('c0')],
+        }
+        crawler = FakeCrawler(tree, page_size=2)
+        checkpoint = MemoryCheckpoint(crawler)
+        checkpoint.done.update({'root', 'a'})
+        checkpoint.frontier['b'] = ['root/b', '2', 0]
+        checkpoint._position = 1
+
+        AsyncCrawlEngine(crawler, concurrency=2).run('root', checkpoint=checkpoint)
+
+        self.assertEqual(sorted(crawler.downloaded), ['b2', 'c0'])
+        self.assertEqual(crawler.list_calls, 2)
+        self.assertTrue(checkpoint.is_complete())
+
+    def test_invalid_concurrency(self):
+        """Test that concurrency must be positive"""
+        with self.assertRaises(ValueError):
+            AsyncCrawlEngine(FakeCrawler({}), concurrency=0)
+        with self.assertRaises(ValueError):
+            AsyncCrawlEngine(FakeCrawler({}), listers=0)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
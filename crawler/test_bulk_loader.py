@@ -0,0 +1,125 @@
+import unittest
+from unittest.mock import MagicMock
+import json
+import sys
+
+# Mock the required modules before importing
+sys.modules['psycopg2'] = MagicMock()
+sys.modules['psycopg2.extras'] = MagicMock()
+
+from bulk_loader import copy_value, copy_upsert, delete_movies, prune_file_rows, CopyRowStream, MOVIE_COLUMNS, STAGING_TABLE
+
+
+class FakeCursor:
+    """Records statements and drains COPY streams the way psycopg2 does."""
+
+    def __init__(self, returned_rows=0):
+        self.statements = []
+        self.copied = ''
+        self.returned_rows = returned_rows
+        self.params = []
+        self.rowcount = -1
+
+    def execute(self, sql, params=None):
+        self.statements.append(sql)
+        self.params.append(params)
+        if params:
+            self.rowcount = len(params[0])
+
+    def copy_expert(self, sql, stream):
+        self.statements.append(sql)
+        while True:
+            chunk = stream.read(7)
+            if not chunk:
+                break
+            self.copied += chunk
+
+    def fetchall(self):
+        return [('id',)] * self.returned_rows
+
+
+class TestCopyEncoding(unittest.TestCase):
+
+    def test_copy_value_escapes_special_characters(self):
+        """Test COPY text-format escaping"""
+        self.assertEqual(copy_value(None), '\\N')
+        self.assertEqual(copy_value(8.5), '8.5')
+        self.assertEqual(copy_value('a\tb\nc\\d\re'), 'a\\tb\\nc\\\\d\\re')
+
+    def test_copy_value_serialises_json(self):
+        """Test that dicts and Json-wrapped dicts are written as JSON"""
+        wrapped = MagicMock(adapted={'plot': 'line one\nline two'})
+        self.assertEqual(json.loads(copy_value({'a': 1})), {'a': 1})
+        self.assertEqual(copy_value(wrapped), '{"plot": "line one\\\\nline two"}')
+
+    def test_stream_reads_in_chunks(self):
+        """Test that the row stream yields every line regardless of read size"""
+        rows = [('id1', 'A', 2000), ('id2', None, 2001)]
+        stream = CopyRowStream(rows)
+        chunks = []
+        while True:
+            chunk = stream.read(5)
+            if not chunk:
+                break
+            self.assertLessEqual(len(chunk), 5)
+            chunks.append(chunk)
+
+        self.assertEqual(''.join(chunks), 'id1\tA\t2000\nid2\t\\N\t2001\n')
+        self.assertEqual(CopyRowStream(rows).read(), 'id1\tA\t2000\nid2\t\\N\t2001\n')
+
+
+class TestCopyUpsert(unittest.TestCase):
+
+    def test_copy_then_single_merge(self):
+        """Test that a batch is one COPY into staging and one merge statement"""
+        cur = FakeCursor(returned_rows=2)
+        rows = [
+            ('id1', 'Movie 1', 2020, 7.5, 'Drama', {'k': 'v'}, 'md5', None, 'h1'),
+            ('id2', 'Movie 2', 2021, 8.0, 'Action', {}, None, '2024-01-01T00:00:00Z', 'h2'),
+        ]
+
+        written = copy_upsert(cur, rows)
+
+        self.assertEqual(written, 2)
+        self.assertIn(f'CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE}', cur.statements[0])
+        self.assertTrue(cur.statements[1].startswith(f'COPY {STAGING_TABLE}'))
+        self.assertIn(f'FROM {STAGING_TABLE}', cur.statements[2])
+        self.assertIn('ON CONFLICT (drive_file_id)', cur.statements[2])
+        lines = cur.copied.splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(len(lines[0].split('\t')), len(MOVIE_COLUMNS))
+
+
+class TestDeleteMovies(unittest.TestCase):
+
+    def test_deletes_in_batches(self):
+        """Test that removals are deleted with one statement per batch"""
+        cur = FakeCursor()
+        ids = [f'id{i}' for i in range(5)]
+
+        deleted = delete_movies(cur, ids, batch_size=2)
+
+        self.assertEqual(deleted, 5)
+        self.assertEqual(len(cur.statements), 3)
+        self.assertIn("split_part(drive_file_id, '#', 1) = ANY(%s)", cur.statements[0])
+        self.assertEqual(cur.params[0], (['id0', 'id1'],))
+        self.assertEqual(cur.params[2], (['id4'],))
+
+
+class TestPruneFileRows(unittest.TestCase):
+
+    def test_one_statement_keeps_every_queued_row(self):
+        """Test that the rows of every finished file are pruned in one statement"""
+        cur = FakeCursor()
+
+        prune_file_rows(cur, {'bulk': ['bulk#1', 'bulk#2'], 'single': ['single']})
+
+        self.assertEqual(len(cur.statements), 1)
+        self.assertIn("split_part(drive_file_id, '#', 1) = ANY(%s)", cur.statements[0])
+        self.assertEqual(cur.params[0], (['bulk', 'single'], ['bulk#1', 'bulk#2', 'single']))
+        self.assertEqual(prune_file_rows(cur, {}), 0)
+        self.assertEqual(len(cur.statements), 1)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
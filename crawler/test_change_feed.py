@@ -0,0 +1,87 @@
+import threading
+import unittest
+
+from change_feed import collapse_changes, download_files
+from discovery import FOLDER_MIME_TYPE
+
+
+def change(file_id, name=None, removed=False, trashed=False, mime_type='application/json', md5=None):
+    item = {'fileId': file_id, 'removed': removed}
+    if not removed:
+        item['file'] = {'id': file_id, 'name': name or f'{file_id}.json', 'mimeType': mime_type,
+                        'trashed': trashed, 'md5Checksum': md5}
+    return item
+
+
+class TestCollapseChanges(unittest.TestCase):
+
+    def test_latest_change_per_file_wins(self):
+        """Test that repeated edits collapse to the last revision"""
+        upserts, removals = collapse_changes([
+            change('a', md5='1'), change('b'), change('a', md5='2'), change('a', md5='3'),
+        ])
+        self.assertEqual([(u['id'], u['md5Checksum']) for u in upserts], [('b', None), ('a', '3')])
+        self.assertEqual(removals, [])
+
+    def test_removed_and_trashed_become_deletes(self):
+        """Test that removals and trashing win over earlier edits"""
+        upserts, removals = collapse_changes([
+            change('a'), change('a', removed=True),
+            change('b'), change('b', trashed=True),
+            change('c', removed=True), change('c'),
+        ])
+        self.assertEqual(removals, ['a', 'b'])
+        self.assertEqual([u['id'] for u in upserts], ['c'])
+
+    def test_non_json_and_folders_are_ignored(self):
+        """Test that only JSON files are downloaded"""
+        upserts, removals = collapse_changes([
+            change('img', name='poster.jpg', mime_type='image/jpeg'),
+            change('dir', name='folder.json', mime_type=FOLDER_MIME_TYPE),
+            {'removed': False},
+        ])
+        self.assertEqual(upserts, [])
+        self.assertEqual(removals, [])
+
+
+class FakeCrawler:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.transports = 0
+        self.processed = []
+
+    def build_http_transport(self):
+        with self.lock:
+            self.transports += 1
+            return object()
+
+    def process_drive_file(self, item, http=None):
+        with self.lock:
+            self.processed.append((item['id'], http))
+        return item['id'] != 'f3'
+
+
+class TestDownloadFiles(unittest.TestCase):
+
+    def test_each_worker_reuses_its_transport(self):
+        """Test concurrent downloads with one transport per worker thread"""
+        crawler = FakeCrawler()
+        items = [{'id': f'f{i}', 'name': f'f{i}.json'} for i in range(20)]
+
+        results = download_files(crawler, items, concurrency=4)
+
+        self.assertEqual(results, [i['id'] != 'f3' for i in items])
+        self.assertEqual(sorted(p[0] for p in crawler.processed), sorted(i['id'] for i in items))
+        self.assertLessEqual(crawler.transports, 4)
+        self.assertTrue(all(http is not None for _, http in crawler.processed))
+
+    def test_nothing_to_download(self):
+        """Test that an empty window starts no workers"""
+        crawler = FakeCrawler()
+        self.assertEqual(download_files(crawler, [], concurrency=4), [])
+        self.assertEqual(crawler.transports, 0)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
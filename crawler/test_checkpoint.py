@@ -0,0 +1,154 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+
+# Mock the required modules before importing
+sys.modules['psycopg2'] = MagicMock()
+sys.modules['psycopg2.extras'] = MagicMock()
+
+from checkpoint import CrawlCheckpoint
+
+
+class FakeCursor:
+    """Records statements and answers queries from scripted results."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.conn.statements.append((' '.join(sql.split()), params))
+
+    def fetchone(self):
+        return self.conn.results.pop(0)
+
+    def fetchall(self):
+        return self.conn.results.pop(0)
+
+
+class FakeConnection:
+
+    def __init__(self, results=None):
+        self.statements = []
+        self.results = list(results or [])
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class TestCrawlCheckpoint(unittest.TestCase):
+
+    def test_frontier_transitions(self):
+        """Test discovery, partial listing and completion of folders"""
+        checkpoint = CrawlCheckpoint(None, 'run', 'root')
+        self.assertTrue(checkpoint.folder_discovered('root', 'root'))
+        self.assertTrue(checkpoint.folder_discovered('a', 'root/a'))
+        self.assertFalse(checkpoint.folder_discovered('a', 'root/other/a'))
+
+        checkpoint.page_listed('root', 'page-2')
+        self.assertEqual(checkpoint.pending_folders(), [('root', 'root', 'page-2'), ('a', 'root/a', None)])
+
+        checkpoint.page_listed('root', None)
+        self.assertEqual(checkpoint.done, {'root'})
+        self.assertFalse(checkpoint.folder_discovered('root', 'root'))
+        self.assertFalse(checkpoint.is_complete())
+        checkpoint.page_listed('a', None)
+        self.assertTrue(checkpoint.is_complete())
+
+    def test_flat_listing_completion(self):
+        """Test that a flat crawl is complete once its listing is exhausted"""
+        checkpoint = CrawlCheckpoint(None, 'run', 'root', discovery_mode='flat')
+        checkpoint.set_listing_token('p2')
+        self.assertFalse(checkpoint.is_complete())
+        checkpoint.set_listing_token(None)
+        self.assertTrue(checkpoint.is_complete())
+
+    def test_start_abandons_old_runs_and_saves_root(self):
+        """Test that a new run supersedes unfinished runs of the same root"""
+        conn = FakeConnection(results=[('run-2',)])
+        with patch('checkpoint.execute_values') as mock_values:
+            checkpoint = CrawlCheckpoint.start(conn, 'root', 'token-1', 'recursive')
+
+        self.assertEqual(checkpoint.run_id, 'run-2')
+        self.assertIn("SET status = 'abandoned'", conn.statements[0][0])
+        self.assertIn('INSERT INTO crawl_runs', conn.statements[1][0])
+        self.assertEqual(conn.statements[1][1], ('root', 'recursive', 'token-1'))
+        rows = mock_values.call_args.args[2]
+        self.assertEqual(rows, [('run-2', 'root', 'root', 'pending', None, 0)])
+
+    def test_save_writes_only_changes(self):
+        """Test that save() upserts folders changed since the last save"""
+        conn = FakeConnection()
+        checkpoint = CrawlCheckpoint(conn, 'run', 'root')
+        checkpoint.folder_discovered('root', 'root')
+        checkpoint.folder_discovered('a', 'root/a')
+        checkpoint.page_listed('root', None)
+
+        with patch('checkpoint.execute_values') as mock_values:
+            checkpoint.save()
+            rows = sorted(mock_values.call_args.args[2])
+            self.assertEqual(rows, [('run', 'a', 'root/a', 'pending', None, 1),
+                                    ('run', 'root', 'root', 'done', None, 0)])
+
+            mock_values.reset_mock()
+            checkpoint.save()
+            mock_values.assert_not_called()
+        self.assertEqual(conn.commits, 2)
+
+    def test_failed_save_is_retried(self):
+        """Test that progress from a failed save is written by the next one"""
+        conn = FakeConnection()
+        checkpoint = CrawlCheckpoint(conn, 'run', 'root')
+        checkpoint.folder_discovered('a', 'root/a')
+
+        with patch('checkpoint.execute_values', side_effect=Exception("DB down")):
+            checkpoint.save()
+        self.assertEqual(conn.rollbacks, 1)
+
+        with patch('checkpoint.execute_values') as mock_values:
+            checkpoint.save()
+        self.assertEqual(mock_values.call_args.args[2], [('run', 'a', 'root/a', 'pending', None, 0)])
+
+    def test_resume_loads_frontier_in_order(self):
+        """Test that resume() restores pending folders, page tokens and done folders"""
+        conn = FakeConnection(results=[
+            ('run-1', 'token-1', 'recursive', None),
+            [('root', 'root', 'done', None, 0), ('b', 'root/b', 'pending', 'p3', 2), ('a', 'root/a', 'pending', None, 1)],
+        ])
+
+        checkpoint = CrawlCheckpoint.resume(conn, 'root')
+
+        self.assertEqual(checkpoint.start_page_token, 'token-1')
+        self.assertEqual(checkpoint.done, {'root'})
+        self.assertEqual(checkpoint.pending_folders(), [('a', 'root/a', None), ('b', 'root/b', 'p3')])
+        self.assertTrue(checkpoint.folder_discovered('c', 'root/a/c'))
+        self.assertEqual(checkpoint.frontier['c'][2], 3)
+
+    def test_resume_without_unfinished_run(self):
+        """Test that resume() returns None when there is nothing to resume"""
+        self.assertIsNone(CrawlCheckpoint.resume(FakeConnection(results=[None]), 'root'))
+
+    def test_complete_clears_folder_rows(self):
+        """Test that completing a run marks it done and drops its folder rows"""
+        conn = FakeConnection()
+        CrawlCheckpoint(conn, 'run', 'root').complete()
+        self.assertIn("SET status = 'completed'", conn.statements[0][0])
+        self.assertIn('DELETE FROM crawl_folders', conn.statements[1][0])
+        self.assertEqual(conn.commits, 1)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,128 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+
+# Mock the required modules before importing
+sys.modules['psycopg2'] = MagicMock()
+sys.modules['psycopg2.extras'] = MagicMock()
+
+from dedupe import band_keys, detect_duplicates, jaccard, match_batch, merge_clusters, normalise_title, shingles
+
+
+def title_keys(title):
+    return band_keys(shingles(normalise_title(title)))
+
+
+class FakeTables:
+    """In-memory movies, movie_lsh_bands and movie_duplicates behind the statements match_batch runs."""
+
+    def __init__(self):
+        self.titles = {} # movie_id -> title
+        self.bands = set() # (movie_id, year, band_key)
+        self.duplicates = {} # movie_id -> (cluster_id, similarity)
+        self.result = []
+
+    def execute(self, sql, params):
+        ids = set(params[0])
+        if sql.startswith("DELETE FROM movie_lsh_bands"):
+            self.bands = {band for band in self.bands if band[0] not in ids}
+        elif sql.startswith("DELETE FROM movie_duplicates"):
+            self.duplicates = {k: v for k, v in self.duplicates.items() if k not in ids}
+        elif 'JOIN movie_lsh_bands o' in sql:
+            self.result = sorted({(n, o) for n, ny, nk in self.bands for o, oy, ok in self.bands
+                                  if n in ids and o != n and (ny, nk) == (oy, ok)})
+        elif 'FROM movies' in sql:
+            self.result = [(movie_id, self.titles[movie_id]) for movie_id in ids]
+        elif 'FROM movie_duplicates' in sql:
+            clusters = {self.duplicates[movie_id][0] for movie_id in ids if movie_id in self.duplicates}
+            self.result = [(movie_id, cluster_id, similarity)
+                           for movie_id, (cluster_id, similarity) in self.duplicates.items() if cluster_id in clusters]
+
+    def fetchall(self):
+        return self.result
+
+    def execute_values(self, cur, sql, rows, **kwargs):
+        if 'INSERT INTO movie_lsh_bands' in sql:
+            self.bands.update(rows)
+        else:
+            for movie_id, cluster_id, similarity in rows:
+                self.duplicates[movie_id] = (cluster_id, similarity)
+
+    def match(self, *movies):
+        for movie_id, title, _ in movies:
+            self.titles[movie_id] = title
+        with patch('dedupe.execute_values', side_effect=self.execute_values):
+            return match_batch(self, list(movies))
+
+    def clusters(self):
+        members = {}
+        for movie_id, (cluster_id, _) in self.duplicates.items():
+            members.setdefault(cluster_id, set()).add(movie_id)
+        return sorted(sorted(m) for m in members.values() if len(m) > 1)
+
+
+class TestDedupe(unittest.TestCase):
+
+    def test_titles_are_normalised(self):
+        """Test that articles, bracketed years, accents and punctuation are folded away"""
+        self.assertEqual(normalise_title('Dark Knight, The (2008)'), 'dark knight')
+        self.assertEqual(normalise_title('The Dark Knight'), 'dark knight')
+        self.assertEqual(normalise_title('Amélie [2001]'), 'amelie')
+        self.assertEqual(normalise_title('Fast & Furious: Tokyo Drift'), 'fast and furious tokyo drift')
+        self.assertEqual(normalise_title('!!!'), '')
+
+    def test_similar_titles_share_lsh_buckets(self):
+        """Test that near-duplicates collide in LSH bands and unrelated titles do not"""
+        same = sum(a == b for a, b in zip(title_keys('The Dark Knight'), title_keys('Dark Knight, The (2008)')))
+        close = sum(a == b for a, b in zip(title_keys('Star Wars: Episode IV'), title_keys('Star Wars Episode 4')))
+        unrelated = sum(a == b for a, b in zip(title_keys('The Dark Knight'), title_keys('Pulp Fiction')))
+        self.assertEqual(same, 16)
+        self.assertGreater(close, 0)
+        self.assertEqual(unrelated, 0)
+        self.assertLess(jaccard(shingles('dark knight'), shingles('dark knight rises')), 0.7)
+
+    def test_merge_joins_existing_clusters(self):
+        """Test that a bridging pair merges two clusters under the smallest movie ID"""
+        memberships = {'b': ('b', 0.9), 'c': ('b', 0.9), 'a': ('a', 1.0), 'd': ('a', 1.0)}
+        updates = merge_clusters([('c', 'e', 0.8), ('d', 'e', 0.75)], memberships)
+        self.assertEqual(updates, {'b': ('a', 0.9), 'c': ('a', 0.9), 'e': ('a', 0.8)})
+        self.assertEqual(merge_clusters([], memberships), {})
+
+    def test_batches_match_incrementally_within_year_blocks(self):
+        """Test that later batches join earlier clusters and other years stay apart"""
+        tables = FakeTables()
+        self.assertEqual(tables.match(('1', 'The Dark Knight', 2008), ('2', 'Heat', 1995)), 0)
+        written = tables.match(('3', 'Dark Knight, The (2008)', 2008), ('4', 'The Dark Knight', 2012),
+                               ('5', 'Dark Knight', 2008), ('6', 'The Dark Knight Rises', 2008))
+        self.assertEqual(written, 3)
+        self.assertEqual(tables.clusters(), [['1', '3', '5']])
+        self.assertEqual(tables.duplicates['5'], ('1', 1.0))
+
+        # A retitled movie leaves its cluster; the remaining pair stays together
+        tables.match(('3', 'Collateral', 2008))
+        self.assertEqual(tables.clusters(), [['1', '5']])
+        self.assertFalse(any(band[0] == '3' and band[2] in title_keys('Dark Knight') for band in tables.bands))
+
+
+    def test_queued_movies_are_matched_and_dequeued_in_batches(self):
+        """Test that detect_duplicates reads movie_pending, dequeues what it read and commits each batch"""
+        queued = [(f'{i:08d}-0000-0000-0000-000000000000', f'2024-01-01T00:00:0{i}+00:00', f'Movie {i}', 2000)
+                  for i in range(3)]
+        conn = MagicMock()
+        cur = conn.cursor.return_value.__enter__.return_value
+        cur.fetchall.side_effect = lambda: [row for row in queued
+                                            if cur.execute.call_args.args[1][0] is None
+                                            or row[0] > cur.execute.call_args.args[1][0]][:2]
+        with patch('dedupe.match_batch', return_value=1) as match, patch('dedupe.execute_values') as execute_values:
+            matched, written = detect_duplicates(conn, batch_size=2)
+
+        self.assertEqual((matched, written), (3, 2))
+        self.assertEqual([m for call in match.call_args_list for m in call.args[1]],
+                         [(movie_id, title, year) for movie_id, _, title, year in queued])
+        self.assertIn("p.stage = 'dedupe'", cur.execute.call_args.args[0])
+        dequeued = [values for call in execute_values.call_args_list for values in call.args[2]]
+        self.assertEqual(dequeued, [row[:2] for row in queued])
+        self.assertEqual(conn.commit.call_count, 3) # Two batches, then the read that found the queue empty
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
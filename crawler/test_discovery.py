@@ -0,0 +1,130 @@
+import re
+import unittest
+
+from discovery import (
+    FlatDiscovery, choose_discovery, probe_folder_count, FLAT_DISCOVERY_MIN_FOLDERS, FOLDER_MIME_TYPE,
+    FOLDER_QUERY, PROBE_PARENTS_PER_QUERY
+)
+
+
+def folder(folder_id, parent):
+    return {'id': folder_id, 'name': folder_id, 'mimeType': FOLDER_MIME_TYPE, 'parents': [parent]}
+
+
+def json_file(file_id, *parents):
+    return {'id': file_id, 'name': f'{file_id}.json', 'mimeType': 'application/json', 'parents': list(parents)}
+
+
+class FakeCrawler:
+    """Serves account-wide folder listings, optionally filtered by parents, in pages."""
+
+    def __init__(self, folders, page_size=1000):
+        self.folders = folders
+        self.page_size = page_size
+        self.calls = []
+
+    def list_all_files(self, query, page_token=None, http=None):
+        self.calls.append(query)
+        parents = set(re.findall(r"'([^']+)' in parents", query))
+        folders = [f for f in self.folders if not parents or parents & set(f['parents'])]
+        start = int(page_token or 0)
+        page = {'files': folders[start:start + self.page_size]}
+        if start + self.page_size < len(folders):
+            page['nextPageToken'] = str(start + self.page_size)
+        return page
+
+
+class TestFlatDiscovery(unittest.TestCase):
+
+    def setUp(self):
+        self.discovery = FlatDiscovery('root')
+        self.discovery.add_folders([
+            folder('a', 'root'),
+            folder('b', 'a'),
+            folder('other', 'elsewhere'),
+            folder('c', 'other'),
+        ])
+
+    def test_selects_only_files_under_root(self):
+        """Test that files are kept only when their ancestors reach the root"""
+        items = [
+            json_file('in_root', 'root'),
+            json_file('nested', 'b'),
+            json_file('outside', 'c'),
+            {'id': 'txt', 'name': 'notes.txt', 'mimeType': 'text/plain', 'parents': ['root']},
+        ]
+
+        selected = [item['id'] for item in self.discovery.select_files(items)]
+
+        self.assertEqual(selected, ['in_root', 'nested'])
+
+    def test_any_parent_under_root_is_enough(self):
+        """Test files with several parents"""
+        self.assertTrue(self.discovery.is_under_root(['c', 'b']))
+        self.assertFalse(self.discovery.is_under_root(['c', 'unknown']))
+
+    def test_counts_folders_under_root(self):
+        """Test the folder-count estimate ignores unrelated folders"""
+        self.assertEqual(self.discovery.count_folders_under_root(), 2)
+
+    def test_deep_chain_and_cycles(self):
+        """Test that deep ancestry and parent cycles are resolved iteratively"""
+        discovery = FlatDiscovery('root')
+        discovery.add_folders([folder('d0', 'root')] + [folder(f'd{i}', f'd{i - 1}') for i in range(1, 5000)])
+        discovery.add_folders([folder('x', 'y'), folder('y', 'x')])
+
+        self.assertTrue(discovery.folder_under_root('d4999'))
+        self.assertFalse(discovery.folder_under_root('x'))
+
+
+class TestChooseDiscovery(unittest.TestCase):
+
+    def test_recursive_mode_makes_no_calls(self):
+        """Test that forcing recursive discovery skips the estimate"""
+        crawler = FakeCrawler([])
+        self.assertEqual(choose_discovery(crawler, 'root', 'recursive'), ('recursive', None))
+        self.assertEqual(crawler.calls, [])
+
+    def test_auto_picks_recursive_for_narrow_trees(self):
+        """Test that small trees keep per-folder listing without listing the whole account"""
+        unrelated = [folder(f'x{i}', 'elsewhere') for i in range(5000)]
+        crawler = FakeCrawler([folder('a', 'root'), folder('b', 'a')] + unrelated)
+
+        mode, discovery = choose_discovery(crawler, 'root', 'auto')
+
+        self.assertEqual(mode, 'recursive')
+        self.assertIsNone(discovery)
+        self.assertEqual(len(crawler.calls), 3)
+        self.assertNotIn(FOLDER_QUERY, crawler.calls)
+
+    def test_auto_picks_flat_for_wide_trees(self):
+        """Test that wide trees use flat discovery with a complete folder map"""
+        folders = [folder(f'f{i}', 'root') for i in range(FLAT_DISCOVERY_MIN_FOLDERS)]
+        crawler = FakeCrawler(folders, page_size=50)
+
+        mode, discovery = choose_discovery(crawler, 'root', 'auto')
+
+        self.assertEqual(mode, 'flat')
+        self.assertEqual(len(discovery.folder_parents), FLAT_DISCOVERY_MIN_FOLDERS)
+        listing_calls = FLAT_DISCOVERY_MIN_FOLDERS // 50
+        self.assertEqual(crawler.calls.count(FOLDER_QUERY), listing_calls)
+        self.assertEqual(len(crawler.calls), 2 * listing_calls)
+
+    def test_probe_stops_at_the_limit(self):
+        """Test that the probe batches parents per level and stops counting at the limit"""
+        level1 = [folder(f'a{i}', 'root') for i in range(PROBE_PARENTS_PER_QUERY + 1)]
+        level2 = [folder(f'b{i}', f'a{i}') for i in range(len(level1))]
+        crawler = FakeCrawler(level1 + level2)
+
+        self.assertEqual(probe_folder_count(crawler, 'root', limit=10_000), (len(level1) * 2, 5))
+        crawler.calls = []
+        self.assertEqual(probe_folder_count(crawler, 'root', limit=10), (10, 1))
+
+    def test_unknown_mode(self):
+        """Test that an unknown mode is rejected"""
+        with self.assertRaises(ValueError):
+            choose_discovery(FakeCrawler([]), 'root', 'sideways')
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,106 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+
+# Mock the required modules before importing
+sys.modules['psycopg2'] = MagicMock()
+sys.modules['psycopg2.extras'] = MagicMock()
+
+from embeddings import embed_movie, embed_pending, embed_text, metadata_text, vector_literal, EMBEDDING_DIM
+from metrics import CrawlMetrics
+
+
+def cosine(a, b):
+    return sum(x * y for x, y in zip(a, b))
+
+
+class FakeCursor:
+    """Serves the movie_pending SELECT from a list; writes go through the patched execute_values."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params):
+        last_id, _, limit = params
+        pending = [m for m in self.conn.movies if last_id is None or m[0] > last_id]
+        self.result = pending[:limit]
+
+    def fetchall(self):
+        return self.result
+
+
+class FakeConnection:
+    def __init__(self, movies):
+        self.movies = movies
+        self.commits = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+
+class TestEmbeddings(unittest.TestCase):
+
+    def test_fixed_size_unit_vectors(self):
+        """Test that embeddings have EMBEDDING_DIM dimensions and unit length"""
+        vector = embed_movie('The Dark River', 'Drama', {'plot': 'A long night on the river.'})
+        self.assertEqual(len(vector), EMBEDDING_DIM)
+        self.assertAlmostEqual(cosine(vector, vector), 1.0)
+        self.assertEqual(embed_movie('', '', None), [0.0] * EMBEDDING_DIM)
+
+    def test_stable_across_processes(self):
+        """Test the hashing against values the API's query embedding must reproduce"""
+        vector = embed_text('Dark city')
+        self.assertEqual(vector, embed_text('dark  CITY!'))
+        self.assertEqual({i: round(v, 4) for i, v in enumerate(vector) if v}, {13: -0.5774, 29: 0.5774, 53: -0.5774})
+        self.assertEqual(vector_literal(vector)[:20], '[0,0,0,0,0,0,0,0,0,0')
+
+    def test_similar_movies_are_closer(self):
+        """Test that shared title, genre and plot words raise cosine similarity"""
+        heist = embed_movie('The Bank Job', 'Crime', {'plot': 'A crew plans a bank heist in London.'})
+        sequel = embed_movie('The Bank Job 2', 'Crime', {'plot': 'The crew returns for one last heist.'})
+        romance = embed_movie('Summer in Paris', 'Romance', {'plot': 'Two strangers fall in love.'})
+        self.assertGreater(cosine(heist, sequel), cosine(heist, romance))
+        self.assertGreater(cosine(embed_text('bank heist'), heist), cosine(embed_text('bank heist'), romance))
+
+    def test_metadata_text_skips_core_fields(self):
+        """Test that nested strings are collected and columns already embedded are not"""
+        metadata = {'title': 'T', 'genre': 'G', 'year': 2001, 'director': 'Jane Doe',
+                    'cast': ['Ann', {'name': 'Bob'}], 'imdb_id': 'tt0000001'}
+        self.assertEqual(metadata_text(metadata), 'Jane Doe Ann Bob')
+
+    def test_pending_movies_are_embedded_in_batches(self):
+        """Test that every queued movie is embedded, dequeued and each batch committed"""
+        movies = [(f'{i:08d}-0000-0000-0000-000000000000', f'2024-01-01T00:00:0{i}+00:00',
+                   f'Movie {i}', 'Drama', {}, f'hash{i}')
+                  for i in range(5)]
+        conn = FakeConnection(movies)
+        metrics = CrawlMetrics({})
+        with patch('embeddings.execute_values') as execute_values:
+            embedded = embed_pending(conn, batch_size=2, metrics=metrics)
+
+        self.assertEqual(embedded, 5)
+        self.assertEqual(conn.commits, 4) # Three batches, then the read that found the queue empty
+        calls = execute_values.call_args_list
+        upserts = [c for c in calls if 'INSERT INTO movie_embeddings' in c.args[1]]
+        dequeued = [c for c in calls if 'DELETE FROM movie_pending' in c.args[1]]
+        self.assertEqual(len(upserts), 3)
+        updated = [values for call in upserts for values in call.args[2]]
+        self.assertEqual([v[0] for v in updated], [m[0] for m in movies])
+        self.assertEqual(updated[4][2], 'hash4')
+        self.assertTrue(updated[0][1].startswith('['))
+        # Only the queue entries that were read are removed; a renewed one stays queued
+        self.assertEqual([values for call in dequeued for values in call.args[2]], [m[:2] for m in movies])
+        self.assertEqual(metrics.histograms['embed'].count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
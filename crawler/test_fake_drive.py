@@ -0,0 +1,148 @@
+import hashlib
+import json
+import ssl
+import unittest
+from urllib.parse import urlencode
+
+from discovery import FOLDER_MIME_TYPE, FOLDER_QUERY, JSON_FILE_QUERY
+from fake_drive import FakeDrive, QueryError, ROOT_FOLDER_ID, parse_query
+
+BASE = 'https://www.googleapis.com/drive/v3/'
+
+
+def get(drive, path, headers=None, **params):
+    status, response_headers, body = drive.handle(BASE + path + '?' + urlencode(params), headers=headers)
+    if response_headers['content-type'].startswith('application/json; charset'):
+        body = json.loads(body)
+    return status, response_headers, body
+
+
+def list_all(drive, query, page_size=1000):
+    items, token = [], None
+    while True:
+        params = {'q': query, 'pageSize': page_size}
+        if token:
+            params['pageToken'] = token
+        _, _, page = get(drive, 'files', **params)
+        items.extend(page['files'])
+        token = page.get('nextPageToken')
+        if not token:
+            return items
+
+
+class TestParseQuery(unittest.TestCase):
+    """Test the q= subset understood by the fake."""
+
+    def test_crawler_queries(self):
+        json_file = {'name': 'a.json', 'mimeType': 'application/json', 'trashed': False, 'parents': ['p']}
+        folder = {'name': 'f', 'mimeType': FOLDER_MIME_TYPE, 'trashed': False, 'parents': ['p']}
+        self.assertTrue(parse_query(JSON_FILE_QUERY)(json_file))
+        self.assertFalse(parse_query(JSON_FILE_QUERY)(folder))
+        self.assertTrue(parse_query(FOLDER_QUERY)(folder))
+        self.assertTrue(parse_query("'p' in parents and trashed = false")(folder))
+        self.assertFalse(parse_query("'q' in parents and trashed = false")(folder))
+        self.assertFalse(parse_query("not trashed = false")(folder))
+
+    def test_rejects_unknown_syntax(self):
+        with self.assertRaises(QueryError):
+            parse_query("modifiedTime > '2024-01-01'")
+
+
+class TestFakeDrive(unittest.TestCase):
+    """Test the endpoints the crawler relies on."""
+
+    def setUp(self):
+        self.drive = FakeDrive(num_files=120, num_folders=15, non_json_files=5, max_page_size=25)
+
+    def test_folder_walk_finds_every_json_file(self):
+        found = []
+        folders = [ROOT_FOLDER_ID]
+        while folders:
+            parent = folders.pop()
+            for item in list_all(self.drive, f"'{parent}' in parents and trashed = false"):
+                if item['mimeType'] == FOLDER_MIME_TYPE:
+                    folders.append(item['id'])
+                elif item['name'].endswith('.json'):
+                    found.append(item['id'])
+        self.assertEqual(sorted(found), self.drive.json_file_ids())
+        self.assertEqual(len(found), 120)
+
+    def test_page_size_is_capped(self):
+        _, _, page = get(self.drive, 'files', q=JSON_FILE_QUERY, pageSize=1000)
+        self.assertEqual(len(page['files']), 25)
+        self.assertEqual(page['nextPageToken'], '25')
+        self.assertEqual(len(list_all(self.drive, JSON_FILE_QUERY)), 120)
+
+    def test_media_download_matches_checksum(self):
+        _, _, metadata = get(self.drive, 'files/fake-file-7')
+        status, headers, content = get(self.drive, 'files/fake-file-7', alt='media')
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(content)['title'].split()[-1], '7')
+        self.assertEqual(hashlib.md5(content).hexdigest(), metadata['md5Checksum'])
+
+        status, headers, chunk = get(self.drive, 'files/fake-file-7', headers={'range': 'bytes=0-9'}, alt='media')
+        self.assertEqual(status, 206)
+        self.assertEqual(chunk, content[:10])
+        self.assertEqual(headers['content-range'], f'bytes 0-9/{len(content)}')
+
+    def test_changes_feed(self):
+        _, _, start = get(self.drive, 'changes/startPageToken')
+        self.drive.update_file('fake-file-1')
+        self.drive.update_file('fake-file-1')
+        self.drive.trash_file('fake-file-2')
+        self.drive.delete_file('fake-file-3')
+
+        _, _, page = get(self.drive, 'changes', pageToken=start['startPageToken'])
+        self.assertEqual([c['fileId'] for c in page['changes']],
+                         ['fake-file-1', 'fake-file-1', 'fake-file-2', 'fake-file-3'])
+        self.assertTrue(page['changes'][2]['file']['trashed'])
+        self.assertTrue(page['changes'][3]['removed'])
+        self.assertNotIn('file', page['changes'][3])
+        self.assertEqual(page['newStartPageToken'], '4')
+
+        _, _, page = get(self.drive, 'changes', pageToken='4')
+        self.assertEqual(page['changes'], [])
+
+    def test_call_counters(self):
+        get(self.drive, 'files', q=JSON_FILE_QUERY)
+        get(self.drive, 'files/fake-file-1', alt='media')
+        get(self.drive, 'about')
+        self.assertEqual(self.drive.calls['files.list'], 1)
+        self.assertEqual(self.drive.calls['files.get_media'], 1)
+        self.assertEqual(self.drive.total_calls(), 3)
+
+
+class TestErrorInjection(unittest.TestCase):
+    """Test injected transport and quota failures."""
+
+    def test_ssl_errors(self):
+        drive = FakeDrive(num_files=3, ssl_error_rate=1.0)
+        with self.assertRaises(ssl.SSLError):
+            drive.handle(BASE + 'files/fake-file-0?alt=media')
+        self.assertEqual(drive.calls['errors.ssl'], 1)
+
+    def test_rate_limit_responses(self):
+        drive = FakeDrive(num_files=3, rate_limit_rate=1.0, retry_after=7)
+        status, headers, body = get(drive, 'files', q=JSON_FILE_QUERY)
+        self.assertEqual(status, 429)
+        self.assertEqual(headers['retry-after'], '7')
+        self.assertEqual(body['error']['errors'][0]['reason'], 'rateLimitExceeded')
+
+        drive = FakeDrive(num_files=3, forbidden_rate=1.0)
+        status, headers, body = get(drive, 'files', q=JSON_FILE_QUERY)
+        self.assertEqual(status, 403)
+        self.assertNotIn('retry-after', headers)
+        self.assertEqual(body['error']['errors'][0]['reason'], 'rateLimitExceeded')
+
+    def test_error_rates_are_seeded(self):
+        def outcomes():
+            drive = FakeDrive(num_files=3, rate_limit_rate=0.3, seed=5)
+            return [get(drive, 'about')[0] for _ in range(50)]
+        first = outcomes()
+        self.assertEqual(first, outcomes())
+        self.assertIn(429, first)
+        self.assertIn(200, first)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from local_ingest import ingest_directory, local_file_id, parse_local_file, walk_movie_files
+from metrics import CrawlMetrics
+
+
+def movie(i):
+    return {'title': f'Movie {i}', 'year': 2000 + i, 'rating': 7.5, 'genre': 'Drama'}
+
+
+class FakeCrawler:
+    """Minimal stand-in for GoogleDriveCrawler used by the local ingest."""
+
+    def __init__(self, known=None):
+        self.known = known or {} # drive_file_id -> stored modifiedTime
+        self.rows = []
+        self.prunes = {} # File ID -> drive_file_ids kept
+        self.stats = {'files_processed': 0, 'files_skipped': 0, 'records_processed': 0,
+                      'record_errors': 0, 'errors': 0}
+        self.metrics = CrawlMetrics(self.stats)
+
+    def count(self, key, amount=1):
+        self.stats[key] += amount
+
+    def should_process(self, file_info):
+        if self.known.get(file_info['id']) == file_info['modifiedTime']:
+            self.stats['files_skipped'] += 1
+            return False
+        return True
+
+    def queue_row(self, row, size):
+        self.stats['records_processed'] += 1
+        self.rows.append(row)
+
+    def prune_file(self, file_id, keep):
+        self.prunes[file_id] = keep
+
+
+class TestLocalIngest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.write('one.json', json.dumps(movie(1)))
+        self.write('nested/many.jsonl', '\n'.join([json.dumps(movie(2)), '{"title": ', json.dumps(movie(3))]))
+        self.write('nested/deeper/array.json', json.dumps([movie(i) for i in range(4, 40)]))
+        self.write('nested/notes.txt', 'ignored')
+        self.write('broken.json', '{"title": "no year"}')
+
+    def write(self, relpath, text):
+        path = os.path.join(self.root, relpath)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def test_walk_finds_movie_files(self):
+        """Test that the walk recurses and only yields movie files"""
+        relpaths = sorted(relpath for _, relpath, _, _ in walk_movie_files(self.root))
+        self.assertEqual(relpaths, ['broken.json', 'nested/deeper/array.json', 'nested/many.jsonl', 'one.json'])
+
+    def test_rows_are_sent_in_bounded_chunks(self):
+        """Test that a file is read through mmap and its rows leave the worker a chunk at a time"""
+        path = os.path.join(self.root, 'nested/deeper/array.json')
+        sent = []
+        with patch('local_ingest.BULK_MAX_BATCH_ROWS', 10), patch('record_stream.READ_CHUNK_CHARS', 100):
+            parse_local_file((path, 'nested/deeper/array.json', os.path.getsize(path),
+                              '2024-01-01T00:00:00+00:00'), sent.append)
+
+        chunks = [rows for kind, _, rows in sent[:-1]]
+        self.assertEqual([len(rows) for rows in chunks], [10, 10, 10, 6])
+        self.assertEqual(sent[-1][:5], ('done', 'nested/deeper/array.json', 0, [], None))
+        row, _ = chunks[0][0]
+        self.assertEqual(row[0], 'local:nested/deeper/array.json#1')
+        self.assertEqual(row[1:5], ('Movie 4', 2004, 7.5, 'Drama'))
+
+    def test_failed_file_sends_only_its_error(self):
+        """Test that a file that fails as a whole, or is empty, sends no rows"""
+        for relpath in ('broken.json', 'empty.json'):
+            self.write(relpath, '' if relpath == 'empty.json' else '{"title": "no year"}')
+            sent = []
+            parse_local_file((os.path.join(self.root, relpath), relpath, 0, None), sent.append)
+
+            self.assertEqual(len(sent), 1)
+            self.assertEqual(sent[0][0], 'done')
+            self.assertIsNotNone(sent[0][4])
+
+    def test_ingest_across_processes(self):
+        """Test rows, bad records and failed files from a real process pool"""
+        crawler = FakeCrawler()
+        ingest_directory(crawler, self.root, processes=2, chunksize=1, window=2)
+
+        ids = sorted(row[0] for row in crawler.rows)
+        self.assertEqual(len(ids), 39)
+        self.assertIn('local:one.json', ids)
+        self.assertIn('local:nested/many.jsonl#3', ids)
+        self.assertEqual(crawler.stats['files_processed'], 3)
+        self.assertEqual(crawler.stats['record_errors'], 1)
+        self.assertEqual(crawler.stats['errors'], 1) # broken.json
+        self.assertEqual(crawler.prunes['local:nested/many.jsonl'],
+                         ['local:nested/many.jsonl#1', 'local:nested/many.jsonl#3'])
+        self.assertNotIn('local:broken.json', crawler.prunes)
+        self.assertEqual(json.loads(next(row[5] for row in crawler.rows if row[0] == 'local:one.json')), movie(1))
+
+    def test_unchanged_files_are_skipped(self):
+        """Test that files whose modification time is stored are not parsed again"""
+        known = {local_file_id(relpath): modified for _, relpath, _, modified in walk_movie_files(self.root)
+                 if relpath != 'one.json'}
+        crawler = FakeCrawler(known)
+        ingest_directory(crawler, self.root, processes=1)
+
+        self.assertEqual([row[0] for row in crawler.rows], ['local:one.json'])
+        self.assertEqual(crawler.stats['files_skipped'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,108 @@
+import os
+import pstats
+import shutil
+import tempfile
+import threading
+import unittest
+import urllib.request
+from unittest.mock import patch
+
+from metrics import profiled, CrawlMetrics, Histogram, MetricsExporter, METRICS_HOST
+
+
+def busy_thread_work():
+    return sum(i * i for i in range(20000))
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_histogram_buckets_and_quantiles(self):
+        """Test cumulative bucket counts and bucket-bound quantiles"""
+        histogram = Histogram(buckets=(0.1, 1.0))
+        for seconds in (0.05, 0.05, 0.5, 3.0):
+            histogram.observe(seconds)
+
+        cumulative, total, count = histogram.snapshot()
+        self.assertEqual(cumulative, [2, 3, 4])
+        self.assertAlmostEqual(total, 3.6)
+        self.assertEqual(count, 4)
+        self.assertEqual(histogram.quantile(0.5), 0.1)
+        self.assertEqual(histogram.quantile(0.75), 1.0)
+        self.assertEqual(histogram.quantile(1.0), float('inf'))
+        self.assertIsNone(Histogram().quantile(0.5))
+
+    def test_prometheus_text_format(self):
+        """Test that stage histograms, stats counters and gauges are rendered"""
+        stats = {'files_processed': 3, 'errors': 1}
+        metrics = CrawlMetrics(stats)
+        metrics.gauge('writer_queue_depth', "Rows waiting.", lambda: 7)
+        metrics.observe('download', 0.2)
+        with metrics.timed('parse'):
+            pass
+        text = metrics.render()
+
+        self.assertIn('crawler_stage_seconds_bucket{stage="download",le="0.25"} 1', text)
+        self.assertIn('crawler_stage_seconds_bucket{stage="download",le="+Inf"} 1', text)
+        self.assertIn('crawler_stage_seconds_count{stage="parse"} 1', text)
+        self.assertIn('crawler_stage_seconds_count{stage="db_commit"} 0', text)
+        self.assertIn('crawler_files_processed_total 3', text)
+        self.assertIn('crawler_writer_queue_depth 7', text)
+        self.assertIn('download 1×', metrics.summary())
+
+    def test_endpoint_and_textfile(self):
+        """Test the live /metrics endpoint and the textfile written at stop"""
+        stats = {'files_processed': 0}
+        path = os.path.join(self.directory, 'crawler.prom')
+        exporter = MetricsExporter(CrawlMetrics(stats), port=0, path=path, interval=60)
+        exporter.start()
+        try:
+            stats['files_processed'] = 5
+            self.assertEqual(exporter.server.server_address[0], METRICS_HOST)
+            url = f"http://127.0.0.1:{exporter.server.server_address[1]}/metrics"
+            with urllib.request.urlopen(url, timeout=5) as response:
+                self.assertIn('text/plain', response.headers['Content-Type'])
+                self.assertIn('crawler_files_processed_total 5', response.read().decode())
+        finally:
+            stats['files_processed'] = 6
+            exporter.stop()
+
+        with open(path) as f:
+            self.assertIn('crawler_files_processed_total 6', f.read())
+        self.assertEqual(os.listdir(self.directory), ['crawler.prom'])
+
+    def test_profile_includes_worker_threads(self):
+        """Test that --profile dumps pstats covering threads started while profiling"""
+        path = os.path.join(self.directory, 'crawl.prof')
+        with profiled(path):
+            thread = threading.Thread(target=busy_thread_work)
+            thread.start()
+            thread.join()
+
+        functions = {name for _, _, name in pstats.Stats(path).stats}
+        self.assertIn('busy_thread_work', functions)
+
+        with profiled(None):
+            pass
+
+    def test_profile_with_a_single_profiler(self):
+        """Test the single-profiler path used from Python 3.12, and a profiler that cannot start"""
+        path = os.path.join(self.directory, 'crawl.prof')
+        with patch('metrics.PER_THREAD_PROFILES', False):
+            with profiled(path):
+                busy_thread_work()
+        self.assertIn('busy_thread_work', {name for _, _, name in pstats.Stats(path).stats})
+
+        os.remove(path)
+        with patch('metrics.cProfile.Profile.enable', side_effect=ValueError("Another profiling tool is already active")):
+            with profiled(path):
+                ran = True
+        self.assertTrue(ran)
+        self.assertFalse(os.path.exists(path))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,86 @@
+import unittest
+from unittest.mock import MagicMock
+from decimal import Decimal
+import sys
+
+# Mock the required modules before importing
+sys.modules['psycopg2'] = MagicMock()
+sys.modules['psycopg2.extras'] = MagicMock()
+
+from movie_stats import check_stats, verify_stats
+
+
+def aggregates(movies):
+    """GROUPING SETS ((), (genre), (year)) over (genre, year, rating) movies, as PostgreSQL returns it."""
+    groups = {(3, None, None): []}
+    for genre, year, rating in movies:
+        groups[3, None, None].append(rating)
+        groups.setdefault((1, genre, None), []).append(rating)
+        groups.setdefault((2, None, year), []).append(rating)
+    return [(*key, len(ratings), sum(r is not None for r in ratings), sum(r for r in ratings if r is not None))
+            for key, ratings in groups.items()]
+
+
+class FakeStatsConnection:
+    """Answers the checker's two queries from a movies list and stored aggregate rows."""
+
+    def __init__(self, movies, stored):
+        self.movies = movies
+        self.stored = stored
+        self.statements = []
+        self.commits = 0
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.statements.append(sql.strip())
+        if 'rebuild_movie_stats' in sql:
+            self.stored = [row for row in aggregates(self.movies) if row[0] == 3 or row[1:3] != (None, None)]
+        self.result = aggregates(self.movies) if 'GROUPING SETS' in sql else self.stored
+
+    def fetchall(self):
+        return self.result
+
+    def commit(self):
+        self.commits += 1
+
+
+class TestMovieStats(unittest.TestCase):
+
+    movies = [('Drama', 1994, Decimal('9.3')), ('Drama', 1994, Decimal('8.8')),
+              ('Crime', 1994, None), (None, None, Decimal('7.0'))]
+
+    def test_matching_stats_report_nothing(self):
+        """Test that stored aggregates equal to movies pass, ignoring the NULL genre and year groups"""
+        conn = FakeStatsConnection(self.movies, [])
+        conn.execute('SELECT rebuild_movie_stats()')
+        conn.statements = []
+        self.assertEqual(check_stats(conn), [])
+        self.assertEqual(conn.statements[0], 'SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+        self.assertEqual(verify_stats(conn), 0)
+        self.assertNotIn('SELECT rebuild_movie_stats()', conn.statements)
+
+    def test_drift_is_reported_and_rebuilt(self):
+        """Test that wrong, missing and stale aggregates are found and fixed by a rebuild"""
+        stored = [(3, None, None, 3, 2, Decimal('18.1')), (1, 'Drama', None, 2, 2, Decimal('18.1')),
+                  (1, 'Horror', None, 1, 0, Decimal('0')), (2, None, 1994, 3, 2, Decimal('18.1'))]
+        conn = FakeStatsConnection(self.movies, stored)
+        self.assertEqual(check_stats(conn), [
+            ('genre', 'Crime', None, (1, 0, 0)),
+            ('genre', 'Horror', (1, 0, Decimal('0')), None),
+            ('total', None, (3, 2, Decimal('18.1')), (4, 3, Decimal('25.1'))),
+        ])
+        self.assertEqual(verify_stats(conn), 3)
+        self.assertIn('SELECT rebuild_movie_stats()', conn.statements)
+        self.assertEqual(check_stats(conn), [])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
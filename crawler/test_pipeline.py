@@ -0,0 +1,253 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import threading
+import time
+
+# Mock the required modules before importing
+sys.modules['psycopg2'] = MagicMock()
+sys.modules['psycopg2.extras'] = MagicMock()
+
+from pipeline import BatchWriter
+
+
+class FakeConnection:
+    def __init__(self):
+        self.commits = 0
+        self.rollbacks = 0
+        self.closed = False
+
+    def cursor(self):
+        return MagicMock()
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+def new_stats():
+    return {'db_batches_committed': 0, 'db_batches_failed': 0, 'db_batches_salvaged': 0,
+            'rows_written': 0, 'rows_dead_lettered': 0, 'rows_pruned': 0, 'errors': 0}
+
+
+def row(file_id):
+    return (file_id, 'Title', 2000, 7.0, 'Drama', {}, None, None, 'hash')
+
+
+class TestBatchWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.batches = []
+        self.write_delay = 0.0
+
+        def fake_upsert(cur, rows, **kwargs):
+            time.sleep(self.write_delay)
+            self.batches.append([r[0] for r in rows])
+            return len(rows)
+
+        patcher = patch('pipeline.copy_upsert', side_effect=fake_upsert)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.conn = FakeConnection()
+
+    def test_flushes_on_batch_size(self):
+        """Test that full batches are written and the rest is flushed on stop"""
+        stats = new_stats()
+        writer = BatchWriter(lambda: self.conn, stats, max_rows=3, flush_interval=60)
+        writer.start()
+        for i in range(7):
+            writer.put(row(f'id{i}'))
+        writer.stop()
+
+        self.assertEqual([len(b) for b in self.batches], [3, 3, 1])
+        self.assertEqual(stats['rows_written'], 7)
+        self.assertEqual(stats['db_batches_committed'], 3)
+        self.assertTrue(self.conn.closed)
+
+    def test_flushes_on_time(self):
+        """Test that a partial batch is written once the flush interval passes"""
+        writer = BatchWriter(lambda: self.conn, new_stats(), max_rows=100, flush_interval=0.05)
+        writer.start()
+        writer.put(row('id1'))
+        time.sleep(0.3)
+
+        self.assertEqual(self.batches, [['id1']])
+        writer.stop()
+
+    def test_flush_waits_for_commit(self):
+        """Test that flush() returns only after queued rows are committed"""
+        self.write_delay = 0.05
+        writer = BatchWriter(lambda: self.conn, new_stats(), max_rows=100, flush_interval=60)
+        writer.start()
+        writer.put(row('id1'))
+        writer.flush()
+
+        self.assertEqual(self.batches, [['id1']])
+        self.assertEqual(self.conn.commits, 1)
+        writer.stop()
+
+    def test_backpressure_blocks_producers(self):
+        """Test that producers wait when the writer falls behind"""
+        self.write_delay = 0.05
+        writer = BatchWriter(lambda: self.conn, new_stats(), max_rows=1, queue_size=2, flush_interval=60)
+        writer.start()
+        for i in range(10):
+            writer.put(row(f'id{i}'))
+        writer.stop()
+
+        self.assertEqual(sum(len(b) for b in self.batches), 10)
+        self.assertGreater(writer.occupancy['producer_wait_seconds'], 0)
+        self.assertLessEqual(writer.occupancy['queue_max_depth'], 2)
+        self.assertIn('downloads blocked', writer.summary())
+
+    def test_failed_batch_is_rolled_back_and_counted(self):
+        """Test error handling for a batch that cannot be written"""
+        stats = new_stats()
+        with patch('pipeline.copy_upsert', side_effect=Exception("DB down")):
+            writer = BatchWriter(lambda: self.conn, stats, max_rows=2, flush_interval=60)
+            writer.start()
+            writer.put(row('id1'))
+            writer.put(row('id2'))
+            writer.stop()
+
+        self.assertEqual(stats['errors'], 2)
+        self.assertEqual(stats['db_batches_failed'], 1)
+        self.assertEqual(stats['rows_dead_lettered'], 0) # Every row failing points at the database
+        self.assertEqual(self.conn.rollbacks, 2) # The batch, then the abandoned salvage
+        self.assertEqual(self.conn.commits, 0)
+
+    def test_bad_rows_are_isolated_and_dead_lettered(self):
+        """Test that a failed batch keeps its good rows and dead-letters only the bad ones"""
+        stats = new_stats()
+        attempts = []
+        dead_letters = []
+
+        def fussy_upsert(cur, rows, **kwargs):
+            attempts.append(len(rows))
+            if any(r[0] in ('id3', 'id6') for r in rows):
+                raise Exception(f"value too long for {rows[0][0]}")
+            self.batches.append([r[0] for r in rows])
+            return len(rows)
+
+        with patch('pipeline.copy_upsert', side_effect=fussy_upsert), \
+                patch('pipeline.dead_letter_rows', side_effect=lambda cur, failures: dead_letters.extend(failures)):
+            writer = BatchWriter(lambda: self.conn, stats, max_rows=8, flush_interval=60)
+            writer.start()
+            for i in range(8):
+                writer.put(row(f'id{i}'))
+            writer.stop()
+
+        self.assertEqual(sorted(sum(self.batches, [])), ['id0', 'id1', 'id2', 'id4', 'id5', 'id7'])
+        self.assertEqual([(r[0], error) for r, error in dead_letters],
+                         [('id3', 'value too long for id3'), ('id6', 'value too long for id6')])
+        self.assertLess(len(attempts), 1 + 2 * 8) # Bisection, not one statement per row
+        self.assertEqual(stats['rows_written'], 6)
+        self.assertEqual(stats['rows_dead_lettered'], 2)
+        self.assertEqual(stats['errors'], 2)
+        self.assertEqual(stats['db_batches_salvaged'], 1)
+        self.assertEqual(stats['db_batches_failed'], 0)
+        self.assertEqual(self.conn.commits, 1) # Good rows and dead letters land together
+
+    def test_lost_connection_is_replaced(self):
+        """Test that the writer reconnects when a failed batch cannot even be rolled back"""
+        stats = new_stats()
+        broken = FakeConnection()
+        broken.rollback = MagicMock(side_effect=Exception("server closed the connection"))
+        connections = [broken, self.conn]
+        writer = BatchWriter(lambda: connections.pop(0), stats, max_rows=1, flush_interval=60)
+        writer.start()
+        with patch('pipeline.copy_upsert', side_effect=Exception("server closed the connection")):
+            writer.put(row('id1'))
+            writer.flush()
+        writer.put(row('id2'))
+        writer.stop()
+
+        self.assertEqual(stats['db_batches_failed'], 1)
+        self.assertEqual(self.batches, [['id2']])
+        self.assertEqual(self.conn.commits, 1)
+
+    def test_prunes_commit_with_their_batch(self):
+        """Test that stale rows of a finished file are pruned in the transaction of its last batch"""
+        stats = new_stats()
+        writer = BatchWriter(lambda: self.conn, stats, max_rows=100, flush_interval=60)
+        writer.start()
+        with patch('pipeline.prune_file_rows', return_value=3) as prune:
+            writer.put(row('bulk#1'))
+            writer.put(row('bulk#2'))
+            writer.prune('bulk', ['bulk#1', 'bulk#2'])
+            writer.stop()
+
+        self.assertEqual(prune.call_args.args[1], {'bulk': ['bulk#1', 'bulk#2']})
+        self.assertEqual(self.batches, [['bulk#1', 'bulk#2']])
+        self.assertEqual(self.conn.commits, 1)
+        self.assertEqual(stats['rows_pruned'], 3)
+
+    def test_dead_writer_is_reported_instead_of_blocking(self):
+        """Test that put, flush and stop raise the writer's error once its thread has died"""
+        def observe(name, seconds):
+            if name == 'db_commit':
+                raise MemoryError("writer killed")
+
+        metrics = MagicMock()
+        metrics.observe.side_effect = observe
+        self.write_delay = 0.2
+        writer = BatchWriter(lambda: self.conn, new_stats(), max_rows=1, queue_size=1,
+                             flush_interval=60, metrics=metrics)
+        writer.start()
+        writer.put(row('id1'))
+        with self.assertRaises(RuntimeError):
+            # The queue is full and nothing drains it once the writer is gone
+            for i in range(2, 5):
+                writer.put(row(f'id{i}'))
+        self.assertIsInstance(writer.error, MemoryError)
+        with self.assertRaises(RuntimeError):
+            writer.flush()
+        with self.assertRaises(RuntimeError) as raised:
+            writer.stop()
+
+        self.assertIs(raised.exception.__cause__, writer.error)
+        self.assertTrue(self.conn.closed)
+
+    def test_stop_raises_when_writer_died_with_room_in_queue(self):
+        """Test that stop raises the writer's error even though _STOP fits in the queue"""
+        def observe(name, seconds):
+            if name == 'db_commit':
+                raise MemoryError("writer killed")
+
+        metrics = MagicMock()
+        metrics.observe.side_effect = observe
+        writer = BatchWriter(lambda: self.conn, new_stats(), max_rows=1, flush_interval=60, metrics=metrics)
+        writer.start()
+        writer.put(row('id1'))
+        writer._thread.join(timeout=5)
+        with self.assertRaises(RuntimeError) as raised:
+            writer.stop()
+
+        self.assertIsInstance(raised.exception.__cause__, MemoryError)
+        self.assertTrue(self.conn.closed)
+
+    def test_producers_from_many_threads(self):
+        """Test that rows from concurrent producers are all written"""
+        stats = new_stats()
+        writer = BatchWriter(lambda: self.conn, stats, max_rows=50, flush_interval=60)
+        writer.start()
+        threads = [
+            threading.Thread(target=lambda n=n: [writer.put(row(f'{n}-{i}')) for i in range(100)])
+            for n in range(8)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        writer.stop()
+
+        self.assertEqual(stats['rows_written'], 800)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,164 @@
+import json
+import ssl
+import threading
+import time
+import unittest
+from email.utils import formatdate
+
+from rate_governor import (
+    RateGovernor, classify_error, retry_after_seconds, FATAL, SUCCESS, THROTTLED, TRANSIENT
+)
+
+
+class FakeResponse(dict):
+    def __init__(self, status, headers=None):
+        super().__init__(headers or {})
+        self.status = status
+
+
+class FakeHttpError(Exception):
+    """Shaped like googleapiclient.errors.HttpError."""
+
+    def __init__(self, status, reason=None, headers=None):
+        super().__init__(f"HTTP {status}")
+        self.resp = FakeResponse(status, headers)
+        errors = [{'reason': reason}] if reason else []
+        self.content = json.dumps({'error': {'code': status, 'errors': errors}}).encode('utf-8')
+
+
+class TestClassifyError(unittest.TestCase):
+    """Test how Drive failures are classified."""
+
+    def test_rate_limits(self):
+        self.assertEqual(classify_error(FakeHttpError(429)), THROTTLED)
+        self.assertEqual(classify_error(FakeHttpError(403, 'rateLimitExceeded')), THROTTLED)
+        self.assertEqual(classify_error(FakeHttpError(403, 'userRateLimitExceeded')), THROTTLED)
+
+    def test_transient_and_fatal(self):
+        self.assertEqual(classify_error(FakeHttpError(503)), TRANSIENT)
+        self.assertEqual(classify_error(ssl.SSLError('bad record')), TRANSIENT)
+        self.assertEqual(classify_error(ConnectionResetError()), TRANSIENT)
+        self.assertEqual(classify_error(FakeHttpError(403, 'insufficientFilePermissions')), FATAL)
+        self.assertEqual(classify_error(FakeHttpError(404, 'notFound')), FATAL)
+        self.assertEqual(classify_error(ValueError('bad json')), FATAL)
+
+    def test_retry_after(self):
+        self.assertEqual(retry_after_seconds(FakeHttpError(429, headers={'retry-after': '7'})), 7.0)
+        self.assertIsNone(retry_after_seconds(FakeHttpError(429)))
+        date = formatdate(time.time() + 30, usegmt=True)
+        delay = retry_after_seconds(FakeHttpError(429, headers={'retry-after': date}))
+        self.assertTrue(25 <= delay <= 31)
+
+
+class TestRateGovernor(unittest.TestCase):
+    """Test AIMD limits, shared pauses and the retry budget."""
+
+    def setUp(self):
+        self.sleeps = []
+        self.governor = RateGovernor(initial_limit=8, sleep=self.sleeps.append)
+
+    def test_additive_increase(self):
+        for _ in range(8):
+            self.governor.release(self.governor.acquire(), SUCCESS)
+        self.assertAlmostEqual(self.governor.limit, 9.0, delta=0.1)
+
+    def test_burst_of_throttles_halves_limit_once(self):
+        started = [self.governor.acquire() for _ in range(4)]
+        for s in started:
+            self.governor.release(s, THROTTLED, retry_after=0)
+        self.assertEqual(self.governor.limit, 4.0)
+        self.assertEqual(self.governor.stats['throttled'], 4)
+
+        # A call admitted after the cut is a fresh congestion signal
+        self.governor.release(self.governor.acquire(), THROTTLED, retry_after=0)
+        self.assertEqual(self.governor.limit, 2.0)
+
+    def test_limit_floor(self):
+        for _ in range(10):
+            self.governor.release(self.governor.acquire(), THROTTLED, retry_after=0)
+        self.assertEqual(self.governor.limit, 1.0)
+
+    def test_retry_after_pauses_all_callers(self):
+        self.governor.release(self.governor.acquire(), THROTTLED, retry_after=0.2)
+        self.assertGreater(self.governor.wait_time(), 0.1)
+        started = time.monotonic()
+        self.governor.acquire()
+        self.assertGreaterEqual(time.monotonic() - started, 0.15)
+
+    def test_call_retries_until_success(self):
+        responses = [FakeHttpError(429, headers={'retry-after': '0'}), FakeHttpError(503), {'ok': True}]
+
+        def flaky():
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        self.assertEqual(self.governor.call(flaky), {'ok': True})
+        self.assertEqual(self.governor.stats['retries'], 1) # Only the 503 is charged to the budget
+        self.assertEqual(len(self.sleeps), 2)
+
+    def test_fatal_errors_are_not_retried(self):
+        calls = []
+
+        def missing():
+            calls.append(1)
+            raise FakeHttpError(404, 'notFound')
+
+        with self.assertRaises(FakeHttpError):
+            self.governor.call(missing)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self.governor.stats['retries'], 0)
+
+    def test_retry_budget_is_shared_across_calls(self):
+        governor = RateGovernor(retry_budget=3, retry_ratio=0, sleep=lambda s: None)
+
+        def broken():
+            raise ssl.SSLError('bad record')
+
+        with self.assertRaises(ssl.SSLError):
+            governor.call(broken)
+        self.assertEqual(governor.stats['retries'], 3)
+
+        # The next call gets no retries at all
+        calls = []
+
+        def also_broken():
+            calls.append(1)
+            raise ssl.SSLError('bad record')
+
+        with self.assertRaises(ssl.SSLError):
+            governor.call(also_broken)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(governor.stats['budget_exhausted'], 2)
+
+    def test_budget_grows_with_successes(self):
+        governor = RateGovernor(retry_budget=0, retry_ratio=0.5, sleep=lambda s: None)
+        for _ in range(4):
+            governor.call(lambda: None)
+        self.assertEqual(governor.retries_allowed(), 2)
+
+    def test_in_flight_calls_respect_limit(self):
+        governor = RateGovernor(initial_limit=3, max_limit=3)
+        lock = threading.Lock()
+        active = [0]
+        peak = [0]
+
+        def work():
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.01)
+            with lock:
+                active[0] -= 1
+
+        threads = [threading.Thread(target=governor.call, args=(work,)) for _ in range(12)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(peak[0], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
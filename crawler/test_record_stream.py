@@ -0,0 +1,151 @@
+import gzip
+import hashlib
+import io
+import json
+import math
+import unittest
+import zipfile
+from unittest.mock import patch
+
+import record_stream
+from record_stream import canonical_bytes, is_movie_file, iter_records, loads, movie_values
+
+
+def movies(count):
+    return [{'title': f'Movie {i}', 'year': 2000 + i, 'rating': 7.5, 'genre': 'Drama'} for i in range(count)]
+
+
+def zipped(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+class TestIterRecords(unittest.TestCase):
+
+    def test_movie_file_names(self):
+        """Test which file names are treated as movie files"""
+        for name in ('a.json', 'a.JSONL', 'a.ndjson', 'a.json.gz', 'a.jsonl.gz', 'a.zip'):
+            self.assertTrue(is_movie_file(name), name)
+        for name in ('a.txt', 'a.gz', 'a.json.bak'):
+            self.assertFalse(is_movie_file(name), name)
+
+    def test_single_movie_file(self):
+        """Test that a plain .json object is yielded as the file itself"""
+        data = json.dumps(movies(1)[0]).encode()
+        self.assertEqual(list(iter_records('m.json', io.BytesIO(data))), [(None, movies(1)[0])])
+
+    def test_json_lines_with_bad_record(self):
+        """Test that a malformed line is reported in place and parsing continues"""
+        lines = [json.dumps(m) for m in movies(3)]
+        lines.insert(1, '{"title": ')
+        records = list(iter_records('m.jsonl', io.BytesIO('\n'.join(lines).encode())))
+
+        self.assertEqual([position for position, _ in records], [1, 2, 3, 4])
+        self.assertIsInstance(records[1][1], ValueError)
+        self.assertEqual(records[3][1], movies(3)[2])
+
+    def test_json_array_across_chunk_boundaries(self):
+        """Test incremental array parsing when elements span read chunks"""
+        data = json.dumps(movies(50) + [12345, 'text'], indent=2).encode()
+        with patch('record_stream.READ_CHUNK_CHARS', 7):
+            records = list(iter_records('m.json', io.BytesIO(data)))
+
+        self.assertEqual([value for _, value in records], movies(50) + [12345, 'text'])
+        self.assertEqual(records[-1][0], 52)
+
+    def test_empty_and_broken_arrays(self):
+        """Test that an empty array yields nothing and a broken one raises after good elements"""
+        self.assertEqual(list(iter_records('m.json', io.BytesIO(b' [ ] '))), [])
+        records = iter_records('m.json', io.BytesIO(b'[{"title": "a"} {"title": "b"}]'))
+        self.assertEqual(next(records), (1, {'title': 'a'}))
+        with self.assertRaises(ValueError):
+            next(records)
+
+    def test_element_size_is_bounded(self):
+        """Test that an element larger than the limit is rejected instead of buffered"""
+        data = b'[{"plot": "' + b'x' * 200 + b'"}]'
+        with patch('record_stream.READ_CHUNK_CHARS', 16), patch('record_stream.MAX_RECORD_CHARS', 64):
+            with self.assertRaises(ValueError):
+                list(iter_records('m.json', io.BytesIO(data)))
+
+    def test_gzip(self):
+        """Test gzip-compressed JSON Lines and arrays"""
+        lines = '\n'.join(json.dumps(m) for m in movies(3)).encode()
+        records = list(iter_records('m.jsonl.gz', io.BytesIO(gzip.compress(lines))))
+        self.assertEqual([value for _, value in records], movies(3))
+
+        array = json.dumps(movies(2)).encode()
+        records = list(iter_records('m.json.gz', io.BytesIO(gzip.compress(array))))
+        self.assertEqual(records, [(1, movies(2)[0]), (2, movies(2)[1])])
+
+    def test_zip_archive(self):
+        """Test that zip members are read by format and positions name the member"""
+        archive = zipped({
+            'a/one.json': json.dumps(movies(1)[0]),
+            'b.jsonl': '\n'.join(json.dumps(m) for m in movies(2)),
+            'readme.txt': 'ignored',
+            'nested.zip': b'ignored',
+        })
+        records = list(iter_records('bundle.zip', archive))
+
+        self.assertEqual([position for position, _ in records], ['a/one.json:1', 'b.jsonl:1', 'b.jsonl:2'])
+        self.assertEqual(records[2][1], movies(2)[1])
+
+    def test_raw_records_keep_file_text(self):
+        """Test that raw mode yields each record's own JSON text next to its value"""
+        single = b'{"title": "A",  "year": 2000}'
+        self.assertEqual(list(iter_records('m.json', io.BytesIO(single), raw=True)),
+                         [(None, ({'title': 'A', 'year': 2000}, single))])
+
+        lines = b'{"a": 1}\r\n\n{"b":  2}\n'
+        self.assertEqual(list(iter_records('m.jsonl', io.BytesIO(lines), raw=True)),
+                         [(1, ({'a': 1}, b'{"a": 1}')), (3, ({'b': 2}, b'{"b":  2}'))])
+
+        array = b' [ {"a": 1} ,\n{"b": [1, 2]}]'
+        with patch('record_stream.READ_CHUNK_CHARS', 4):
+            records = list(iter_records('m.json', io.BytesIO(array), raw=True))
+        self.assertEqual(records, [(1, ({'a': 1}, '{"a": 1}')), (2, ({'b': [1, 2]}, '{"b": [1, 2]}'))])
+
+
+class TestMovieValues(unittest.TestCase):
+
+    def test_payload_and_hash_are_of_the_raw_text(self):
+        """Test that the stored payload and its hash are the file's text, and canonical without it"""
+        compact = b'{"title":"Heat","year":1995,"rating":8.3,"genre":"Crime","cast":["Pacino"]}'
+        spaced = b'{ "genre": "Crime", "cast": [ "Pacino" ],\n "rating": 8.3, "year": 1995, "title": "Heat" }'
+        row, size = movie_values('f1', loads(spaced), 'md5', None, raw=spaced)
+        other, _ = movie_values('f1', loads(compact), 'md5', None, raw=compact)
+
+        self.assertEqual(row[1:5], ('Heat', 1995, 8.3, 'Crime'))
+        self.assertEqual(row[5], spaced.decode())
+        self.assertEqual(size, len(spaced))
+        self.assertEqual(row[8], hashlib.sha256(spaced).hexdigest())
+        self.assertNotEqual(row[8], other[8])
+        self.assertEqual(movie_values('f1', loads(spaced), raw=spaced.decode())[0][8], row[8])
+        canonical, _ = movie_values('f1', loads(compact))
+        self.assertEqual(canonical[5], '{"cast":["Pacino"],"genre":"Crime","rating":8.3,"title":"Heat","year":1995}')
+        self.assertEqual(canonical[8], movie_values('f1', loads(spaced))[0][8])
+
+    def test_coercion_and_validation(self):
+        """Test that loosely typed core fields are coerced and missing ones rejected"""
+        row, _ = movie_values('f1', {'title': ' Heat ', 'year': '1995', 'rating': 8, 'genre': 'Crime'})
+        self.assertEqual(row[1:5], ('Heat', 1995, 8.0, 'Crime'))
+        with self.assertRaises(ValueError):
+            movie_values('f1', {'title': 'Heat', 'year': 1995, 'rating': 0, 'genre': 'Crime'})
+        with self.assertRaises(ValueError):
+            movie_values('f1', ['not', 'a', 'movie'])
+
+    def test_stdlib_fallback(self):
+        """Test documents and payloads orjson refuses"""
+        self.assertTrue(math.isnan(loads(b'{"n": NaN}')['n']))
+        with self.assertRaises(ValueError):
+            loads(b'{"n": 1} trailing')
+        self.assertEqual(canonical_bytes({'b': 2 ** 70, 'a': 1}), b'{"a":1,"b":1180591620717411303424}')
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,106 @@
+import unittest
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from sync_daemon import ChangeSyncDaemon
+
+
+class FakeCrawler:
+    """Minimal stand-in for GoogleDriveCrawler used by the sync daemon."""
+
+    def __init__(self, polls):
+        self.polls = list(polls) # (changes, failed) returned by successive polls
+        self.stats = {'changes_processed': 0, 'errors': 0}
+        self.download_pool = None
+        self.reconnects = 0
+        self.processed = 0
+        self.on_poll = None
+
+    def ensure_connection(self):
+        self.reconnects += 1
+
+    def process_changes(self, concurrency=None):
+        changes, failed = self.polls.pop(0) if self.polls else (0, False)
+        self.stats['changes_processed'] += changes
+        self.stats['errors'] += int(failed)
+        if self.on_poll is not None:
+            self.on_poll()
+
+    def flush_writes(self):
+        pass
+
+    def process_new_movies(self):
+        self.processed += 1
+
+    def build_http_transport(self):
+        return object()
+
+
+class TestChangeSyncDaemon(unittest.TestCase):
+
+    def test_interval_adapts_to_activity(self):
+        """Test that polling speeds up with changes and backs off when idle or failing"""
+        daemon = ChangeSyncDaemon(FakeCrawler([]), min_interval=5, max_interval=60)
+        self.assertEqual(daemon.next_interval(5, 0, False), 10)
+        self.assertEqual(daemon.next_interval(40, 0, False), 60)
+        self.assertEqual(daemon.next_interval(60, 12, False), 5)
+        self.assertEqual(daemon.next_interval(5, 12, True), 10)
+
+    def test_stop_ends_after_current_poll(self):
+        """Test graceful shutdown: the poll in progress completes and the pool is released"""
+        crawler = FakeCrawler([(3, False), (0, False)])
+        daemon = ChangeSyncDaemon(crawler, min_interval=0.01, max_interval=0.02)
+        polls = []
+
+        def on_poll():
+            polls.append(crawler.download_pool)
+            if len(polls) == 2:
+                daemon.stop()
+
+        crawler.on_poll = on_poll
+        daemon.run()
+
+        self.assertEqual(daemon.stats['polls'], 2)
+        self.assertEqual(daemon.stats['active_polls'], 1)
+        self.assertIsNotNone(polls[0])
+        self.assertIs(polls[0], polls[1]) # Same warm pool across polls
+        self.assertIsNone(crawler.download_pool)
+        self.assertEqual(crawler.reconnects, 2)
+        self.assertEqual(crawler.processed, 1) # Only after the poll that saw changes
+
+    def test_push_notification_wakes_daemon(self):
+        """Test that a change notification triggers a poll before the interval ends"""
+        crawler = FakeCrawler([])
+        daemon = ChangeSyncDaemon(crawler, min_interval=30, max_interval=60, push_port=0, push_token='secret')
+        thread = threading.Thread(target=daemon.run)
+        thread.start()
+        try:
+            while daemon.stats['polls'] < 1 or daemon.server is None:
+                time.sleep(0.01)
+            url = f"http://127.0.0.1:{daemon.server.server_address[1]}/drive"
+
+            def post(token, state='change'):
+                request = urllib.request.Request(url, data=b'', method='POST', headers={
+                    'X-Goog-Channel-Token': token, 'X-Goog-Resource-State': state})
+                return urllib.request.urlopen(request, timeout=5).status
+
+            with self.assertRaises(urllib.error.HTTPError) as ctx:
+                post('wrong')
+            self.assertEqual(ctx.exception.code, 403)
+            self.assertEqual(post('secret', 'sync'), 204)
+            self.assertEqual(daemon.stats['push_notifications'], 0)
+
+            self.assertEqual(post('secret'), 204)
+            deadline = time.monotonic() + 5
+            while daemon.stats['polls'] < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(daemon.stats['polls'], 2)
+        finally:
+            daemon.stop()
+            thread.join()
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
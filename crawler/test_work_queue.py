@@ -0,0 +1,303 @@
+import unittest
+import threading
+import time
+from unittest.mock import patch
+
+from discovery import FOLDER_MIME_TYPE
+from work_queue import CrawlWorker, JobQueue, DOWNLOAD_JOB, LIST_JOB, MAX_JOB_ATTEMPTS
+
+
+class MemoryJobQueue:
+    """In-memory JobQueue with the same claim, lease and completion rules."""
+
+    def __init__(self, root_id='root', start_page_token='token-1'):
+        self.run_id = 'run'
+        self.lock = threading.Lock()
+        self.jobs = {} # id -> dict
+        self.keys = set()
+        self.status = 'running'
+        self.start_page_token = start_page_token
+        self.retired = []
+        self.enqueue([(LIST_JOB, root_id, {'path': 'root'})])
+
+    def enqueue(self, jobs):
+        with self.lock:
+            for kind, target_id, payload in jobs:
+                if (kind, target_id) in self.keys:
+                    continue
+                self.keys.add((kind, target_id))
+                job_id = len(self.jobs) + 1
+                self.jobs[job_id] = {'kind': kind, 'target': target_id, 'payload': payload,
+                                     'status': 'pending', 'attempts': 0, 'worker': None, 'lease': None}
+
+    def claim(self, worker_id, kind, limit, lease_seconds=120):
+        with self.lock:
+            claimed = []
+            for job_id, job in self.jobs.items():
+                if len(claimed) == limit:
+                    break
+                if job['kind'] == kind and job['status'] == 'pending':
+                    job.update(status='claimed', worker=worker_id, lease=time.monotonic() + lease_seconds)
+                    job['attempts'] += 1
+                    claimed.append((job_id, job['target'], job['payload']))
+            return claimed
+
+    def complete(self, job_ids):
+        with self.lock:
+            for job_id in job_ids:
+                self.jobs[job_id].update(status='done', lease=None)
+
+    def release(self, job_ids, error=None, max_attempts=MAX_JOB_ATTEMPTS):
+        with self.lock:
+            for job_id in job_ids:
+                job = self.jobs[job_id]
+                job.update(status='failed' if job['attempts'] >= max_attempts else 'pending',
+                           worker=None, lease=None)
+
+    def reclaim_expired(self, max_attempts=MAX_JOB_ATTEMPTS):
+        with self.lock:
+            expired = [job_id for job_id, job in self.jobs.items()
+                       if job['status'] == 'claimed' and job['lease'] < time.monotonic()]
+        self.release(expired, 'lease expired', max_attempts)
+        return len(expired)
+
+    def register_worker(self, worker_id):
+        pass
+
+    def heartbeat(self, worker_id, jobs_done=0, lease_seconds=120):
+        pass
+
+    def retire_worker(self, worker_id):
+        self.retired.append(worker_id)
+
+    def finish_run(self):
+        with self.lock:
+            busy = any(job['status'] in ('pending', 'claimed') for job in self.jobs.values())
+            if self.status != 'running' or busy:
+                return False, None
+            self.status = 'completed'
+            return True, self.start_page_token
+
+    def run_status(self):
+        return self.status
+
+    def by_status(self, status):
+        return sorted(job['target'] for job in self.jobs.values() if job['status'] == status)
+
+
+class FakeCrawler:
+    """Minimal stand-in for GoogleDriveCrawler used by workers."""
+
+    def __init__(self, tree, failing=(), failed_batches=0):
+        self.tree = tree
+        self.failing = set(failing)
+        self.lock = threading.Lock()
+        self.stats = {'errors': 0, 'folders_processed': 0, 'db_batches_failed': 0, 'files_skipped': 0}
+        self.pending = []
+        self.committed = []
+        self.fail_next_flushes = failed_batches
+        self.transports = 0
+
+    def count(self, key, amount=1):
+        with self.lock:
+            self.stats[key] += amount
+
+    def iter_folder_pages(self, folder_id, page_token=None, http=None):
+        items = self.tree.get(folder_id, [])
+        for start in range(0, max(len(items), 1), 2):
+            yield items[start:start + 2], None
+
+    def should_process(self, item):
+        return True
+
+    def build_http_transport(self):
+        with self.lock:
+            self.transports += 1
+        return object()
+
+    def process_drive_file(self, item, http=None):
+        if item['id'] in self.failing:
+            return False
+        with self.lock:
+            self.pending.append(item['id'])
+        return True
+
+    def flush_writes(self):
+        with self.lock:
+            if self.fail_next_flushes:
+                self.fail_next_flushes -= 1
+                self.stats['db_batches_failed'] += 1
+            else:
+                self.committed.extend(self.pending)
+            self.pending = []
+
+
+def folder(folder_id, name):
+    return {'id': folder_id, 'name': name, 'mimeType': FOLDER_MIME_TYPE}
+
+
+def json_file(file_id):
+    return {'id': file_id, 'name': f'{file_id}.json', 'mimeType': 'application/json', 'md5Checksum': 'ab'}
+
+
+TREE = {
+    'root': [folder('a', 'A'), folder('b', 'B'), json_file('f1'), json_file('f2')],
+    'a': [json_file('f3'), folder('c', 'C'), folder('b', 'B')], # 'b' is reachable twice
+    'b': [json_file('f4'), json_file('f5')],
+    'c': [json_file('f6')],
+}
+
+
+class TestCrawlWorker(unittest.TestCase):
+
+    def make_worker(self, crawler, queue, worker_id='w1'):
+        return CrawlWorker(crawler, queue, worker_id=worker_id, concurrency=2, claim_size=3,
+                           poll_interval=0.01)
+
+    def test_single_worker_drains_queue(self):
+        """Test that one worker lists the tree, downloads every file once and completes the run"""
+        queue = MemoryJobQueue()
+        crawler = FakeCrawler(TREE)
+        worker = self.make_worker(crawler, queue)
+        worker.run()
+
+        self.assertEqual(sorted(crawler.committed), ['f1', 'f2', 'f3', 'f4', 'f5', 'f6'])
+        self.assertEqual(queue.by_status('done'), sorted(['root', 'a', 'b', 'c', 'f1', 'f2', 'f3', 'f4', 'f5', 'f6']))
+        self.assertTrue(worker.finished_run)
+        self.assertEqual(worker.start_page_token, 'token-1')
+        self.assertEqual(queue.retired, ['w1'])
+        download_jobs = [job for job in queue.jobs.values() if job['kind'] == DOWNLOAD_JOB]
+        self.assertEqual(download_jobs[0]['payload']['md5Checksum'], 'ab')
+        # Six files in claims of three: the pool's two threads keep their transports across claims
+        self.assertLessEqual(crawler.transports, 2)
+
+    def test_workers_share_the_queue(self):
+        """Test that concurrent workers split the jobs and only one finishes the run"""
+        queue = MemoryJobQueue()
+        crawler = FakeCrawler(TREE)
+        workers = [self.make_worker(crawler, queue, f'w{i}') for i in range(3)]
+        threads = [threading.Thread(target=worker.run) for worker in workers]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(sorted(crawler.committed), ['f1', 'f2', 'f3', 'f4', 'f5', 'f6'])
+        self.assertEqual(sum(worker.finished_run for worker in workers), 1)
+        self.assertEqual(sum(worker.stats['download_jobs'] for worker in workers), 6)
+
+    def test_failed_downloads_are_retried_then_failed(self):
+        """Test that a file that keeps failing is released until it runs out of attempts"""
+        queue = MemoryJobQueue()
+        crawler = FakeCrawler(TREE, failing={'f4'})
+        worker = self.make_worker(crawler, queue)
+        worker.run()
+
+        self.assertEqual(queue.by_status('failed'), ['f4'])
+        self.assertEqual(worker.stats['jobs_released'], MAX_JOB_ATTEMPTS)
+        self.assertTrue(worker.finished_run)
+
+    def test_failed_db_batch_releases_its_jobs(self):
+        """Test that download jobs are not completed when their rows did not commit"""
+        queue = MemoryJobQueue()
+        crawler = FakeCrawler(TREE, failed_batches=1)
+        worker = self.make_worker(crawler, queue)
+        worker.run()
+
+        self.assertEqual(sorted(crawler.committed), ['f1', 'f2', 'f3', 'f4', 'f5', 'f6'])
+        self.assertEqual(worker.stats['jobs_released'], 3)
+        self.assertEqual(queue.by_status('failed'), [])
+
+    def test_jobs_of_dead_worker_are_reclaimed(self):
+        """Test that claims whose lease expired go back to the queue"""
+        queue = MemoryJobQueue()
+        queue.claim('dead', LIST_JOB, 1, lease_seconds=-1)
+        crawler = FakeCrawler(TREE)
+        worker = self.make_worker(crawler, queue)
+        worker.run()
+
+        self.assertEqual(worker.stats['jobs_reclaimed'], 1)
+        self.assertEqual(len(crawler.committed), 6)
+        self.assertTrue(worker.finished_run)
+
+    def test_stop_hands_back_claims(self):
+        """Test that a stopped worker retires without finishing the run"""
+        queue = MemoryJobQueue()
+        worker = self.make_worker(FakeCrawler(TREE), queue)
+        worker.stop()
+        worker.run()
+
+        self.assertFalse(worker.finished_run)
+        self.assertEqual(queue.by_status('pending'), ['root'])
+        self.assertEqual(queue.retired, ['w1'])
+
+
+class FakeCursor:
+    """Records statements and answers queries from scripted results."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.conn.statements.append((' '.join(sql.split()), params))
+
+    def fetchone(self):
+        return self.conn.results.pop(0)
+
+    def fetchall(self):
+        return self.conn.results.pop(0)
+
+
+class FakeConnection:
+
+    def __init__(self, results=None):
+        self.statements = []
+        self.results = list(results or [])
+        self.commits = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+
+class TestJobQueue(unittest.TestCase):
+
+    def test_claim_skips_locked_rows(self):
+        """Test that claims lock pending rows with SKIP LOCKED and take a lease"""
+        conn = FakeConnection(results=[[(7, 'f7', {}), (3, 'f3', {})]])
+        jobs = JobQueue(conn, 'run').claim('w1', DOWNLOAD_JOB, 200, lease_seconds=60)
+
+        self.assertEqual([job[0] for job in jobs], [3, 7])
+        sql, params = conn.statements[0]
+        self.assertIn('FOR UPDATE SKIP LOCKED', sql)
+        self.assertIn("status = 'claimed'", sql)
+        self.assertEqual(params, ('run', DOWNLOAD_JOB, 200, 'w1', 60))
+        self.assertEqual(conn.commits, 1)
+
+    def test_enqueue_ignores_known_jobs(self):
+        """Test that enqueued jobs are deduplicated by the unique key"""
+        conn = FakeConnection()
+        with patch('work_queue.execute_values') as mock_values:
+            JobQueue(conn, 'run').enqueue([(LIST_JOB, 'a', {'path': 'root/a'})])
+        self.assertIn('ON CONFLICT (run_id, kind, target_id) DO NOTHING', mock_values.call_args.args[1])
+        self.assertEqual(len(mock_values.call_args.args[2]), 1)
+
+    def test_finish_run_once(self):
+        """Test that only a worker whose update completes the run gets its token"""
+        queue = JobQueue(FakeConnection(results=[('token-1',), None]), 'run')
+        self.assertEqual(queue.finish_run(), (True, 'token-1'))
+        self.assertEqual(queue.finish_run(), (False, None))
+        self.assertIn("status IN ('pending', 'claimed')", queue.conn.statements[0][0])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
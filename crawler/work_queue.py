@@ -0,0 +1,403 @@
+import logging
+import os
+import socket
+import threading
+import time
+
+from psycopg2.extras import Json, execute_values
+
+from async_engine import DEFAULT_CONCURRENCY
+from change_feed import DownloadPool
+from discovery import FOLDER_MIME_TYPE
+from record_stream import is_movie_file
+
+logger = logging.getLogger(__name__)
+
+LIST_JOB = 'list' # List one folder and queue its subfolders and JSON files
+DOWNLOAD_JOB = 'download' # Download one JSON file into the batched writer
+LEASE_SECONDS = 120 # A claim not renewed for this long is reclaimed by other workers
+HEARTBEAT_INTERVAL = 30.0 # Seconds between lease renewals
+RECLAIM_INTERVAL = 30.0 # Seconds between sweeps for jobs of dead workers
+POLL_INTERVAL = 2.0 # Seconds to wait when nothing is claimable but other workers are busy
+DOWNLOAD_CLAIM_SIZE = 200 # Download jobs claimed (and committed) per round trip
+MAX_JOB_ATTEMPTS = 5 # A job claimed this many times without finishing is marked failed
+
+
+def default_worker_id():
+    """Identify a worker by host and process, unique across a fleet."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class JobQueue:
+    """The crawl_jobs table of one distributed crawl run.
+
+    Every method runs in its own transaction on conn. Claims take pending
+    rows with FOR UPDATE SKIP LOCKED, so concurrent workers never block on
+    or double-claim the same job, and stamp them with a lease that the
+    owning worker renews with heartbeat(). A worker that dies stops renewing;
+    reclaim_expired() returns its jobs to the queue.
+    """
+
+    def __init__(self, conn, run_id):
+        self.conn = conn
+        self.run_id = run_id
+
+    @staticmethod
+    def create_run(conn, root_folder_id, start_page_token, root_path='root'):
+        """Start a distributed crawl of root_folder_id and queue its root listing."""
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE crawl_runs SET status = 'abandoned', updated_at = NOW()
+                WHERE root_folder_id = %s AND status = 'running'
+            """, (root_folder_id,))
+            cur.execute("""
+                INSERT INTO crawl_runs (root_folder_id, status, discovery_mode, start_page_token)
+                VALUES (%s, 'running', 'distributed', %s)
+                RETURNING id
+            """, (root_folder_id, start_page_token))
+            run_id = cur.fetchone()[0]
+            cur.execute("""
+                INSERT INTO crawl_jobs (run_id, kind, target_id, payload)
+                VALUES (%s, %s, %s, %s)
+            """, (run_id, LIST_JOB, root_folder_id, Json({'path': root_path})))
+        conn.commit()
+        return run_id
+
+    @staticmethod
+    def active_run(conn, root_folder_id):
+        """ID of the running distributed crawl of root_folder_id, or None."""
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT id FROM crawl_runs
+                WHERE root_folder_id = %s AND status = 'running' AND discovery_mode = 'distributed'
+                ORDER BY created_at DESC
+                LIMIT 1
+            """, (root_folder_id,))
+            row = cur.fetchone()
+        conn.commit()
+        return row[0] if row else None
+
+    def enqueue(self, jobs):
+        """Queue (kind, target_id, payload) jobs; ones already queued for this run are ignored."""
+        if not jobs:
+            return
+        with self.conn.cursor() as cur:
+            execute_values(cur, """
+                INSERT INTO crawl_jobs (run_id, kind, target_id, payload)
+                VALUES %s
+                ON CONFLICT (run_id, kind, target_id) DO NOTHING
+            """, [(self.run_id, kind, target_id, Json(payload)) for kind, target_id, payload in jobs],
+                page_size=1000)
+        self.conn.commit()
+
+    def claim(self, worker_id, kind, limit, lease_seconds=LEASE_SECONDS):
+        """Claim up to limit pending jobs of one kind; returns (job_id, target_id, payload) tuples."""
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                WITH next AS (
+                    SELECT id FROM crawl_jobs
+                    WHERE run_id = %s AND kind = %s AND status = 'pending'
+                    ORDER BY id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                UPDATE crawl_jobs j SET
+                    status = 'claimed',
+                    worker_id = %s,
+                    attempts = j.attempts + 1,
+                    lease_expires_at = NOW() + make_interval(secs => %s),
+                    updated_at = NOW()
+                FROM next
+                WHERE j.id = next.id
+                RETURNING j.id, j.target_id, j.payload
+            """, (self.run_id, kind, limit, worker_id, lease_seconds))
+            jobs = cur.fetchall()
+        self.conn.commit()
+        return sorted(jobs)
+
+    def complete(self, job_ids):
+        """Mark claimed jobs done."""
+        if not job_ids:
+            return
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                UPDATE crawl_jobs SET status = 'done', lease_expires_at = NULL, updated_at = NOW()
+                WHERE id = ANY(%s)
+            """, (list(job_ids),))
+        self.conn.commit()
+
+    def release(self, job_ids, error=None, max_attempts=MAX_JOB_ATTEMPTS):
+        """Return failed jobs to the queue, or mark them failed once out of attempts."""
+        if not job_ids:
+            return
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                UPDATE crawl_jobs SET
+                    status = CASE WHEN attempts >= %s THEN 'failed' ELSE 'pending' END,
+                    worker_id = NULL,
+                    lease_expires_at = NULL,
+                    last_error = %s,
+                    updated_at = NOW()
+                WHERE id = ANY(%s)
+            """, (max_attempts, error, list(job_ids)))
+        self.conn.commit()
+
+    def reclaim_expired(self, max_attempts=MAX_JOB_ATTEMPTS):
+        """Requeue jobs whose lease ran out; returns how many were reclaimed."""
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                UPDATE crawl_jobs SET
+                    status = CASE WHEN attempts >= %s THEN 'failed' ELSE 'pending' END,
+                    worker_id = NULL,
+                    lease_expires_at = NULL,
+                    last_error = 'lease expired',
+                    updated_at = NOW()
+                WHERE run_id = %s AND status = 'claimed' AND lease_expires_at < NOW()
+            """, (max_attempts, self.run_id))
+            reclaimed = cur.rowcount
+        self.conn.commit()
+        return reclaimed
+
+    def register_worker(self, worker_id):
+        """Record a worker joining the run."""
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO crawl_workers (worker_id, run_id, hostname, pid)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (worker_id) DO UPDATE SET
+                    run_id = EXCLUDED.run_id,
+                    hostname = EXCLUDED.hostname,
+                    pid = EXCLUDED.pid,
+                    status = 'running',
+                    jobs_done = 0,
+                    started_at = NOW(),
+                    heartbeat_at = NOW()
+            """, (worker_id, self.run_id, socket.gethostname(), os.getpid()))
+        self.conn.commit()
+
+    def heartbeat(self, worker_id, jobs_done=0, lease_seconds=LEASE_SECONDS):
+        """Extend the leases of every job worker_id holds and record that it is alive."""
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                UPDATE crawl_jobs SET lease_expires_at = NOW() + make_interval(secs => %s)
+                WHERE worker_id = %s AND status = 'claimed'
+            """, (lease_seconds, worker_id))
+            cur.execute("""
+                UPDATE crawl_workers SET heartbeat_at = NOW(), jobs_done = %s
+                WHERE worker_id = %s
+            """, (jobs_done, worker_id))
+        self.conn.commit()
+
+    def retire_worker(self, worker_id):
+        """Hand back a stopping worker's claims without charging them an attempt."""
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                UPDATE crawl_jobs SET
+                    status = 'pending',
+                    attempts = GREATEST(attempts - 1, 0),
+                    worker_id = NULL,
+                    lease_expires_at = NULL,
+                    updated_at = NOW()
+                WHERE worker_id = %s AND status = 'claimed'
+            """, (worker_id,))
+            cur.execute("UPDATE crawl_workers SET status = 'stopped', heartbeat_at = NOW() WHERE worker_id = %s",
+                        (worker_id,))
+        self.conn.commit()
+
+    def finish_run(self):
+        """Complete the run once no job is pending or claimed.
+
+        Returns (finished, start_page_token). Only the one worker whose update
+        completes the run gets finished=True, so the change token is saved once.
+        """
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                UPDATE crawl_runs SET status = 'completed', completed_at = NOW(), updated_at = NOW()
+                WHERE id = %s AND status = 'running'
+                  AND NOT EXISTS (
+                      SELECT 1 FROM crawl_jobs
+                      WHERE run_id = %s AND status IN ('pending', 'claimed')
+                  )
+                RETURNING start_page_token
+            """, (self.run_id, self.run_id))
+            row = cur.fetchone()
+        self.conn.commit()
+        return (True, row[0]) if row else (False, None)
+
+    def run_status(self):
+        """Status of the run in crawl_runs."""
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT status FROM crawl_runs WHERE id = %s", (self.run_id,))
+            row = cur.fetchone()
+        self.conn.commit()
+        return row[0] if row else None
+
+    def counts(self):
+        """Number of jobs in each status."""
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT status, COUNT(*) FROM crawl_jobs WHERE run_id = %s GROUP BY status",
+                        (self.run_id,))
+            rows = cur.fetchall()
+        self.conn.commit()
+        return dict(rows)
+
+
+class CrawlWorker:
+    """Claims and runs the jobs of a distributed crawl until its queue drains.
+
+    Listing jobs list one folder and queue its subfolders and any JSON file
+    whose stored copy is out of date. Download jobs are claimed in batches,
+    downloaded concurrently into the crawler's batched writer, and only
+    marked done after the writer has committed their rows, so a worker that
+    dies mid-batch loses nothing: its leases run out and the jobs are
+    claimed again by someone else. One DownloadPool serves every claim of a
+    run, so its threads keep their transports and open connections.
+    """
+
+    def __init__(self, crawler, queue, heartbeat_queue=None, worker_id=None,
+                 concurrency=DEFAULT_CONCURRENCY, claim_size=DOWNLOAD_CLAIM_SIZE,
+                 lease_seconds=LEASE_SECONDS, heartbeat_interval=HEARTBEAT_INTERVAL,
+                 reclaim_interval=RECLAIM_INTERVAL, poll_interval=POLL_INTERVAL):
+        """
+        Args:
+            crawler: GoogleDriveCrawler whose writer stage is running
+            queue: JobQueue used for claims, on the crawler's connection
+            heartbeat_queue: JobQueue on a second connection for the heartbeat thread
+            worker_id: Name recorded on claimed jobs (default: host-pid)
+        """
+        self.crawler = crawler
+        self.queue = queue
+        self.heartbeat_queue = heartbeat_queue
+        self.worker_id = worker_id or default_worker_id()
+        self.concurrency = concurrency
+        self.claim_size = claim_size
+        self.lease_seconds = lease_seconds
+        self.heartbeat_interval = heartbeat_interval
+        self.reclaim_interval = reclaim_interval
+        self.poll_interval = poll_interval
+        self.finished_run = False # True if this worker completed the run
+        self.start_page_token = None
+        self.stats = {
+            'list_jobs': 0,
+            'download_jobs': 0,
+            'jobs_released': 0,
+            'jobs_reclaimed': 0,
+        }
+        self._stop = threading.Event()
+        self._heartbeat_stop = threading.Event() # Outlives _stop so a stopping worker keeps its leases
+        self._reclaimed_at = None
+        self.download_pool = None
+
+    def stop(self):
+        """Ask the worker to stop after the jobs it is running."""
+        self._stop.set()
+
+    def run(self):
+        """Run jobs until the run completes or stop() is called."""
+        self.queue.register_worker(self.worker_id)
+        heartbeat = None
+        if self.heartbeat_queue is not None:
+            heartbeat = threading.Thread(target=self._heartbeat_loop, name='crawl-heartbeat', daemon=True)
+            heartbeat.start()
+        logger.info(f"👷 Worker {self.worker_id} joined crawl {self.queue.run_id}")
+        self.download_pool = DownloadPool(self.crawler, self.concurrency)
+        try:
+            while not self._stop.is_set():
+                self._maybe_reclaim()
+                jobs = self.queue.claim(self.worker_id, LIST_JOB, 1, self.lease_seconds)
+                if jobs:
+                    self.run_list_job(jobs[0])
+                    continue
+                jobs = self.queue.claim(self.worker_id, DOWNLOAD_JOB, self.claim_size, self.lease_seconds)
+                if jobs:
+                    self.run_download_jobs(jobs)
+                    continue
+                self.finished_run, self.start_page_token = self.queue.finish_run()
+                if self.finished_run or self.queue.run_status() != 'running':
+                    break
+                # Other workers still hold claims that may queue more work
+                self._stop.wait(self.poll_interval)
+        finally:
+            self._heartbeat_stop.set()
+            if heartbeat is not None:
+                heartbeat.join()
+            self.download_pool.close()
+            self.download_pool = None
+            try:
+                self.queue.retire_worker(self.worker_id)
+            except Exception as e:
+                logger.error(f"Error releasing the jobs of worker {self.worker_id}: {e}")
+
+    def run_list_job(self, job):
+        """List one folder, queueing its subfolders and changed JSON files."""
+        job_id, folder_id, payload = job
+        path = (payload or {}).get('path', folder_id)
+        self.crawler.stats['folders_processed'] += 1
+        logger.info(f"📁 Crawling folder: {path}")
+        try:
+            for items, _ in self.crawler.iter_folder_pages(folder_id):
+                jobs = []
+                for item in items:
+                    if item['mimeType'] == FOLDER_MIME_TYPE:
+                        jobs.append((LIST_JOB, item['id'], {'path': f"{path}/{item['name']}"}))
+                    elif is_movie_file(item['name']) and self.crawler.should_process(item):
+                        jobs.append((DOWNLOAD_JOB, item['id'], {
+                            'name': item['name'],
+                            'md5Checksum': item.get('md5Checksum'),
+                            'modifiedTime': item.get('modifiedTime'),
+                        }))
+                # Queued page by page; a relisted folder re-queues nothing thanks to the unique key
+                self.queue.enqueue(jobs)
+        except Exception as e:
+            logger.error(f"Error crawling folder {path}: {e}", exc_info=True)
+            self.crawler.count('errors')
+            self._release([job_id], str(e))
+            return
+        self.queue.complete([job_id])
+        self.stats['list_jobs'] += 1
+
+    def run_download_jobs(self, jobs):
+        """Download a batch of files and mark them done once their rows are committed."""
+        items = [dict(payload or {}, id=file_id) for _, file_id, payload in jobs]
+        failed_batches = self.crawler.stats['db_batches_failed']
+        results = self.download_pool.download(items)
+        self.crawler.flush_writes()
+        if self.crawler.stats['db_batches_failed'] != failed_batches:
+            # Which rows made it is unknown, so the whole batch goes back
+            self._release([job_id for job_id, _, _ in jobs], 'database batch failed')
+            return
+        done = [job[0] for job, ok in zip(jobs, results) if ok]
+        self.queue.complete(done)
+        self._release([job[0] for job, ok in zip(jobs, results) if not ok], 'download failed')
+        self.stats['download_jobs'] += len(done)
+
+    def _release(self, job_ids, error):
+        if job_ids:
+            self.queue.release(job_ids, error)
+            self.stats['jobs_released'] += len(job_ids)
+
+    def _maybe_reclaim(self):
+        now = time.monotonic()
+        if self._reclaimed_at is not None and now - self._reclaimed_at < self.reclaim_interval:
+            return
+        self._reclaimed_at = now
+        reclaimed = self.queue.reclaim_expired()
+        if reclaimed:
+            self.stats['jobs_reclaimed'] += reclaimed
+            logger.warning(f"♻️  Reclaimed {reclaimed} jobs whose worker stopped renewing its lease")
+
+    def _heartbeat_loop(self):
+        while not self._heartbeat_stop.wait(self.heartbeat_interval):
+            try:
+                jobs_done = self.stats['list_jobs'] + self.stats['download_jobs']
+                self.heartbeat_queue.heartbeat(self.worker_id, jobs_done, self.lease_seconds)
+            except Exception as e:
+                logger.warning(f"Heartbeat for worker {self.worker_id} failed: {e}")
+                self.heartbeat_queue.conn.rollback()
+
+    def summary(self):
+        """Return human-readable worker figures for the crawl summary."""
+        return (
+            f"{self.stats['list_jobs']} folders listed, {self.stats['download_jobs']} files downloaded, "
+            f"{self.stats['jobs_released']} jobs released for retry, {self.stats['jobs_reclaimed']} reclaimed"
+        )
@@ -1,5 +1,9 @@
 -- Enables UUID
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
+-- Enables the vector type for movie embeddings (pgvector)
+CREATE EXTENSION IF NOT EXISTS vector;
+-- Enables trigram indexes for substring title search
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
 
 ---------------
 
@@ -20,9 +24,33 @@ CREATE TABLE IF NOT EXISTS movies (
     genre TEXT,
 
     -- Columns for unstructured data
-    metadata JSONB -- For any extra, non-critical, or varied data
+    metadata JSONB, -- For any extra, non-critical, or varied data
+
+    -- Crawler change detection: the Drive revision and payload hash of the stored copy
+    drive_md5 TEXT,
+    drive_modified_time TIMESTAMP WITH TIME ZONE,
+    content_hash TEXT,
+
+    -- Full-text search document for GET /api/movies?q=, ranked title > genre > people > plot
+    search_vector TSVECTOR GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', COALESCE(title, '')), 'A') ||
+        setweight(to_tsvector('english', COALESCE(genre, '')), 'B') ||
+        setweight(to_tsvector('english', COALESCE(metadata->>'director', '') || ' ' || COALESCE(metadata->>'cast', '')), 'C') ||
+        setweight(to_tsvector('english', COALESCE(metadata->>'plot', '')), 'D')
+    ) STORED
 );
 
+-- Bring databases created before change detection up to date
+ALTER TABLE movies ADD COLUMN IF NOT EXISTS drive_md5 TEXT;
+ALTER TABLE movies ADD COLUMN IF NOT EXISTS drive_modified_time TIMESTAMP WITH TIME ZONE;
+ALTER TABLE movies ADD COLUMN IF NOT EXISTS content_hash TEXT;
+ALTER TABLE movies ADD COLUMN IF NOT EXISTS search_vector TSVECTOR GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', COALESCE(title, '')), 'A') ||
+    setweight(to_tsvector('english', COALESCE(genre, '')), 'B') ||
+    setweight(to_tsvector('english', COALESCE(metadata->>'director', '') || ' ' || COALESCE(metadata->>'cast', '')), 'C') ||
+    setweight(to_tsvector('english', COALESCE(metadata->>'plot', '')), 'D')
+) STORED;
+
 ------------------
 
 -- ## 'drive_change_tokens' Table ##
@@ -36,20 +64,363 @@ CREATE TABLE IF NOT EXISTS drive_change_tokens (
 
 ------------------
 
+-- ## Crawl checkpoint tables ##
+-- Traversal progress of full crawls, so an interrupted crawl can be resumed
+-- with --resume instead of starting over from the root folder.
+CREATE TABLE IF NOT EXISTS crawl_runs (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    root_folder_id TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'running', -- running, completed or abandoned
+    discovery_mode TEXT,
+    start_page_token TEXT, -- Changes API token captured when the crawl started
+    listing_page_token TEXT, -- Next page of the account-wide listing (flat discovery)
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    completed_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE TABLE IF NOT EXISTS crawl_folders (
+    run_id UUID NOT NULL REFERENCES crawl_runs (id) ON DELETE CASCADE,
+    folder_id TEXT NOT NULL,
+    path TEXT,
+    status TEXT NOT NULL DEFAULT 'pending', -- pending or done
+    page_token TEXT, -- nextPageToken of a partially listed folder
+    position BIGINT NOT NULL DEFAULT 0, -- Discovery order, so resumed crawls stay breadth-first
+    PRIMARY KEY (run_id, folder_id)
+);
+
+-- ## Distributed crawl job queue ##
+-- Folder-listing and file-download jobs of a distributed crawl run, claimed
+-- by crawler workers (--worker) with FOR UPDATE SKIP LOCKED under a lease.
+CREATE TABLE IF NOT EXISTS crawl_jobs (
+    id BIGSERIAL PRIMARY KEY,
+    run_id UUID NOT NULL REFERENCES crawl_runs (id) ON DELETE CASCADE,
+    kind TEXT NOT NULL, -- list or download
+    target_id TEXT NOT NULL, -- Drive ID of the folder to list or the file to download
+    payload JSONB, -- Folder path, or the file's name and revision from its listing
+    status TEXT NOT NULL DEFAULT 'pending', -- pending, claimed, done or failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker_id TEXT,
+    lease_expires_at TIMESTAMP WITH TIME ZONE,
+    last_error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    UNIQUE (run_id, kind, target_id) -- A file or folder reached twice is only queued once
+);
+
+CREATE TABLE IF NOT EXISTS crawl_workers (
+    worker_id TEXT PRIMARY KEY,
+    run_id UUID REFERENCES crawl_runs (id) ON DELETE SET NULL,
+    hostname TEXT,
+    pid INTEGER,
+    status TEXT NOT NULL DEFAULT 'running', -- running or stopped
+    jobs_done BIGINT NOT NULL DEFAULT 0,
+    started_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    heartbeat_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- ## Crawler dead letters ##
+-- Rows isolated from a failed write batch, with the error that rejected
+-- them. --retry-failed reprocesses the files they came from.
+CREATE TABLE IF NOT EXISTS crawl_dead_letters (
+    drive_file_id TEXT PRIMARY KEY,
+    source_file_id TEXT NOT NULL,
+    error TEXT NOT NULL,
+    payload TEXT,
+    attempts INTEGER NOT NULL DEFAULT 1,
+    first_failed_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    last_failed_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- ## Movie embeddings ##
+-- Embedding of each movie's title, genre and metadata text, written by the
+-- crawler's embedding stage. Kept out of movies so storing an embedding is a
+-- write to this table and its HNSW index only: no new movies row version, no
+-- entries in the movies indexes and no stats trigger.
+CREATE TABLE IF NOT EXISTS movie_embeddings (
+    movie_id UUID PRIMARY KEY REFERENCES movies (id) ON DELETE CASCADE,
+    embedding vector(256) NOT NULL, -- Dimension must match EMBEDDING_DIM in crawler/embeddings.py
+    content_hash TEXT -- movies.content_hash the embedding was computed from
+);
+
+-- Embeddings used to live on movies; the embedding stage recomputes them here
+ALTER TABLE movies DROP COLUMN IF EXISTS embedding;
+ALTER TABLE movies DROP COLUMN IF EXISTS embedded_hash;
+
+-- ## Pending stage work ##
+-- Movies the crawler's post-write stages still have to process, queued by the
+-- movies_pending triggers below as rows are written, so a stage reads its own
+-- queue instead of comparing every movie against its side table.
+CREATE TABLE IF NOT EXISTS movie_pending (
+    stage TEXT NOT NULL, -- 'embed' or 'dedupe'; must match the stage names in the crawler
+    movie_id UUID NOT NULL REFERENCES movies (id) ON DELETE CASCADE,
+    queued_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT clock_timestamp(), -- Renewed when queued again
+    PRIMARY KEY (stage, movie_id)
+);
+
+-- ## Duplicate detection ##
+-- LSH buckets of each movie's title MinHash signature, blocked by year, and
+-- the clusters of near-duplicate movies found through them by the crawler.
+CREATE TABLE IF NOT EXISTS movie_lsh_bands (
+    movie_id UUID NOT NULL REFERENCES movies (id) ON DELETE CASCADE,
+    year INTEGER NOT NULL, -- 0 when the movie has no year
+    band_key BIGINT NOT NULL, -- Hash of one band of the signature
+    PRIMARY KEY (year, band_key, movie_id)
+);
+
+-- Dedupe state now comes from movie_pending
+ALTER TABLE movies DROP COLUMN IF EXISTS deduped_key;
+DROP TABLE IF EXISTS movie_dedupe_state;
+
+CREATE TABLE IF NOT EXISTS movie_duplicates (
+    movie_id UUID PRIMARY KEY REFERENCES movies (id) ON DELETE CASCADE,
+    cluster_id UUID NOT NULL, -- Smallest movie ID in the cluster when it was formed
+    similarity REAL NOT NULL, -- Best title similarity to another member
+    detected_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- ## Aggregate statistics ##
+-- Movie counts and rating sums for the whole catalog, per genre and per year,
+-- so the stats endpoints read a few rows instead of aggregating every movie.
+-- The statement-level triggers below keep them current on every write path;
+-- rebuild_movie_stats() recomputes them from scratch (crawler --check-stats).
+CREATE TABLE IF NOT EXISTS movie_stats (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id), -- Always a single row
+    movie_count BIGINT NOT NULL DEFAULT 0,
+    rated_count BIGINT NOT NULL DEFAULT 0, -- Movies with a rating, the divisor of the average
+    rating_sum NUMERIC NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS movie_genre_stats (
+    genre TEXT PRIMARY KEY,
+    movie_count BIGINT NOT NULL,
+    rated_count BIGINT NOT NULL,
+    rating_sum NUMERIC NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS movie_year_stats (
+    year INTEGER PRIMARY KEY,
+    movie_count BIGINT NOT NULL,
+    rated_count BIGINT NOT NULL,
+    rating_sum NUMERIC NOT NULL
+);
+
+-- Add (direction 1) or remove (direction -1) movies with these genres, years and
+-- ratings. Every writer updates the movie_stats row first and holds its lock until
+-- commit, so concurrent writers queue there instead of deadlocking on genre rows.
+-- The NOTIFY reaches the API's response cache when the transaction commits; repeats
+-- within one transaction are folded into a single notification.
+CREATE OR REPLACE FUNCTION apply_movie_stats(genres TEXT[], years INTEGER[], ratings NUMERIC[], direction INTEGER)
+RETURNS VOID AS $$
+BEGIN
+    UPDATE movie_stats AS s SET
+        movie_count = s.movie_count + direction * cardinality(genres),
+        rated_count = s.rated_count + direction * d.rated_count,
+        rating_sum = s.rating_sum + direction * d.rating_sum
+    FROM (SELECT COUNT(rating) AS rated_count, COALESCE(SUM(rating), 0) AS rating_sum
+          FROM unnest(ratings) AS r (rating)) AS d;
+
+    INSERT INTO movie_genre_stats AS s (genre, movie_count, rated_count, rating_sum)
+    SELECT genre, direction * COUNT(*), direction * COUNT(rating), direction * COALESCE(SUM(rating), 0)
+    FROM unnest(genres, ratings) AS c (genre, rating)
+    WHERE genre IS NOT NULL
+    GROUP BY genre
+    ON CONFLICT (genre) DO UPDATE SET
+        movie_count = s.movie_count + EXCLUDED.movie_count,
+        rated_count = s.rated_count + EXCLUDED.rated_count,
+        rating_sum = s.rating_sum + EXCLUDED.rating_sum;
+
+    INSERT INTO movie_year_stats AS s (year, movie_count, rated_count, rating_sum)
+    SELECT year, direction * COUNT(*), direction * COUNT(rating), direction * COALESCE(SUM(rating), 0)
+    FROM unnest(years, ratings) AS c (year, rating)
+    WHERE year IS NOT NULL
+    GROUP BY year
+    ON CONFLICT (year) DO UPDATE SET
+        movie_count = s.movie_count + EXCLUDED.movie_count,
+        rated_count = s.rated_count + EXCLUDED.rated_count,
+        rating_sum = s.rating_sum + EXCLUDED.rating_sum;
+
+    IF direction < 0 THEN
+        DELETE FROM movie_genre_stats WHERE genre = ANY(genres) AND movie_count = 0;
+        DELETE FROM movie_year_stats WHERE year = ANY(years) AND movie_count = 0;
+    END IF;
+
+    PERFORM pg_notify('movie_stats', '');
+END;
+$$ LANGUAGE plpgsql;
+
+-- One call per statement with the rows it changed (transition tables), so a
+-- bulk upsert of thousands of movies costs three small upserts, and updates
+-- that leave genre, year and rating alone (a changed plot or cast) cost none.
+CREATE OR REPLACE FUNCTION movies_stats_trigger()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM apply_movie_stats(array_agg(genre), array_agg(year), array_agg(rating), 1)
+        FROM new_rows HAVING COUNT(*) > 0;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM apply_movie_stats(array_agg(genre), array_agg(year), array_agg(rating), -1)
+        FROM old_rows HAVING COUNT(*) > 0;
+    ELSIF TG_OP = 'UPDATE' THEN
+        PERFORM apply_movie_stats(array_agg(o.genre), array_agg(o.year), array_agg(o.rating), -1),
+                apply_movie_stats(array_agg(n.genre), array_agg(n.year), array_agg(n.rating), 1)
+        FROM old_rows o JOIN new_rows n ON n.id = o.id
+        WHERE (o.genre, o.year, o.rating) IS DISTINCT FROM (n.genre, n.year, n.rating)
+        HAVING COUNT(*) > 0;
+    ELSE -- TRUNCATE
+        PERFORM rebuild_movie_stats();
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Recompute every aggregate from movies. Concurrent writes wait until it commits.
+CREATE OR REPLACE FUNCTION rebuild_movie_stats()
+RETURNS VOID AS $$
+BEGIN
+    LOCK TABLE movies IN SHARE MODE;
+    DELETE FROM movie_stats;
+    DELETE FROM movie_genre_stats;
+    DELETE FROM movie_year_stats;
+    INSERT INTO movie_stats (movie_count, rated_count, rating_sum)
+    SELECT COUNT(*), COUNT(rating), COALESCE(SUM(rating), 0) FROM movies;
+    INSERT INTO movie_genre_stats (genre, movie_count, rated_count, rating_sum)
+    SELECT genre, COUNT(*), COUNT(rating), COALESCE(SUM(rating), 0) FROM movies WHERE genre IS NOT NULL GROUP BY genre;
+    INSERT INTO movie_year_stats (year, movie_count, rated_count, rating_sum)
+    SELECT year, COUNT(*), COUNT(rating), COALESCE(SUM(rating), 0) FROM movies WHERE year IS NOT NULL GROUP BY year;
+    PERFORM pg_notify('movie_stats', '');
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER movies_stats_insert AFTER INSERT ON movies
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION movies_stats_trigger();
+CREATE OR REPLACE TRIGGER movies_stats_update AFTER UPDATE ON movies
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION movies_stats_trigger();
+CREATE OR REPLACE TRIGGER movies_stats_delete AFTER DELETE ON movies
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION movies_stats_trigger();
+CREATE OR REPLACE TRIGGER movies_stats_truncate AFTER TRUNCATE ON movies
+    FOR EACH STATEMENT EXECUTE FUNCTION movies_stats_trigger();
+
+-- Databases created before the aggregate tables start from the current catalog
+SELECT rebuild_movie_stats() WHERE NOT EXISTS (SELECT 1 FROM movie_stats);
+
+-- Queue new movies for the crawler's stages, and updated movies for the stages
+-- whose input changed: the embedded text, or the matched title and year.
+-- Queueing a movie again renews queued_at, so a stage that read the older
+-- entry leaves the newer one in place when it finishes.
+CREATE OR REPLACE FUNCTION movies_pending_trigger()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO movie_pending (stage, movie_id)
+        SELECT s.stage, n.id
+        FROM new_rows n CROSS JOIN (VALUES ('embed'), ('dedupe')) AS s (stage)
+        ON CONFLICT (stage, movie_id) DO UPDATE SET queued_at = EXCLUDED.queued_at;
+    ELSE
+        INSERT INTO movie_pending (stage, movie_id)
+        SELECT s.stage, n.id
+        FROM old_rows o
+        JOIN new_rows n ON n.id = o.id
+        CROSS JOIN LATERAL (VALUES
+            ('embed', (o.title, o.genre, o.metadata) IS DISTINCT FROM (n.title, n.genre, n.metadata)),
+            ('dedupe', (o.title, o.year) IS DISTINCT FROM (n.title, n.year))
+        ) AS s (stage, changed)
+        WHERE s.changed
+        ON CONFLICT (stage, movie_id) DO UPDATE SET queued_at = EXCLUDED.queued_at;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER movies_pending_insert AFTER INSERT ON movies
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION movies_pending_trigger();
+CREATE OR REPLACE TRIGGER movies_pending_update AFTER UPDATE ON movies
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION movies_pending_trigger();
+
+-- Databases created before the queue: movies that have no embedding yet
+INSERT INTO movie_pending (stage, movie_id)
+SELECT 'embed', m.id FROM movies m
+WHERE NOT EXISTS (SELECT 1 FROM movie_embeddings e WHERE e.movie_id = m.id)
+ON CONFLICT DO NOTHING;
+
+-- ... and movies that were never bucketed for duplicate detection
+INSERT INTO movie_pending (stage, movie_id)
+SELECT 'dedupe', m.id FROM movies m
+WHERE NOT EXISTS (SELECT 1 FROM movie_lsh_bands b WHERE b.movie_id = m.id)
+ON CONFLICT DO NOTHING;
+
+------------------
+
 -- ## Indexes for Performance ##
 
--- Indexes on the 'movies' table to accelerate common API queries
-CREATE INDEX IF NOT EXISTS idx_movies_year ON movies (year);
-CREATE INDEX IF NOT EXISTS idx_movies_genre ON movies (genre);
+-- Keyset pagination for GET /api/movies (ORDER BY created_at DESC, id DESC), one index
+-- per filter shape. Equality filters lead, so every page is a range scan in sort order;
+-- min_rating and title are checked on the included columns. INCLUDE covers every
+-- returned column, so pages are index-only scans and a deep page costs the same as the first.
+CREATE INDEX IF NOT EXISTS idx_movies_recent ON movies (created_at DESC, id DESC)
+    INCLUDE (title, genre, rating, year, updated_at);
+CREATE INDEX IF NOT EXISTS idx_movies_genre_recent ON movies (genre, created_at DESC, id DESC)
+    INCLUDE (title, rating, year, updated_at);
+CREATE INDEX IF NOT EXISTS idx_movies_year_recent ON movies (year, created_at DESC, id DESC)
+    INCLUDE (title, genre, rating, updated_at);
+CREATE INDEX IF NOT EXISTS idx_movies_genre_year_recent ON movies (genre, year, created_at DESC, id DESC)
+    INCLUDE (title, rating, updated_at);
+
+-- Superseded by the leading columns of the keyset indexes above
+DROP INDEX IF EXISTS idx_movies_year;
+DROP INDEX IF EXISTS idx_movies_genre;
+
+-- Keyset pagination for GET /api/movies/top-rated (ORDER BY rating DESC, id DESC), one
+-- index per genre/year scope. The cursor is a single row comparison (rating, id) < (...),
+-- which becomes the start key of a range scan, so a deep page reads only the rows it returns.
+CREATE INDEX IF NOT EXISTS idx_movies_rated ON movies (rating DESC, id DESC)
+    INCLUDE (title, genre, year, created_at, updated_at) WHERE rating IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_movies_genre_rated ON movies (genre, rating DESC, id DESC)
+    INCLUDE (title, year, created_at, updated_at) WHERE rating IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_movies_year_rated ON movies (year, rating DESC, id DESC)
+    INCLUDE (title, genre, created_at, updated_at) WHERE rating IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_movies_genre_year_rated ON movies (genre, year, rating DESC, id DESC)
+    INCLUDE (title, created_at, updated_at) WHERE rating IS NOT NULL;
+
+-- Ordered rating DESC NULLS LAST, id ASC, which the top-rated seek cannot use
+DROP INDEX IF EXISTS idx_movies_top_rated;
 
--- A composite index perfectly optimized for the "top-rated" endpoint
-CREATE INDEX IF NOT EXISTS idx_movies_top_rated ON movies (rating DESC NULLS LAST, id ASC);
 
 
+-- Title search: substring ILIKE (title= and q=) and full-text matching (q=)
+CREATE INDEX IF NOT EXISTS idx_movies_title_trgm ON movies USING gin (title gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_movies_search_vector ON movies USING gin (search_vector);
+
+-- Titles nearest to q by trigram distance (ORDER BY title <-> q), the order q= picks
+-- the candidates it ranks in
+CREATE INDEX IF NOT EXISTS idx_movies_title_trgm_gist ON movies USING gist (title gist_trgm_ops);
+
+-- Approximate nearest neighbours by cosine distance for /similar and /search/semantic
+CREATE INDEX IF NOT EXISTS idx_movie_embeddings_hnsw ON movie_embeddings
+    USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);
+
+-- Deleting a bulk file removes every movie loaded from it ('<file_id>#<record>')
+CREATE INDEX IF NOT EXISTS idx_movies_drive_source ON movies (split_part(drive_file_id, '#', 1));
 
 -- Index on the 'drive_change_tokens' table for fast lookup of the latest token
 CREATE INDEX IF NOT EXISTS idx_change_token_created ON drive_change_tokens (created_at DESC);
 
+-- Index for finding the latest unfinished crawl of a root folder
+CREATE INDEX IF NOT EXISTS idx_crawl_runs_root_status ON crawl_runs (root_folder_id, status, created_at DESC);
+
+-- Claimable jobs in claim order, and expired leases for reclaiming
+CREATE INDEX IF NOT EXISTS idx_crawl_jobs_pending ON crawl_jobs (run_id, kind, id) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_crawl_jobs_leases ON crawl_jobs (run_id, lease_expires_at) WHERE status = 'claimed';
+CREATE INDEX IF NOT EXISTS idx_crawl_dead_letters_source ON crawl_dead_letters (source_file_id);
+CREATE INDEX IF NOT EXISTS idx_crawl_jobs_worker ON crawl_jobs (worker_id) WHERE status = 'claimed';
+
+-- Queue entries of a deleted movie (ON DELETE CASCADE)
+CREATE INDEX IF NOT EXISTS idx_movie_pending_movie ON movie_pending (movie_id);
+
+-- Bucket rows of a batch being matched, and the members of a duplicate cluster
+CREATE INDEX IF NOT EXISTS idx_movie_lsh_bands_movie ON movie_lsh_bands (movie_id);
+CREATE INDEX IF NOT EXISTS idx_movie_duplicates_cluster ON movie_duplicates (cluster_id);
+
 --------------------
 
 